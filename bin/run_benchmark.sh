@@ -11,6 +11,7 @@ TEST_SUITE="perf_spider"
 RUN_ID="perf_spider_run"
 QUERIES_FLAG=""
 INTENT_BASED_MATCH_FLAG=""
+RESUME_FLAG=""
 
 # Function to display script usage details
 display_help() {
@@ -21,6 +22,7 @@ display_help() {
     echo "   -n, --benchmark_name      Name of benchmark"
     echo "   -w, --workload_config     Path to workload config"
     echo "   -i, --run_id              Run ID for the benchmark"
+    echo "   -R, --resume              Resume an interrupted run with the given run ID"
     echo "   -h, --help                Display help message"
     echo
     exit 1
@@ -49,6 +51,10 @@ while (( "$#" )); do
       RUN_ID="$2"
       shift 2
       ;;
+    -R|--resume)
+      RESUME_FLAG="--resume $2"
+      shift 2
+      ;;
     -d|--disable-intent-based-match)
       INTENT_BASED_MATCH_FLAG="--disable_intent_based_match"
       shift
@@ -102,6 +108,7 @@ python "$PROJ_HOME/src/benchmark/driver.py" \
   --workload_config "$WORKLOAD_CONFIG" \
   $QUERIES_FLAG \
   $INTENT_BASED_MATCH_FLAG \
+  $RESUME_FLAG \
   --run_id "$RUN_ID"
 
 echo "Done!"
@@ -1,22 +1,34 @@
-import io
 import logging
 import os
+import threading
 import time
 import traceback
 from abc import abstractmethod
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from contextlib import redirect_stdout
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Optional
 from urllib.parse import quote_plus
 
 import sqlalchemy as sa
-import sqlfluff
 from sqlalchemy import inspect
 from tqdm import tqdm
 
-from utils.result_set_match import compare_results, compare_exact_match
+from utils.result_cache import create_result_cache, normalize_sql
+from utils.sql_format import format_sql_query
+from utils.result_fingerprint import get_fingerprint, is_same_result
+from utils.sql_analysis import analyze_sql, unknown_tables
+from utils.sql_canonical import canonicalize_sql
+from utils.query_plan import is_cost_exceeded
+from utils.result_set_match import (compare_results, compare_exact_match, compile_comparison_rules,
+                                    is_identity_match)
+from utils.result_limits import make_golden_row_check
+from utils.journal import RunJournal
+from utils.process_pool import ProcessPool
+from utils.pipeline import Pipeline, Stage
+from utils.rate_limiter import create_rate_limiter, THROTTLE_TIME, RETRIES
+from utils.single_flight import SingleFlight
 from constants import *
-from database_connectors import DatabaseConnector, DatabaseType
+from database_connectors import (DatabaseConnector, DatabaseType, QueryTimeoutError, QueryValidationError,
+                                 ResultLimitExceeded)
 from database_connectors import create_connector
 
 
@@ -74,6 +86,31 @@ class TaskResult:
         self.is_gen_query_same_as_golden_query = False
         self.is_exact_match_result_comparison_fine = False
         self.exact_match_result_comparison_error = None
+        # None when the result cache was not consulted
+        self.golden_query_cache_hit = None
+        # Time spent waiting for a pooled database connection
+        self.generated_query_pool_wait_time = -1
+        self.golden_query_pool_wait_time = -1
+        # Time spent waiting on LLM provider rate limits and retries
+        self.throttle_time = 0.0
+        self.llm_retries = 0
+        # Generated or golden query ran beyond its time limit and was cancelled
+        self.timed_out = False
+        # Fetching of generated or golden query results was aborted, as they were beyond the result limits
+        self.result_limit_exceeded = False
+        # Results were found equal by their fingerprints, without detailed comparison
+        self.fingerprint_match = False
+        # Generated query is the golden query (same canonical SQL): it was not run, the golden results were reused
+        self.golden_result_reused = False
+        # Tables referenced by the generated query which don't exist in the target database. See reject_unknown_tables
+        self.unknown_tables = []
+        # Error of the generated query found without running it (syntax, unknown names). See validate_queries
+        self.validation_error = None
+        # Normalized plans (cost, rows, scans) of the queries, with query_plans. See QueryPlan
+        self.generated_query_plan = None
+        self.golden_query_plan = None
+        # Estimated cost of the generated query beyond cost_threshold times the golden one. None when not compared
+        self.plan_cost_exceeded = None
 
     # def __bool__(self):
     #     return self.results_comparison_error is None
@@ -89,6 +126,29 @@ class TaskResult:
     def __repr__(self):
         return self.__str__()
 
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+    @classmethod
+    def from_dict(cls, record: dict) -> 'TaskResult':
+        task_result = cls(query_info=record.get('query_info'))
+        task_result.__dict__.update(record)
+        return task_result
+
+
+class TaskContext:
+    """
+    State of a task, as it moves through the generate, execute and compare stages.
+    """
+
+    def __init__(self, query_info: dict, schema: Optional[str]):
+        self.query_info = query_info
+        self.schema = schema
+        self.task_result = None
+        self.golden_future = None
+        self.gen_query_result = None
+        self.golden_query_result = None
+
 
 class BenchmarkBase:
     def __init__(self, workload_data: dict, halt_on_error=False, intent_based_match=True,
@@ -103,6 +163,36 @@ class BenchmarkBase:
         self.source_db_connector = source_db_connector
         self.target_db_connector = target_db_connector
 
+        self.result_cache = None
+        # Identical queries issued by concurrent tasks share one execution
+        self.single_flight = None
+
+        # sequential, concurrent or golden_prefetch. See _submit_golden_query
+        self.query_execution_policy = CONCURRENT
+        self.query_executor = None
+        # Staged pipeline, when configured. See _run_benchmark_pipeline
+        self.pipeline = None
+        # Completed tasks are journaled, when a journal is set
+        self.journal = None
+        # Shared by all the tasks, for calls to LLM provider. See rate_limited_call
+        self.rate_limiter = create_rate_limiter(None)
+        # Time limit in seconds for running a query. Can be overridden per query in the workload.
+        self.query_timeout = None
+        # Row and size limits for fetching the results. See _get_result_limits
+        self.result_limits = {}
+        # Comparison rules of the queries compiled once, by query name. See _get_comparison_plan
+        self.comparison_plans = {}
+        # Pool of processes for CPU-bound work (comparison, SQL formatting), when configured
+        self.process_pool = None
+        # Generated queries equivalent to their golden query (same canonical SQL) are not run. See _execute_stage
+        self.reuse_golden_result = True
+        # Generated queries referencing tables missing from the target database are not run
+        self.reject_unknown_tables = False
+        # Generated queries are validated (e.g. EXPLAIN) by the target database before running them
+        self.validate_queries = False
+        # Plans of generated and golden queries are captured and their costs compared, when configured
+        self.query_plans = None
+
         self.task_results = []
         self.use_threading = True
         self.threads_count = 5
@@ -114,39 +204,207 @@ class BenchmarkBase:
     def setup(self, benchmark_config: dict):
         self.benchmark_config = benchmark_config
         self.threads_count = benchmark_config.get('threads_count', 1)
+        self.query_execution_policy = benchmark_config.get(QUERY_EXECUTION_POLICY, CONCURRENT)
+        if self.query_execution_policy not in (SEQUENTIAL, CONCURRENT, GOLDEN_PREFETCH):
+            raise Exception(f"Unsupported {QUERY_EXECUTION_POLICY}: {self.query_execution_policy}. "
+                            f"Should be one of {SEQUENTIAL}, {CONCURRENT}, {GOLDEN_PREFETCH}")
+        self.query_timeout = benchmark_config.get(QUERY_TIMEOUT)
+        self.result_limits = benchmark_config.get(RESULT_LIMITS) or {}
         databases_config = benchmark_config.get(DATABASES)
 
         # source and target DB info should be available in configs
         if not databases_config or 'source' not in databases_config or 'target' not in databases_config:
             raise Exception("Please check the config file for source and target database details.")
 
-        self.source_db_connector = create_connector(databases_config[SOURCE])
-
         # Check if the target database is the same as the source.
         target_config = databases_config[TARGET]
-        if target_config.get(SAME_AS_SOURCE):
+        same_as_source = bool(target_config.get(SAME_AS_SOURCE))
+        default_pool_size = self._get_default_pool_size(same_as_source)
+
+        self.source_db_connector = create_connector(databases_config[SOURCE], default_pool_size=default_pool_size)
+        if same_as_source:
             self.target_db_connector = self.source_db_connector
         else:
             # different target connector.
-            self.target_db_connector = create_connector(target_config)
+            self.target_db_connector = create_connector(target_config, default_pool_size=default_pool_size)
+
+        self.rate_limiter = create_rate_limiter(benchmark_config.get(RATE_LIMIT))
+
+        # Golden query results can be cached across runs
+        cache_config = benchmark_config.get(RESULT_CACHE)
+        self.result_cache = create_result_cache(cache_config)
+        if self.result_cache is not None:
+            self.source_db_connector.set_result_cache(self.result_cache, data_version=cache_config.get(DATA_VERSION))
+
+        # Large results are spilled to disk and compared there
+        spill_config = benchmark_config.get(SPILL) or {}
+        if spill_config.get('enabled', True) and spill_config.get(MEMORY_BUDGET_MB):
+            memory_budget = int(spill_config[MEMORY_BUDGET_MB] * 1024 * 1024)
+            self.source_db_connector.set_spill(memory_budget, spill_config.get('directory'))
+            if self.target_db_connector is not self.source_db_connector:
+                self.target_db_connector.set_spill(memory_budget, spill_config.get('directory'))
+
+        process_pool_config = benchmark_config.get(PROCESS_POOL) or {}
+        if process_pool_config.get(WORKERS):
+            self.process_pool = ProcessPool(process_pool_config[WORKERS],
+                                            partition_min_rows=process_pool_config.get(PARTITION_MIN_ROWS))
+
+        self.reuse_golden_result = benchmark_config.get(REUSE_GOLDEN_RESULT, True)
+        self.reject_unknown_tables = benchmark_config.get(REJECT_UNKNOWN_TABLES, False)
+        self.validate_queries = benchmark_config.get(VALIDATE_QUERIES, False)
+        query_plans_config = benchmark_config.get(QUERY_PLANS) or {}
+        if query_plans_config and query_plans_config.get('enabled', True):
+            self.query_plans = query_plans_config
+
+        dedup_config = benchmark_config.get(QUERY_DEDUP) or {}
+        if dedup_config.get('enabled', True):
+            self.single_flight = SingleFlight(retain_results=dedup_config.get(RETAIN_RESULTS, 0))
+
+        self._compile_comparison_plans()
 
         logging.info("Successfully setup the benchmark with source and target databases")
 
+    def _get_default_pool_size(self, same_as_source: bool) -> int:
+        """
+        Connection pool size matching the number of queries that can run concurrently on a connector.
+        """
+        pipeline_config = self.benchmark_config.get(PIPELINE)
+        if pipeline_config and pipeline_config.get('enabled', True):
+            # Generated and golden queries share the execute stage's workers, see _run_benchmark_pipeline
+            return max(self._get_execute_budget(pipeline_config), 1)
+        concurrency = self.threads_count
+        # generated and golden queries can run at the same time
+        if same_as_source and self.query_execution_policy != SEQUENTIAL:
+            concurrency *= 2
+        return max(concurrency, 1)
+
+    def _get_execute_budget(self, pipeline_config: dict) -> int:
+        """
+        Number of queries the pipeline runs in the warehouse at the same time: workers of the execute stage.
+        """
+        return (pipeline_config.get(EXECUTE_STAGE) or {}).get(WORKERS, self.threads_count)
+
     def run_benchmark(self):
+        pipeline_config = (self.benchmark_config or {}).get(PIPELINE)
+        if self.use_threading and pipeline_config and pipeline_config.get('enabled', True):
+            self._run_benchmark_pipeline(pipeline_config)
+            return
+
         if self.use_threading:
             executor_cls = ThreadPoolExecutor
         else:
             executor_cls = InlineExecutor
 
-        logging.info(f"Starting benchmark with {self.threads_count} threads")
-        with executor_cls(max_workers=self.threads_count) as executor:
+        logging.info(f"Starting benchmark with {self.threads_count} threads, "
+                     f"query execution policy: {self.query_execution_policy}")
+        with executor_cls(max_workers=self.threads_count) as executor, \
+                executor_cls(max_workers=self.threads_count) as query_executor:
+            # Golden queries are dispatched to a separate executor, so they can overlap with the task's own work
+            if self.query_execution_policy != SEQUENTIAL:
+                self.query_executor = query_executor
+
             # Create and submit tasks to executor
             futures = self._submit_tasks_to_executor(executor)
 
             # Use tqdm to track progress
             errors = self._track_progress_and_handle_errors(futures, executor)
 
-            print(f"All tasks completed, total:{len(futures)}, errors:{errors}")
+            self._print_run_summary(len(futures), errors)
+        self.query_executor = None
+
+    def _run_benchmark_pipeline(self, pipeline_config: dict):
+        """
+        Runs the tasks as a staged pipeline: generate -> execute -> compare -> report.
+        Each stage has its own bounded pool and queue, so that LLM bound generation and warehouse bound
+        execution can be sized independently. Report stage runs in this thread.
+        """
+        # Golden queries run beside the execute stage's own queries, on a share of its workers. With a single
+        # worker, they run in the execute stage, one after the other
+        execute_budget = self._get_execute_budget(pipeline_config)
+        golden_workers = execute_budget // 2 if self.query_execution_policy != SEQUENTIAL else 0
+        pipeline = self._create_pipeline(pipeline_config, execute_workers=max(execute_budget - golden_workers, 1))
+        logging.info(f"Starting benchmark pipeline with stages: "
+                     f"{[(stage.name, stage.workers, stage.queue_size) for stage in pipeline.stages]}, "
+                     f"golden query workers: {golden_workers}, query execution policy: {self.query_execution_policy}")
+
+        with ThreadPoolExecutor(max_workers=max(golden_workers, 1)) as query_executor:
+            if golden_workers > 0:
+                self.query_executor = query_executor
+            self.pipeline = pipeline
+
+            # Tasks are fed from a separate thread, as submission blocks when the generate stage is full
+            futures = [Future() for _ in self.data]
+            feeder = threading.Thread(target=self._feed_pipeline, args=(pipeline, futures),
+                                      name="pipeline_feeder", daemon=True)
+            feeder.start()
+
+            errors = self._track_progress_and_handle_errors(futures, pipeline)
+            pipeline.shutdown(wait=True)
+
+            self._print_run_summary(len(futures), errors)
+            for stage in pipeline.stages:
+                print(f"Stage {stage.name}: workers:{stage.workers}, completed:{stage.completed}, "
+                      f"utilization:{stage.utilization() * 100:.2f}%")
+        self.pipeline = None
+        self.query_executor = None
+
+    def _create_pipeline(self, pipeline_config: dict, execute_workers: int) -> Pipeline:
+        def create_stage(name, fn, workers=None):
+            stage_config = pipeline_config.get(name) or {}
+            if workers is None:
+                workers = stage_config.get(WORKERS, self.threads_count)
+            return Stage(name, fn, workers=workers, queue_size=stage_config.get(QUEUE_SIZE, 2 * workers))
+
+        return Pipeline([create_stage(GENERATE_STAGE, self._generate_stage),
+                         create_stage(EXECUTE_STAGE, self._execute_stage, workers=execute_workers),
+                         create_stage(COMPARE_STAGE, self._compare_stage)])
+
+    def _feed_pipeline(self, pipeline: Pipeline, futures: list):
+        print(f"Submitting {len(self.data)} tasks to pipeline")
+        for query_info, future in zip(self.data.values(), futures):
+            # Halted: the pipeline is shut down and the remaining futures are cancelled
+            if pipeline.closed or future.cancelled():
+                logging.info("Pipeline is shut down, not submitting the remaining tasks")
+                return
+            pipeline.submit(query_info, result_future=future)
+        logging.info(f"Submitted {len(self.data)} tasks to pipeline")
+
+    def _print_run_summary(self, total: int, errors: int):
+        print(f"All tasks completed, total:{total}, errors:{errors}")
+        if self.result_cache is not None:
+            cache_hits = sum(1 for t in self.task_results if t.golden_query_cache_hit)
+            cache_misses = sum(1 for t in self.task_results if t.golden_query_cache_hit is False)
+            print(f"Golden query result cache, hits:{cache_hits}, misses:{cache_misses}")
+        if self.single_flight is not None:
+            print(f"Query executions:{self.single_flight.executions}, "
+                  f"deduplicated:{self.single_flight.shared}")
+        timed_out = sum(1 for t in self.task_results if t.timed_out)
+        if timed_out > 0:
+            print(f"Timed out tasks:{timed_out}")
+        fingerprint_matches = sum(1 for t in self.task_results if t.fingerprint_match)
+        if fingerprint_matches > 0:
+            print(f"Results matched by fingerprint:{fingerprint_matches}")
+        invalid = sum(1 for t in self.task_results if t.validation_error is not None)
+        unknown_tables = sum(1 for t in self.task_results if t.unknown_tables)
+        if invalid > 0 or unknown_tables > 0:
+            print(f"Generated queries rejected without running them, invalid:{invalid}, "
+                  f"with unknown tables:{unknown_tables}")
+        if self.query_plans is not None:
+            cost_exceeded = sum(1 for t in self.task_results if t.plan_cost_exceeded)
+            print(f"Generated queries with estimated cost beyond {self.query_plans.get(COST_THRESHOLD, 2.0)} "
+                  f"times the golden query:{cost_exceeded}")
+        limit_exceeded = sum(1 for t in self.task_results if t.result_limit_exceeded)
+        if limit_exceeded > 0:
+            print(f"Tasks with results beyond the limits:{limit_exceeded}")
+        throttle_time = sum(t.throttle_time for t in self.task_results)
+        if throttle_time > 0:
+            print(f"LLM throttled time, total:{throttle_time:.2f}s, "
+                  f"retries:{sum(t.llm_retries for t in self.task_results)}")
+        pool_wait_times = [wait_time for t in self.task_results
+                           for wait_time in (t.generated_query_pool_wait_time, t.golden_query_pool_wait_time)
+                           if wait_time >= 0]
+        if pool_wait_times:
+            print(f"Connection pool wait, total:{sum(pool_wait_times):.4f}s, max:{max(pool_wait_times):.4f}s")
 
     def _submit_tasks_to_executor(self, executor):
         futures = []
@@ -159,18 +417,29 @@ class BenchmarkBase:
 
     def _track_progress_and_handle_errors(self, futures, executor):
         errors = 0
+        error_rate = 0.0
         with tqdm(total=len(futures), unit="task", dynamic_ncols=True, desc="Processing Tasks") as pbar:
             try:
-                for future in as_completed(futures):
-                    task_result = future.result()  # Wait for each task to complete
-                    self.task_results.append(task_result)
-                    if not task_result.is_results_comparison_fine:
-                        errors += 1
-                        self._handle_task_error(task_result)
-
-                    pbar.update(1)  # Update the progress bar
-                    error_rate = self._calculate_error_rate(errors, task_result, pbar)
-                    pbar.set_postfix({"Error Rate (%)": f"{error_rate:.2f}"})
+                pending = set(futures)
+                while pending:
+                    # Wake up periodically, to refresh the stage details in progress bar
+                    done, pending = wait(pending, timeout=1, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        task_result = future.result()  # Wait for each task to complete
+                        self.task_results.append(task_result)
+                        if self.journal is not None:
+                            self.journal.append(task_result.to_dict())
+                        if not task_result.is_results_comparison_fine:
+                            errors += 1
+                            self._handle_task_error(task_result)
+
+                        pbar.update(1)  # Update the progress bar
+                        error_rate = self._calculate_error_rate(errors, task_result, pbar)
+
+                    postfix = {"Error Rate (%)": f"{error_rate:.2f}"}
+                    if self.pipeline is not None:
+                        postfix.update(self.pipeline.get_progress_info())
+                    pbar.set_postfix(postfix)
             except TaskFailure as e:
                 logging.info(f"Task failed with error: {e}, trace: {traceback.format_exc()}")
                 for future in futures:
@@ -194,77 +463,240 @@ class BenchmarkBase:
     def get_results(self) -> list:
         return self.task_results
 
-    @staticmethod
-    def _use_schema(connector: DatabaseConnector, schema: str):
-        try:
-            connector.execute_and_fetch_all(f"USE schema {schema}")
-        except Exception as e:
-            logging.error(f"Exception while setting schema: {str(e)}")
+    def set_journal(self, journal: RunJournal):
+        """
+        Journal to which every completed task result is appended, for resuming the run after a crash.
+        """
+        self.journal = journal
 
     def format_sql_query(self, query):
-        try:
-            f = io.StringIO()
-            with redirect_stdout(f):
-                formatted_query = sqlfluff.fix(query, dialect='ansi')
-            return formatted_query
-        except Exception as e:
-            # return original query
-            print(f"Error in formatting query: {query}. Returning original query.")
-            return query
+        # sqlfluff is CPU-bound, it runs in the process pool when configured
+        if self.process_pool is not None:
+            return self.process_pool.format_sql_query(query)
+        return format_sql_query(query)
 
     def run_query_and_compare(self, query_info: dict) -> TaskResult:
         """
         Generate query, run it and get results. Compare with golden query results.
         """
-        task_result = self.generate_query(query_info=query_info)
-        task_result.generated_query = task_result.generated_query
-        query_info['golden_query'] = query_info['golden_query']
-        tables = query_info.get(TABLES, None)
-        task_result.golden_query_tables = tables
-        if str(task_result.generated_query).strip() == str(query_info[GOLDEN_QUERY]).strip():
-            task_result.gen_query_same_as_golden_query = True
+        task_context = self._generate_stage(query_info)
+        task_context = self._execute_stage(task_context)
+        return self._compare_stage(task_context)
 
+    def _generate_stage(self, query_info: dict) -> TaskContext:
+        """
+        Generates the query for the task. With golden_prefetch, golden query is started as well.
+        """
+        schema = None
         if (query_info['schemas'] is not None and len(query_info['schemas']) > 0):
+            # Queries run in this schema. Connector binds it to the connection running the query.
             schema = query_info['schemas'][0]
-            # For golden queries, set the schema to be on safer side
-            self._use_schema(self.source_db_connector, schema)
+        task_context = TaskContext(query_info, schema)
 
-        if task_result.is_query_generated:
-            gen_query_result = None
-            golden_query_result = None
+        # Golden query can be run while the query is being generated
+        if self.query_execution_policy == GOLDEN_PREFETCH:
+            task_context.golden_future = self._submit_golden_query(query_info, schema)
 
-            # Run generated query in target database
+        task_result = self.generate_query(query_info=query_info)
+        task_result.generated_query = task_result.generated_query
+        query_info['golden_query'] = query_info['golden_query']
+        task_result.golden_query_tables = query_info.get(TABLES, None)
+        if task_result.generated_query is not None:
+            # Tables of the generated query, when the implementation doesn't provide them
+            if not task_result.generated_query_tables:
+                task_result.generated_query_tables = list(analyze_sql(str(task_result.generated_query), schema).tables)
+            # Same query up to whitespace, case, quoting and qualification by the schema. See canonicalize_sql
+            dialect = self.target_db_connector.get_dialect()
+            generated_sql = canonicalize_sql(str(task_result.generated_query), schema, dialect)
+            task_result.is_gen_query_same_as_golden_query = (
+                    generated_sql == canonicalize_sql(str(query_info[GOLDEN_QUERY]), schema, dialect))
+
+        if not task_result.is_query_generated and task_context.golden_future is not None:
+            task_context.golden_future.cancel()
+
+        task_context.task_result = task_result
+        return task_context
+
+    def _execute_stage(self, task_context: TaskContext) -> TaskContext:
+        """
+        Runs the generated query in target database and golden query in source database.
+        """
+        task_result = task_context.task_result
+        query_info = task_context.query_info
+        schema = task_context.schema
+        if not task_result.is_query_generated:
+            return task_context
+
+        # Golden query runs in the background, while generated query runs in this thread
+        golden_future = task_context.golden_future
+        # Same query in the same database: golden query results are the generated query results
+        reuse_golden_result = (self.reuse_golden_result and task_result.is_gen_query_same_as_golden_query
+                               and self.target_db_connector is self.source_db_connector)
+        if not reuse_golden_result and self.reject_unknown_tables:
+            task_result.unknown_tables = self._get_unknown_tables(task_result.generated_query, schema)
+            if task_result.unknown_tables:
+                # Query would fail in the database, as it would when run
+                task_result.is_query_generated = False
+                task_result.is_results_comparison_fine = False
+                task_result.results_comparison_error = (f"Generated query references unknown tables: "
+                                                        f"{', '.join(task_result.unknown_tables)}")
+                logging.error(f"Generated query references unknown tables: {query_info[QUERY_NAME]}")
+                if golden_future is not None:
+                    golden_future.cancel()
+                return task_context
+        if not reuse_golden_result and self.validate_queries:
             try:
-                gen_query_result, runtime = self.run_query(task_result.generated_query,
-                                                           db_connector=self.target_db_connector)
+                self.target_db_connector.validate_query(task_result.generated_query, schema)
+            except QueryValidationError as e:
+                task_result.validation_error = str(e)
+                task_result.is_query_generated = False
+                task_result.is_results_comparison_fine = False
+                task_result.results_comparison_error = f"Generated query is invalid: {str(e)}"
+                logging.error(f"Generated query is invalid: {query_info[QUERY_NAME]} : {str(e)}")
+                if golden_future is not None:
+                    golden_future.cancel()
+                return task_context
+        if golden_future is None and self.query_execution_policy == CONCURRENT and not reuse_golden_result:
+            golden_future = self._submit_golden_query(query_info, schema)
+
+        # Run generated query in target database, unless golden query results are reused
+        if not reuse_golden_result:
+            try:
+                stats = {}
+                task_context.gen_query_result, runtime = self.run_query(task_result.generated_query,
+                                                                        db_connector=self.target_db_connector,
+                                                                        stats=stats, schema=schema,
+                                                                        timeout=self._get_query_timeout(query_info),
+                                                                        abort_check=self._make_golden_row_check(
+                                                                            golden_future),
+                                                                        **self._get_result_limits())
                 task_result.generated_query_runtime = runtime
+                task_result.generated_query_pool_wait_time = stats.get(POOL_WAIT_TIME, 0.0)
                 logging.info(f"Generated query and runtime "
                              f"{task_result.generated_query}, {task_result.generated_query_runtime}")
+            except QueryTimeoutError as e:
+                task_result.timed_out = True
+                task_result.generated_query_runtime = e.timeout
+                task_result.is_results_comparison_fine = False
+                task_result.results_comparison_error = f"Generated query timed out after {e.timeout} seconds"
+                logging.error(f"Generated query timed out: {query_info[QUERY_NAME]}")
+                # Nothing to compare against, don't hold the slot waiting for golden query
+                if golden_future is not None:
+                    golden_future.cancel()
+                return task_context
+            except ResultLimitExceeded as e:
+                task_result.result_limit_exceeded = True
+                task_result.is_results_comparison_fine = False
+                task_result.results_comparison_error = f"Generated query results: {str(e)}"
+                logging.error(f"Generated query results beyond the limits: {query_info[QUERY_NAME]}")
+                if golden_future is not None:
+                    golden_future.cancel()
+                return task_context
             except Exception as e:
                 task_result.is_query_generated = False
                 task_result.is_results_comparison_fine = False
                 task_result.results_comparison_error = str(e)
-                logging.error(f"Exception running generated query: {query_info[QUERY_NAME]} : {traceback.format_exc()}")
+                logging.error(f"Exception running generated query: {query_info[QUERY_NAME]} : "
+                              f"{traceback.format_exc()}")
 
-            # Run golden query in source database
-            try:
-                golden_query_result, golden_query_runtime = self.run_query(query_info[GOLDEN_QUERY],
-                                                                           db_connector=self.source_db_connector)
-                task_result.golden_query_runtime = golden_query_runtime
-                logging.info(f"Golden query and runtime "
-                             f"{task_result.generated_query},  {task_result.generated_query_runtime}")
-            except Exception as e:
-                task_result.is_results_comparison_fine = False
-                task_result.results_comparison_error = str(e)
-                logging.error("Exception running golden query: %s", traceback.format_exc())
+        # Run golden query in source database
+        try:
+            if golden_future is not None:
+                golden_query_result, golden_query_runtime, stats = golden_future.result()
+            else:
+                golden_query_result, golden_query_runtime, stats = self._run_golden_query(query_info, schema)
+            task_context.golden_query_result = golden_query_result
+            task_result.golden_query_runtime = golden_query_runtime
+            task_result.golden_query_cache_hit = stats.get(CACHE_HIT)
+            task_result.golden_query_pool_wait_time = stats.get(POOL_WAIT_TIME, 0.0)
+            logging.info(f"Golden query and runtime "
+                         f"{query_info[GOLDEN_QUERY]},  {task_result.golden_query_runtime}")
+        except QueryTimeoutError as e:
+            task_result.timed_out = True
+            task_result.is_results_comparison_fine = False
+            task_result.results_comparison_error = f"Golden query timed out after {e.timeout} seconds"
+            logging.error(f"Golden query timed out: {query_info[QUERY_NAME]}")
+        except ResultLimitExceeded as e:
+            task_result.result_limit_exceeded = True
+            task_result.is_results_comparison_fine = False
+            task_result.results_comparison_error = f"Golden query results: {str(e)}"
+            logging.error(f"Golden query results beyond the limits: {query_info[QUERY_NAME]}")
+        except Exception as e:
+            task_result.is_results_comparison_fine = False
+            task_result.results_comparison_error = str(e)
+            logging.error("Exception running golden query: %s", traceback.format_exc())
+
+        if reuse_golden_result and task_context.golden_query_result is not None:
+            task_context.gen_query_result = task_context.golden_query_result
+            task_result.generated_query_runtime = task_result.golden_query_runtime
+            task_result.generated_query_pool_wait_time = 0.0
+            task_result.golden_result_reused = True
+            logging.info(f"Generated query is the golden query, reused golden query results: {query_info[QUERY_NAME]}")
+
+        if (self.query_plans is not None and task_context.gen_query_result is not None
+                and task_context.golden_query_result is not None):
+            self._capture_query_plans(task_context)
+        return task_context
+
+    def _capture_query_plans(self, task_context: TaskContext):
+        """
+        Captures the plans of the generated and golden queries, and compares their estimated costs when they come
+        from the same database.
+        """
+        task_result = task_context.task_result
+        query_info = task_context.query_info
+        analyze = self.query_plans.get('analyze', False)
+        timeout = self._get_query_timeout(query_info)
+        golden_plan = self.source_db_connector.explain_query(query_info[GOLDEN_QUERY], task_context.schema,
+                                                             analyze=analyze, timeout=timeout)
+        if task_result.golden_result_reused:
+            generated_plan = golden_plan
+        else:
+            generated_plan = self.target_db_connector.explain_query(task_result.generated_query, task_context.schema,
+                                                                    analyze=analyze, timeout=timeout)
+        task_result.golden_query_plan = golden_plan.to_dict() if golden_plan is not None else None
+        task_result.generated_query_plan = generated_plan.to_dict() if generated_plan is not None else None
+        # Costs are in the units of the database
+        if self.source_db_connector.get_dialect() == self.target_db_connector.get_dialect():
+            task_result.plan_cost_exceeded = is_cost_exceeded(generated_plan, golden_plan,
+                                                              self.query_plans.get(COST_THRESHOLD, 2.0))
+        if task_result.plan_cost_exceeded:
+            logging.warning(f"Estimated cost of generated query beyond {self.query_plans.get(COST_THRESHOLD, 2.0)} "
+                            f"times the golden query: {query_info[QUERY_NAME]}, "
+                            f"{generated_plan.cost} vs {golden_plan.cost}")
+
+    def _get_unknown_tables(self, query: str, schema: Optional[str]) -> list:
+        """
+        Tables referenced by the query which are not in the target database (empty when they can't be listed).
+        """
+        known_tables = self.target_db_connector.get_table_names(schema)
+        if known_tables is None:
+            return []
+        return unknown_tables(analyze_sql(str(query), schema), known_tables, self.target_db_connector.get_dialect())
 
+    def _compare_stage(self, task_context: TaskContext) -> TaskResult:
+        """
+        Compares the results of generated and golden queries.
+        """
+        task_result = task_context.task_result
+        query_info = task_context.query_info
+        tables = query_info.get(TABLES, None)
+
+        if task_result.is_query_generated:
             # Table Check on need basis
             if tables is not None:
                 task_result.golden_query_tables = tables
                 self.table_check(task_result=task_result, golden_tables=tables)
 
             # Compare the results
-            if gen_query_result is not None and golden_query_result is not None:
+            gen_query_result = task_context.gen_query_result
+            golden_query_result = task_context.golden_query_result
+            if task_result.golden_result_reused:
+                # Same results: they match
+                task_result.is_results_comparison_fine, task_result.results_comparison_error = True, ""
+                (task_result.is_exact_match_result_comparison_fine,
+                 task_result.exact_match_result_comparison_error) = True, ""
+            elif gen_query_result is not None and golden_query_result is not None:
                 try:
                     self.compare_query_results(task_result, gen_query_result, golden_query_result, query_info)
                 except Exception as e:
@@ -281,6 +713,44 @@ class BenchmarkBase:
 
         return task_result
 
+    def _run_golden_query(self, query_info: dict, schema: Optional[str]) -> (list, float, dict):
+        stats = {}
+        golden_query_result, golden_query_runtime = self.run_query(query_info[GOLDEN_QUERY],
+                                                                   db_connector=self.source_db_connector,
+                                                                   use_cache=True, stats=stats, schema=schema,
+                                                                   timeout=self._get_query_timeout(query_info),
+                                                                   **self._get_result_limits())
+        return golden_query_result, golden_query_runtime, stats
+
+    def _get_query_timeout(self, query_info: dict) -> Optional[float]:
+        """
+        Time limit for the queries of the task. query_timeout of the query overrides the one of the workload.
+        """
+        return query_info.get(QUERY_TIMEOUT, self.query_timeout) or None
+
+    def _get_result_limits(self) -> dict:
+        """
+        Hard row and size limits of query results, from the result_limits config.
+        """
+        max_bytes_mb = self.result_limits.get('max_bytes_mb')
+        return {'max_rows': self.result_limits.get('max_rows'),
+                'max_bytes': int(max_bytes_mb * 1024 * 1024) if max_bytes_mb else None}
+
+    def _make_golden_row_check(self, golden_future: Optional[Future]) -> Optional[Callable]:
+        """
+        Abort check for fetching the generated query results, from golden_row_factor. The task is reported as
+        a mismatch when it aborts. See make_golden_row_check.
+        """
+        factor = self.result_limits.get(GOLDEN_ROW_FACTOR)
+        if not factor or golden_future is None:
+            return None
+        return make_golden_row_check(golden_future, factor, self.result_limits.get('min_rows', 1000))
+
+    def _submit_golden_query(self, query_info: dict, schema: Optional[str]) -> Future:
+        # Outside of run_benchmark there is no query executor, run it inline
+        executor = self.query_executor if self.query_executor is not None else InlineExecutor(max_workers=1)
+        return executor.submit(self._run_golden_query, query_info, schema)
+
     def table_check(self, task_result=None, golden_tables=None):
         if (None in (golden_tables, task_result.generated_query_tables) or
                 len(golden_tables) != len(task_result.generated_query_tables)):
@@ -291,25 +761,84 @@ class BenchmarkBase:
             task_result.table_check = (gen_tables == golden_tables_lower)
             task_result.generated_query_tables = gen_tables
 
+    def _get_db_types(self) -> (str, str):
+        """
+        Types of source and target databases for comparing the results: their dialect, when known.
+        """
+        return (self.source_db_connector.get_dialect() or self.source_db_connector.get_db_type(),
+                self.target_db_connector.get_dialect() or self.target_db_connector.get_db_type())
+
+    def _compile_comparison_plans(self):
+        """
+        Compiles the comparison rules of every query in the workload, once.
+        """
+        source_db_type, target_db_type = self._get_db_types()
+        for query_info in self.data.values():
+            comparison_rules = query_info.get('comparison_rules')
+            if comparison_rules is None:
+                continue
+            try:
+                self.comparison_plans[query_info[QUERY_NAME]] = compile_comparison_rules(
+                    comparison_rules, source_db_type=source_db_type, target_db_type=target_db_type)
+            except Exception as e:
+                # Reported when the results of the query are compared
+                logging.error(f"Invalid comparison_rules for query {query_info[QUERY_NAME]}: {str(e)}")
+
+    def _get_comparison_plan(self, query_info: dict):
+        """
+        Compiled comparison rules of the query. Falls back to the rules, for queries not in the workload.
+        """
+        plan = self.comparison_plans.get(query_info.get(QUERY_NAME))
+        return plan if plan is not None else query_info.get('comparison_rules')
+
     def compare_query_results(self, task_result: TaskResult, gen_query_result, golden_query_result, query_info: dict):
         """
         Compares the results of the generated and golden queries.
         """
         # compare runtime results of golden query and generated query
-        source_db_type = self.source_db_connector.get_db_type()
-        target_db_type = self.target_db_connector.get_db_type()
-
-        # For regular comparison
-        (task_result.is_results_comparison_fine,
-         task_result.results_comparison_error) = compare_results(golden_query_result, gen_query_result,
-                                        query_info.get('comparison_rules'),
-                                        intent_based_match=self.intent_based_match,
-                                        source_db_type=source_db_type,
-                                        target_db_type=target_db_type)
-
-        # For exact match comparison and additional information purposes.
+        source_db_type, target_db_type = self._get_db_types()
+        plan = compile_comparison_rules(self._get_comparison_plan(query_info), source_db_type, target_db_type)
+
+        # Results with the same rows match, no need to compare them row by row
+        golden_fingerprint = get_fingerprint(golden_query_result)
+        gen_fingerprint = get_fingerprint(gen_query_result)
+        exact_match = is_same_result(golden_fingerprint, gen_fingerprint, exact=True)
+        fingerprint_match = (not self.intent_based_match and exact_match) or (
+                self.intent_based_match and is_identity_match(plan)
+                and (exact_match or is_same_result(golden_fingerprint, gen_fingerprint)))
+        if not fingerprint_match and golden_fingerprint is not None and gen_fingerprint is not None:
+            logging.debug(f"Columns with different values for query {query_info[QUERY_NAME]}: "
+                          f"{golden_fingerprint.differing_columns(gen_fingerprint)}")
+
+        # Comparison is CPU-bound, it runs in the process pool when configured
+        verdicts = None
+        if self.process_pool is not None and not (fingerprint_match and exact_match):
+            verdicts = self.process_pool.compare_results(golden_query_result, gen_query_result,
+                                                         None if fingerprint_match else plan,
+                                                         intent_based_match=self.intent_based_match,
+                                                         exact_match=not exact_match)
+        if verdicts is None:
+            verdicts = (None, None)
+            if not fingerprint_match:
+                # For regular comparison
+                verdicts = (compare_results(golden_query_result, gen_query_result, plan,
+                                            intent_based_match=self.intent_based_match,
+                                            source_db_type=source_db_type,
+                                            target_db_type=target_db_type,
+                                            pool=self.process_pool), None)
+            if not exact_match:
+                # For exact match comparison and additional information purposes.
+                verdicts = verdicts[0], compare_exact_match(gen_query_result, golden_query_result)
+        comparison, exact_match_comparison = verdicts
+
+        if fingerprint_match:
+            task_result.fingerprint_match = True
+            comparison = True, ""
+        task_result.is_results_comparison_fine, task_result.results_comparison_error = comparison
+        if exact_match:
+            exact_match_comparison = True, ""
         (task_result.is_exact_match_result_comparison_fine,
-         task_result.exact_match_result_comparison_error) = compare_exact_match(gen_query_result, golden_query_result)
+         task_result.exact_match_result_comparison_error) = exact_match_comparison
 
     def log_results(self, task_result: TaskResult, query_info: dict):
         """
@@ -327,6 +856,27 @@ class BenchmarkBase:
         task_result.is_results_comparison_fine = False
         raise TaskFailure(message=message, query_info=query_info)
 
+    def rate_limited_call(self, task_result: Optional[TaskResult], fn, tokens: Optional[int] = None):
+        """
+        Makes a call to the LLM provider through the shared rate limiter. Implementations should wrap their
+        provider calls in generate_query with this, e.g.
+            self.rate_limited_call(result, lambda: client.generate(request), tokens=estimate_tokens(prompt))
+
+        Args:
+            task_result: time spent throttled and number of retries are added to it
+            fn: function making the provider call
+            tokens: estimated tokens for the call. Defaults to tokens_per_request of rate_limit config.
+        Returns:
+            result of fn
+        """
+        stats = {}
+        try:
+            return self.rate_limiter.call(fn, tokens=tokens, stats=stats)
+        finally:
+            if task_result is not None:
+                task_result.throttle_time += stats.get(THROTTLE_TIME, 0.0)
+                task_result.llm_retries += stats.get(RETRIES, 0)
+
     @abstractmethod
     def generate_query(self, query_info: dict) -> TaskResult:
         """
@@ -344,18 +894,55 @@ class BenchmarkBase:
         pass
 
     @abstractmethod
-    def run_query(self, query: str, db_connector: DatabaseConnector = None) -> (list, float):
+    def run_query(self, query: str, db_connector: DatabaseConnector = None, use_cache: bool = False,
+                  stats: Optional[dict] = None, schema: Optional[str] = None,
+                  timeout: Optional[float] = None, max_rows: Optional[int] = None, max_bytes: Optional[int] = None,
+                  abort_check: Optional[Callable] = None) -> (list, float):
         """
-        Run the query and return the results.
+        Run the query and return the results: a sequence of dict rows, usually a ResultSet (rows as tuples sharing
+        one column header) which compare_results takes as is.
+        Identical queries (same normalized SQL, connector, schema and limits) issued concurrently share one execution
+        and the same result, which must not be mutated. Queries with an abort_check always run on their own: the
+        check decides on limits of the task (e.g. its golden row count) the execution would otherwise be shared with.
+        The runtime of a shared execution is the time spent waiting for it.
 
         Args:
             query:
             db_connector:
+            use_cache: serve results from the connector's result cache, when it has one
+            stats: populated with execution details from the connector
+            schema: schema the query runs against
+            timeout: time limit in seconds. Connector cancels the query and raises QueryTimeoutError beyond it.
+            max_rows, max_bytes, abort_check: limits for fetching the results.
+                Connector raises ResultLimitExceeded beyond them.
         """
         try:
             if db_connector is None:
                 raise Exception("db_connector can not be None")
-            (result_list, runtime) = db_connector.execute_and_fetch_all(query)
+
+            def execute():
+                execution_stats = {}
+                (rows, elapsed) = db_connector.execute_and_fetch_all(query, use_cache=use_cache,
+                                                                     stats=execution_stats, schema=schema,
+                                                                     timeout=timeout, max_rows=max_rows,
+                                                                     max_bytes=max_bytes, abort_check=abort_check)
+                return rows, elapsed, execution_stats
+
+            if self.single_flight is None or abort_check is not None:
+                (result_list, runtime, execution_stats) = execute()
+                shared = False
+            else:
+                key = (normalize_sql(str(query)), db_connector.get_connection_id(), schema, use_cache, timeout,
+                       max_rows, max_bytes)
+                wait_start = time.time()
+                (result_list, runtime, execution_stats), shared = self.single_flight.do(key, execute)
+                if shared:
+                    # The query ran for another task, this task only waited for its result
+                    runtime = time.time() - wait_start
+
+            if stats is not None:
+                stats.update(execution_stats)
+                stats[SHARED_EXECUTION] = shared
             return result_list, runtime
         except Exception as e:
             # Handle other exceptions
@@ -369,3 +956,7 @@ class BenchmarkBase:
             self.source_db_connector.cleanup()
         if self.target_db_connector is not None:
             self.target_db_connector.cleanup()
+        if self.result_cache is not None:
+            self.result_cache.close()
+        if self.process_pool is not None:
+            self.process_pool.shutdown()
@@ -14,3 +14,33 @@ QUESTION = "question"
 GOLDEN_QUERY = "golden_query"
 THREADS_COUNT = "threads_count"
 TABLES = 'tables'
+RESULT_CACHE = 'result_cache'
+DATA_VERSION = 'data_version'
+CACHE_HIT = 'cache_hit'
+QUERY_DEDUP = 'query_dedup'
+RETAIN_RESULTS = 'retain_results'
+SHARED_EXECUTION = 'shared_execution'
+QUERY_EXECUTION_POLICY = 'query_execution_policy'
+SEQUENTIAL = 'sequential'
+CONCURRENT = 'concurrent'
+GOLDEN_PREFETCH = 'golden_prefetch'
+PIPELINE = 'pipeline'
+GENERATE_STAGE = 'generate'
+EXECUTE_STAGE = 'execute'
+COMPARE_STAGE = 'compare'
+WORKERS = 'workers'
+QUEUE_SIZE = 'queue_size'
+POOL_WAIT_TIME = 'pool_wait_time'
+RATE_LIMIT = 'rate_limit'
+QUERY_TIMEOUT = 'query_timeout'
+RESULT_LIMITS = 'result_limits'
+GOLDEN_ROW_FACTOR = 'golden_row_factor'
+SPILL = 'spill'
+MEMORY_BUDGET_MB = 'memory_budget_mb'
+PROCESS_POOL = 'process_pool'
+PARTITION_MIN_ROWS = 'partition_min_rows'
+REUSE_GOLDEN_RESULT = 'reuse_golden_result'
+REJECT_UNKNOWN_TABLES = 'reject_unknown_tables'
+VALIDATE_QUERIES = 'validate_queries'
+QUERY_PLANS = 'query_plans'
+COST_THRESHOLD = 'cost_threshold'
@@ -1,24 +1,150 @@
 import json
 import logging
+import os
 import subprocess
+import sys
 import tempfile
+import threading
 import time
 import traceback
 
 from abc import ABC, abstractmethod
+from collections import OrderedDict
 from enum import Enum
-from typing import List, Dict
+from typing import Callable, List, Dict, Optional
 from urllib.parse import urlparse
 
 import sqlalchemy
 import re
 from overrides import override
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.exc import OperationalError, ProgrammingError, SQLAlchemyError
+from sqlalchemy.pool import StaticPool
+
+from constants import CACHE_HIT, POOL_WAIT_TIME
+from utils.arrow_result import ArrowResultBuilder
+from utils.external_compare import ROW_OVERHEAD_BYTES, ResultSpiller, SpilledResultSet
+from utils.result_cache import ResultCache, normalize_sql
+from utils.result_fingerprint import FingerprintedRows, ResultFingerprint
+from utils.query_plan import QueryPlan, is_read_only, parse_postgres_plan, parse_sqlite_plan
+from utils.result_set import ResultSet
+from utils.sql_analysis import analyze_sql
 
 
 class DatabaseType(Enum):
     SQLALCHEMY = "sqlalchemy"
 
+
+# Connection pool settings accepted in the database config, passed as is to sqlalchemy.create_engine
+POOL_CONFIG_KEYS = ('pool_size', 'max_overflow', 'pool_timeout', 'pool_pre_ping', 'pool_recycle')
+# Rows fetched per batch from the (server side, where supported) cursor
+DEFAULT_FETCH_SIZE = 1000
+# Results are returned as a ResultSet (shared header, rows as fetched) by default, as a columnar ArrowResultSet
+# or as a list of dicts (one per row)
+RESULT_FORMAT_ROWS = 'rows'
+RESULT_FORMAT_ARROW = 'arrow'
+RESULT_FORMAT_DICTS = 'dicts'
+DEFAULT_POOL_SIZE = 5
+
+# Statement to set the current schema of a session, per dialect. None, when the dialect has no such notion.
+SET_SCHEMA_STATEMENTS = {
+    'postgresql': "SET search_path TO {schema}",
+    'snowflake': "USE SCHEMA {schema}",
+    'mysql': "USE {schema}",
+    'mariadb': "USE {schema}",
+    'oracle': "ALTER SESSION SET CURRENT_SCHEMA = {schema}",
+    'sqlite': None,
+    'mssql': None,
+}
+DEFAULT_SET_SCHEMA_STATEMENT = "USE SCHEMA {schema}"
+# Statement compiling a query without running it, per dialect. Dialects not listed here don't validate queries.
+VALIDATION_STATEMENTS = {
+    'postgresql': "EXPLAIN {query}",
+    'sqlite': "EXPLAIN {query}",
+    'mysql': "EXPLAIN {query}",
+    'mariadb': "EXPLAIN {query}",
+    'duckdb': "EXPLAIN {query}",
+    'snowflake': "EXPLAIN USING TEXT {query}",
+}
+# Number of validation outcomes kept, by normalized query and schema
+VALIDATION_CACHE_SIZE = 4096
+# Key in the pooled connection's info, tracking the schema the connection is currently on
+SCHEMA_INFO_KEY = 'current_schema'
+
+# Statement to set the statement timeout of a session, per dialect. 0 disables the timeout.
+# Dialects not listed here rely on cancelling the query from a watchdog thread.
+STATEMENT_TIMEOUT_STATEMENTS = {
+    'postgresql': "SET statement_timeout = {milliseconds}",
+    'snowflake': "ALTER SESSION SET STATEMENT_TIMEOUT_IN_SECONDS = {seconds}",
+    'mysql': "SET SESSION max_execution_time = {milliseconds}",
+    'mariadb': "SET SESSION max_statement_time = {seconds}",
+}
+STATEMENT_TIMEOUT_INFO_KEY = 'statement_timeout'
+# Error codes of the driver (SQLSTATE or vendor code) for a statement cancelled by the timeout or a cancel, per dialect
+TIMEOUT_ERROR_CODES = {
+    'postgresql': {'57014'},
+    'mysql': {3024, 1317},
+    'mariadb': {1969, 1317},
+    'snowflake': {604, 630},
+}
+# With a native statement timeout, the watchdog is only a backstop and fires a bit later
+WATCHDOG_GRACE_SECONDS = 2.0
+
+
+class QueryTimeoutError(Exception):
+    """
+    Raised when a query does not complete within its time limit.
+    """
+
+    def __init__(self, message, timeout):
+        super().__init__(message)
+        self.timeout = timeout
+
+
+class ResultLimitExceeded(Exception):
+    """
+    Raised when fetching of the results is aborted, as they are beyond the row or size limits.
+    """
+
+    def __init__(self, message, rows_fetched):
+        super().__init__(message)
+        self.rows_fetched = rows_fetched
+
+
+class QueryValidationError(Exception):
+    """
+    Raised when the database rejects a query without running it: syntax errors, unknown tables or columns.
+    """
+
+
+class QueryWatchdog:
+    """
+    Cancels the query running on a DBAPI connection, when it runs beyond the timeout.
+    """
+
+    def __init__(self, dbapi_connection, timeout: float):
+        self.fired = False
+        self._dbapi_connection = dbapi_connection
+        self._timer = threading.Timer(timeout, self._cancel_query)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _cancel_query(self):
+        self.fired = True
+        # psycopg2 and most drivers support cancel(), sqlite3 supports interrupt()
+        for method_name in ('cancel', 'interrupt'):
+            method = getattr(self._dbapi_connection, method_name, None)
+            if callable(method):
+                try:
+                    method()
+                    logging.info("Cancelled the query running beyond its timeout")
+                except Exception as e:
+                    logging.error(f"Exception while cancelling the query: {str(e)}")
+                return
+        logging.warning(f"Can not cancel the query, {type(self._dbapi_connection).__name__} does not support it")
+
+    def stop(self):
+        self._timer.cancel()
+
 # Base class for all connectors
 
 
@@ -26,28 +152,128 @@ class DatabaseConnector(ABC):
 
     def __init__(self, config: Dict):
         self.type = config.get('type')
+        self.result_cache = None
+        self.data_version = None
+        # Results estimated larger than the budget (bytes) are spilled to disk
+        self.memory_budget = None
+        self.spill_directory = None
 
     @abstractmethod
-    def execute_and_fetch_all(self, query: str) -> tuple[List[Dict], float]:
+    def execute_and_fetch_all(self, query: str, use_cache: bool = False, stats: Optional[Dict] = None,
+                              schema: Optional[str] = None,
+                              timeout: Optional[float] = None, max_rows: Optional[int] = None,
+                              max_bytes: Optional[int] = None,
+                              abort_check: Optional[Callable[[int], Optional[str]]] = None) -> tuple[List[Dict], float]:
         """
         Execute the query and return the results along with runtime.
         Args:
             query: Query to be executed
-        Returns: Tuple of results and runtime
+            use_cache: Serve the results from the result cache when available
+            stats: Optional dict, populated with execution details (e.g cache_hit)
+            schema: Schema to run the query in. Bound to the connection running this query only.
+            timeout: Time limit in seconds. QueryTimeoutError is raised when the query runs beyond it.
+            max_rows: ResultLimitExceeded is raised as soon as more rows are fetched
+            max_bytes: ResultLimitExceeded is raised as soon as the fetched rows are larger (estimated)
+            abort_check: Called with the number of rows fetched so far, after every batch. Fetching is aborted
+                with ResultLimitExceeded when it returns a reason.
+        Returns: Tuple of results (a sequence of dict rows, e.g. ResultSet) and runtime
         """
         pass
 
+    def set_result_cache(self, result_cache: Optional[ResultCache], data_version: Optional[str] = None):
+        """
+        Attach the persistent result cache to this connector.
+        Args:
+            result_cache: cache to be used
+            data_version: token identifying the version of the data. Auto-detected when not provided.
+        """
+        if result_cache is None:
+            return
+        data_version = data_version or self.detect_data_version()
+        if data_version is None:
+            logging.warning(f"Could not detect data version for {self.get_connection_id()}, "
+                            f"result cache is disabled. Set 'data_version' in the result_cache config to enable it.")
+            return
+        self.result_cache = result_cache
+        self.data_version = str(data_version)
+        logging.info(f"Result cache enabled for {self.get_connection_id()}, data version: {self.data_version}")
+
+    def set_spill(self, memory_budget: Optional[int], directory: Optional[str] = None):
+        """
+        Spill results larger than the memory budget to disk, as a SpilledResultSet.
+        Args:
+            memory_budget: estimated size of a result in bytes, beyond which it is spilled. None disables spilling.
+            directory: for the spill files. Defaults to the system's temporary directory.
+        """
+        self.memory_budget = memory_budget
+        self.spill_directory = directory
+        if memory_budget:
+            logging.info(f"Results larger than {memory_budget} bytes are spilled to disk for {self.get_connection_id()}")
+
+    def detect_data_version(self) -> Optional[str]:
+        """
+        Returns a token which changes when the underlying data changes. None, if it can not be detected.
+        """
+        return None
+
+    def get_connection_id(self) -> str:
+        return str(self.type)
+
+    def get_table_names(self, schema: Optional[str] = None) -> Optional[set]:
+        """
+        Case-folded names of the tables and views which queries running in the schema reference unqualified.
+        None, when they can not be listed.
+        """
+        return None
+
+    def validate_query(self, query: str, schema: Optional[str] = None) -> bool:
+        """
+        Checks the query without running it (e.g. EXPLAIN). Raises QueryValidationError when the database rejects
+        it. Returns whether it was checked: False when the database can't check queries.
+        """
+        return False
+
+    def explain_query(self, query: str, schema: Optional[str] = None, analyze: bool = False,
+                      timeout: Optional[float] = None) -> Optional[QueryPlan]:
+        """
+        Plan of the query, from EXPLAIN. With analyze, read-only queries are run for their actual time and rows
+        (EXPLAIN ANALYZE), within the timeout, where the database supports it.
+        None, when the database doesn't explain queries or the query can't be explained.
+        """
+        return None
+
     def cleanup(self):
         pass
 
     def get_db_type(self):
         return self.type
 
+    def get_dialect(self) -> Optional[str]:
+        """
+        SQL dialect of the database (e.g postgresql, snowflake), when known.
+        """
+        return None
+
 
 # Connector for SQLAlchemy databases
 class SqlAlchemyConnector(DatabaseConnector):
+    """
+    Each execution checks out its own connection from the engine's pool, so worker threads don't share
+    a DBAPI connection. Pool is configured with pool_size, max_overflow, pool_timeout, pool_pre_ping and
+    pool_recycle from the database config.
 
-    def __init__(self, config: Dict):
+    Schema of a query is bound to the connection running it. Pooled connections remember their current schema,
+    so the schema is switched only when the connection was last used for a different one.
+
+    Query timeouts use the dialect's statement timeout where available (tracked per connection like the schema).
+    A watchdog cancels the query on the connection otherwise, or when the native timeout does not kick in.
+
+    Results are streamed in batches of fetch_size rows (from the database config), using server side cursors
+    where the dialect supports them, so that row limits can stop the fetch early. Rows are kept as fetched in a
+    ResultSet, sharing one column header, or stored in an ArrowResultSet with result_format: arrow.
+    """
+
+    def __init__(self, config: Dict, default_pool_size: int = DEFAULT_POOL_SIZE):
         super().__init__(config)
         connection_string = config.get('connection')
         if not connection_string:
@@ -62,32 +288,352 @@ class SqlAlchemyConnector(DatabaseConnector):
         if db_type == "sqlite":
             connect_args["check_same_thread"] = False
 
-        self.engine = sqlalchemy.create_engine(connection_string, connect_args=connect_args)
-        self.connection = self.engine.connect()
+        # In-memory sqlite databases live in a single connection: all the threads share it, as a connection of
+        # its own would be an empty database. Their queries are serialized by sqlite
+        if db_type == "sqlite" and parsed_url.path in ("", "/", "/:memory:"):
+            pool_args = {'poolclass': StaticPool}
+        else:
+            pool_args = {'pool_size': default_pool_size, 'pool_pre_ping': True}
+            pool_args.update({key: config[key] for key in POOL_CONFIG_KEYS if key in config})
+
+        self.fetch_size = config.get('fetch_size', DEFAULT_FETCH_SIZE)
+        self.result_format = config.get('result_format', RESULT_FORMAT_ROWS)
+        self.engine = sqlalchemy.create_engine(connection_string, connect_args=connect_args, **pool_args)
+        # Table names by schema, listed once. See get_table_names
+        self.table_names = {}
+        self.table_names_lock = threading.Lock()
+        # Validation outcomes (error message, None for valid queries) by normalized query and schema, least recently
+        # used first. See validate_query
+        self.validation_cache = OrderedDict()
+        self.validation_cache_lock = threading.Lock()
+        # Estimated number of rows of the tables by name, for the costs of SQLite plans. See explain_query
+        self.table_rows = {}
+        logging.info(f"Created engine for {self.get_connection_id()}, pool: {self.engine.pool.status()}")
+
+    @override
+    def get_connection_id(self) -> str:
+        return self.engine.url.render_as_string(hide_password=True)
+
+    @override
+    def get_dialect(self) -> Optional[str]:
+        return self.engine.dialect.name
+
+    @override
+    def get_table_names(self, schema: Optional[str] = None) -> Optional[set]:
+        if SET_SCHEMA_STATEMENTS.get(self.engine.dialect.name, DEFAULT_SET_SCHEMA_STATEMENT) is None:
+            # Queries don't run in the schema on this dialect, see _set_schema
+            schema = None
+        with self.table_names_lock:
+            if schema not in self.table_names:
+                try:
+                    inspector = sqlalchemy.inspect(self.engine)
+                    names = inspector.get_table_names(schema=schema) + inspector.get_view_names(schema=schema)
+                    self.table_names[schema] = {name.lower() for name in names}
+                except Exception as e:
+                    logging.error(f"Exception while listing tables of schema {schema}: {str(e)}")
+                    self.table_names[schema] = None
+            return self.table_names[schema]
+
+    @override
+    def validate_query(self, query: str, schema: Optional[str] = None) -> bool:
+        statement = VALIDATION_STATEMENTS.get(self.engine.dialect.name)
+        if statement is None:
+            return False
+        key = (normalize_sql(query), schema)
+        with self.validation_cache_lock:
+            found = key in self.validation_cache
+            if found:
+                self.validation_cache.move_to_end(key)
+                error = self.validation_cache[key]
+        if not found:
+            error = self._explain(statement.format(query=str(query).strip().rstrip(';')), schema)
+            if error is False:
+                return False
+            with self.validation_cache_lock:
+                self.validation_cache[key] = error
+                while len(self.validation_cache) > VALIDATION_CACHE_SIZE:
+                    self.validation_cache.popitem(last=False)
+        if error is not None:
+            raise QueryValidationError(error)
+        return True
+
+    def _explain(self, statement: str, schema: Optional[str]):
+        """
+        Error message of the database for the statement, None when it succeeds. False when it could not be run,
+        for reasons other than the query.
+        """
+        try:
+            with self.engine.connect() as connection:
+                self._set_schema(connection, schema)
+                try:
+                    connection.execute(sqlalchemy.text(statement)).fetchall()
+                    return None
+                except (ProgrammingError, OperationalError) as e:
+                    if e.connection_invalidated:
+                        raise e
+                    return str(e.orig if e.orig is not None else e).strip()
+        except Exception as e:
+            logging.error(f"Exception while validating query: {str(e)}")
+            return False
+
+    @override
+    def explain_query(self, query: str, schema: Optional[str] = None, analyze: bool = False,
+                      timeout: Optional[float] = None) -> Optional[QueryPlan]:
+        dialect = self.engine.dialect.name
+        if dialect not in ('postgresql', 'sqlite'):
+            return None
+        query = str(query).strip().rstrip(';')
+        try:
+            with self.engine.connect() as connection:
+                self._set_schema(connection, schema)
+                if dialect == 'sqlite':
+                    # SQLite has no costs, they are estimated from the number of rows of the tables
+                    plan_rows = connection.execute(sqlalchemy.text(f"EXPLAIN QUERY PLAN {query}")).fetchall()
+                    analysis = analyze_sql(query, schema)
+                    table_rows = {table: self._estimate_table_rows(connection, table) for table in analysis.tables}
+                    return parse_sqlite_plan(plan_rows, table_rows, analysis.aliases)
+
+                analyze = analyze and is_read_only(query)
+                watchdog = None
+                if analyze and timeout and not self._set_statement_timeout(connection, timeout):
+                    watchdog = QueryWatchdog(connection.connection.dbapi_connection, timeout)
+                try:
+                    options = "ANALYZE, FORMAT JSON" if analyze else "FORMAT JSON"
+                    plan = connection.execute(sqlalchemy.text(f"EXPLAIN ({options}) {query}")).scalar()
+                finally:
+                    if watchdog is not None:
+                        watchdog.stop()
+                    # Nothing the query did is kept
+                    connection.rollback()
+                return parse_postgres_plan(plan)
+        except Exception as e:
+            logging.error(f"Exception while explaining query: {str(e)}")
+            return None
+
+    def _estimate_table_rows(self, connection: sqlalchemy.Connection, table: str) -> Optional[int]:
+        """
+        Number of rows of the SQLite table, estimated by its largest rowid (no table scan). Counted for tables
+        without rowid. None when the table is unknown.
+        """
+        if table in self.table_rows:
+            return self.table_rows[table]
+        quoted_table = self.engine.dialect.identifier_preparer.quote(table)
+        rows = None
+        for statement in (f"SELECT max(rowid) FROM {quoted_table}", f"SELECT count(*) FROM {quoted_table}"):
+            try:
+                rows = connection.execute(sqlalchemy.text(statement)).scalar() or 0
+                break
+            except SQLAlchemyError:
+                connection.rollback()
+        self.table_rows[table] = rows
+        return rows
 
     @override
-    def execute_and_fetch_all(self, query: str) -> tuple[List[Dict], float]:
+    def detect_data_version(self) -> Optional[str]:
+        dialect = self.engine.dialect.name
         try:
+            if dialect == "sqlite":
+                database = self.engine.url.database
+                if not database or database == ":memory:":
+                    return None
+                file_stat = os.stat(database)
+                return f"{file_stat.st_mtime_ns}:{file_stat.st_size}"
+            elif dialect == "snowflake":
+                query = "SELECT MAX(last_altered) FROM information_schema.tables"
+            elif dialect == "postgresql":
+                query = ("SELECT COALESCE(SUM(n_tup_ins + n_tup_upd + n_tup_del), 0) "
+                         "FROM pg_stat_user_tables")
+            else:
+                return None
+            with self.engine.connect() as connection:
+                version = connection.execute(sqlalchemy.text(query)).scalar()
+            return None if version is None else str(version)
+        except Exception as e:
+            logging.error(f"Exception while detecting data version: {str(e)}")
+            return None
+
+    @staticmethod
+    def _apply_session_setting(connection: sqlalchemy.Connection, info_key: str, value, statement: str) -> bool:
+        """
+        Runs the statement changing a session setting, unless the pooled connection already has this value.
+        """
+        if connection.info.get(info_key) == value:
+            return True
+        try:
+            connection.execute(sqlalchemy.text(statement))
+            # Commit, so that the setting outlives the rollback done when the connection returns to pool
+            connection.commit()
+            connection.info[info_key] = value
+            return True
+        except SQLAlchemyError as e:
+            logging.error(f"Exception while changing session setting {info_key} to {value}: {str(e)}")
+            connection.rollback()
+            return False
+
+    def _set_schema(self, connection: sqlalchemy.Connection, schema: Optional[str]):
+        if not schema:
+            return
+        statement = SET_SCHEMA_STATEMENTS.get(self.engine.dialect.name, DEFAULT_SET_SCHEMA_STATEMENT)
+        if statement is None:
+            return
+        quoted_schema = self.engine.dialect.identifier_preparer.quote_schema(schema)
+        self._apply_session_setting(connection, SCHEMA_INFO_KEY, schema, statement.format(schema=quoted_schema))
+
+    def _set_statement_timeout(self, connection: sqlalchemy.Connection, timeout: Optional[float]) -> bool:
+        """
+        Sets the native statement timeout of the session. Returns False when the dialect has none.
+        """
+        statement = STATEMENT_TIMEOUT_STATEMENTS.get(self.engine.dialect.name)
+        if statement is None:
+            return False
+        # Connections which never had a timeout don't need to be reset
+        if not timeout and not connection.info.get(STATEMENT_TIMEOUT_INFO_KEY):
+            return True
+        seconds = max(1, int(round(timeout))) if timeout else 0
+        milliseconds = max(1, int(timeout * 1000)) if timeout else 0
+        # Track the value the statement sets, timeouts rounding to the same seconds may differ in milliseconds
+        value = milliseconds if '{milliseconds}' in statement else seconds
+        statement = statement.format(seconds=seconds, milliseconds=milliseconds)
+        return self._apply_session_setting(connection, STATEMENT_TIMEOUT_INFO_KEY, value, statement)
+
+    def _is_timeout_error(self, error: SQLAlchemyError) -> bool:
+        """
+        Whether the database failed the statement for running beyond its statement timeout, or for being cancelled.
+        """
+        codes = TIMEOUT_ERROR_CODES.get(self.engine.dialect.name)
+        orig = getattr(error, 'orig', None)
+        if not codes or orig is None:
+            return False
+        # psycopg2 has pgcode, psycopg sqlstate, snowflake and mysql-connector errno, pymysql the code as first arg
+        candidates = [getattr(orig, name, None) for name in ('pgcode', 'sqlstate', 'errno')]
+        if orig.args:
+            candidates.append(orig.args[0])
+        return any(code in codes for code in candidates if isinstance(code, (str, int)))
+
+    @staticmethod
+    def _fetch_rows(result: sqlalchemy.CursorResult, max_rows: Optional[int], max_bytes: Optional[int],
+                    abort_check: Optional[Callable[[int], Optional[str]]],
+                    result_format: str = RESULT_FORMAT_ROWS, fetch_size: int = DEFAULT_FETCH_SIZE,
+                    memory_budget: Optional[int] = None, spill_directory: Optional[str] = None) -> List[Dict]:
+        """
+        Fetches the rows batch by batch, closing the cursor as soon as a limit is crossed.
+        Fingerprint of the rows is computed along the way.
+        Arrow results fall back to a ResultSet when some values can't be stored in arrow unchanged.
+        Rows fetched beyond the memory budget are written to disk, the result is then a SpilledResultSet.
+        """
+        column_names = list(result.keys())
+        fingerprint = ResultFingerprint(column_names)
+        rows = []
+        builder = ArrowResultBuilder(column_names) if result_format == RESULT_FORMAT_ARROW else None
+        spiller = None
+        row_count = 0
+        size = 0
+        # Batch size is explicit, yield_per is not honored by dialects without server side cursors (e.g sqlite)
+        for batch in result.partitions(fetch_size):
+            if builder is not None and not builder.add_rows(batch):
+                logging.debug("Result has values not supported by arrow, fetching it as rows")
+                rows.extend(builder.tuples())
+                builder = None
+            if spiller is not None:
+                spiller.add_rows(batch)
+            elif builder is None:
+                rows.extend(batch)
+            fingerprint.add_rows(batch)
+            row_count += len(batch)
+            if max_bytes is not None or memory_budget:
+                size += sum(sys.getsizeof(value) for row in batch for value in row)
+            if spiller is None and memory_budget and size + ROW_OVERHEAD_BYTES * row_count > memory_budget:
+                logging.info(f"Result is larger than {memory_budget} bytes after {row_count} rows, spilling to disk")
+                spiller = ResultSpiller(column_names, memory_budget, spill_directory)
+                spiller.add_rows(rows if builder is None else builder.tuples())
+                rows = []
+                builder = None
+
+            reason = None
+            if max_rows is not None and row_count > max_rows:
+                reason = f"Result has more than {max_rows} rows"
+            elif max_bytes is not None and size > max_bytes:
+                reason = f"Result is larger than {max_bytes} bytes"
+            if reason is None and abort_check is not None:
+                reason = abort_check(row_count)
+            if reason is not None:
+                result.close()
+                raise ResultLimitExceeded(f"Fetching results aborted after {row_count} rows: {reason}", row_count)
+        if spiller is not None:
+            return spiller.build(fingerprint)
+        if builder is not None:
+            return builder.build(fingerprint)
+        if result_format == RESULT_FORMAT_DICTS:
+            return FingerprintedRows((dict(zip(column_names, row)) for row in rows), fingerprint=fingerprint)
+        return ResultSet(column_names, rows, fingerprint=fingerprint)
+
+    @override
+    def execute_and_fetch_all(self, query: str, use_cache: bool = False, stats: Optional[Dict] = None,
+                              schema: Optional[str] = None,
+                              timeout: Optional[float] = None, max_rows: Optional[int] = None,
+                              max_bytes: Optional[int] = None,
+                              abort_check: Optional[Callable[[int], Optional[str]]] = None) -> tuple[List[Dict], float]:
+        try:
+            stime = time.time()
+            cache_key = None
+            if use_cache and self.result_cache is not None:
+                cache_key = ResultCache.make_key(str(query), self.get_connection_id(), self.data_version, schema)
+                data = self.result_cache.get(cache_key)
+                if stats is not None:
+                    stats[CACHE_HIT] = data is not None
+                if data is not None:
+                    return data, (time.time() - stime)
+
             # if the query is str, need to wrap it in text(str)
             if isinstance(query, str):
                 query = sqlalchemy.text(query)
 
-            stime = time.time()
-            result = self.connection.execute(query)
-            rows = result.fetchall()
+            # Time spent waiting for a pooled connection is not part of the query runtime
+            checkout_time = time.time()
+            with self.engine.connect() as connection:
+                stime = time.time()
+                if stats is not None:
+                    stats[POOL_WAIT_TIME] = stime - checkout_time
+                self._set_schema(connection, schema)
+                native_timeout = self._set_statement_timeout(connection, timeout)
 
-            column_names = result.keys()
+                watchdog = None
+                if timeout:
+                    watchdog = QueryWatchdog(connection.connection.dbapi_connection,
+                                             timeout + (WATCHDOG_GRACE_SECONDS if native_timeout else 0))
+                stime = time.time()
+                try:
+                    result = connection.execute(query, execution_options={'stream_results': True,
+                                                                          'yield_per': self.fetch_size})
+                    data = self._fetch_rows(result, max_rows, max_bytes, abort_check, self.result_format,
+                                           self.fetch_size, self.memory_budget, self.spill_directory)
+                    runtime = time.time() - stime
+                except SQLAlchemyError as e:
+                    if timeout and (watchdog.fired or (native_timeout and self._is_timeout_error(e))):
+                        # Connection state is unknown after a cancel, don't return it to the pool. Unless it is the
+                        # only connection of an in-memory database, which sqlite's interrupt leaves usable
+                        if not isinstance(self.engine.pool, StaticPool):
+                            connection.invalidate()
+                        raise QueryTimeoutError(f"Query timed out after {timeout} seconds", timeout) from e
+                    raise e
+                finally:
+                    if watchdog is not None:
+                        watchdog.stop()
 
-            # Convert rows to list of dictionaries
-            data = []
-            for row in rows:
-                row_dict = dict(zip(column_names, row))
-                data.append(row_dict)
-            return data, (time.time() - stime)
+            # Spilled results would have to be loaded in memory for caching
+            if cache_key is not None and not isinstance(data, SpilledResultSet):
+                self.result_cache.put(cache_key, data)
+            return data, runtime
         except SQLAlchemyError as e:
             # traceback.print_exc()
             logging.error(f"SQLAlchemy Exception occurred while running query: {str(e)}")
             raise e
+        except QueryTimeoutError as e:
+            logging.error(f"Query timed out: {str(e)}")
+            raise e
+        except ResultLimitExceeded as e:
+            logging.error(str(e))
+            raise e
         except Exception as e:
             # Handle other exceptions
             logging.error(f"Exception occurred while running query: {str(e)}")
@@ -99,12 +645,13 @@ class SqlAlchemyConnector(DatabaseConnector):
             self.engine.dispose()
 
 
-def create_connector(db_config: Dict) -> DatabaseConnector:
+def create_connector(db_config: Dict, default_pool_size: int = DEFAULT_POOL_SIZE) -> DatabaseConnector:
     """
     Factory to create connectors
     Args:
         db_config:
+        default_pool_size: connection pool size, when it is not set in db_config
     Returns: one of the database connectors
     """
     if db_config['type'] == DatabaseType.SQLALCHEMY.value.lower():
-        return SqlAlchemyConnector(db_config)
+        return SqlAlchemyConnector(db_config, default_pool_size=default_pool_size)
@@ -7,7 +7,9 @@ from logging.handlers import RotatingFileHandler
 
 import yaml
 
+from base_benchmark import TaskResult
 from gen_report.report_generator import generate_report
+from utils.journal import RunJournal, get_journal_path, load_completed_tasks
 from utils.utils import exclude_filter, filter_schema
 from utils.utils import include_filter
 
@@ -19,11 +21,15 @@ class Driver:
     2. Picks up the class mentioned in the benchmark_config.yaml and initializes it.
     3. Runs the benchmark with the specified workload.
     4. Generates the report. Default is html report. User can implement their own report format in gen_report package.
+
+    Completed tasks are journaled under journals/<run_id>.jsonl. A fresh run starts a new journal, the journal of an
+    earlier run with the same run id is rotated to journals/<run_id>.jsonl.1. When resuming a run, tasks already in
+    its journal are skipped and their results are merged into the final report.
     """
 
     def __init__(self, benchmark_config: str, benchmark_name: str, workload_config: str, queries: str,
                  exclude_queries: str, run_id: str, schema_filter: str, halt_on_error: bool,
-                 report_format='html', intent_based_match=True):
+                 report_format='html', intent_based_match=True, resume: str = None):
         self._setup_logger()
         self.benchmark_config = benchmark_config
         self.benchmark_name = benchmark_name
@@ -35,6 +41,11 @@ class Driver:
         self.halt_on_error = halt_on_error
         self.report_format = report_format
         self.intent_based_match = intent_based_match
+        self.resume = resume
+        self.journaled_results = []
+        if resume:
+            # Resumed run keeps the run id, and appends to the same journal
+            self.run_id = resume
         try:
             with open(self.benchmark_config, 'r') as f:
                 self.benchmark_config_data = yaml.safe_load(f)
@@ -53,6 +64,9 @@ class Driver:
                 if exclude_queries:
                     self.workload_data = exclude_filter(self.workload_data.values(), exclude_queries.split(","))
 
+                if resume:
+                    self._load_journaled_results()
+
                 logging.info(f"Workload len: {len(self.workload_data)}")
 
         except FileNotFoundError as e:
@@ -60,6 +74,19 @@ class Driver:
             print(f"{benchmark_config} file not found: {e}")
             raise e
 
+    def _load_journaled_results(self):
+        journal_path = get_journal_path(self.run_id)
+        if not os.path.exists(journal_path):
+            raise FileNotFoundError(f"Journal for run {self.run_id} not found at {journal_path}")
+
+        journaled = {query_name: TaskResult.from_dict(record)
+                     for query_name, record in load_completed_tasks(journal_path).items()
+                     if query_name in self.workload_data}
+        self.journaled_results = list(journaled.values())
+        self.workload_data = exclude_filter(self.workload_data.values(), list(journaled.keys()))
+        print(f"Resuming run {self.run_id}: {len(self.journaled_results)} queries already completed, "
+              f"{len(self.workload_data)} remaining")
+
     def _setup_logger(self):
 
         # Determine the full path to the logs directory
@@ -121,7 +148,10 @@ class Driver:
     def _run_benchmark(self, benchmark_instance, benchmark_config: dict):
         if benchmark_instance is None:
             raise Exception("Benchmark can not be None")
+        # Only a resumed run appends to the journal of its run id
+        journal = RunJournal(get_journal_path(self.run_id), resume=bool(self.resume))
         try:
+            benchmark_instance.set_journal(journal)
             benchmark_instance.setup(benchmark_config)
             benchmark_instance.run_benchmark()
             benchmark_instance.cleanup()
@@ -130,10 +160,12 @@ class Driver:
             logging.error(f"Error during benchmark:", exc_info=True)
             print(f"Error during benchmark: {str(e)}")
             traceback.print_exc()
+        finally:
+            journal.close()
 
         # Generate report
         print("Generating report")
-        generate_report(self.run_id, benchmark_instance.get_results(), self.report_format)
+        generate_report(self.run_id, self.journaled_results + benchmark_instance.get_results(), self.report_format)
 
 
 def parse_arguments():
@@ -163,6 +195,9 @@ def parse_arguments():
                         required=False, default='html')
     parser.add_argument('--disable_intent_based_match', action='store_false', dest='intent_based_match',
                         help='Disable intent based match')
+    parser.add_argument('--resume', type=str,
+                        help='Resume the run with this run id. Queries completed in its journal are skipped',
+                        required=False, default=None)
 
     return parser.parse_args()
 
@@ -179,6 +214,7 @@ if __name__ == '__main__':
                     schema_filter=args.schema_filter,
                     halt_on_error=args.halt_on_error,
                     report_format=args.report_format,
-                    intent_based_match=args.intent_based_match
+                    intent_based_match=args.intent_based_match,
+                    resume=args.resume
                     )
     driver.run()
@@ -109,7 +109,8 @@ class LlamaIndexBenchmark(BenchmarkBase):
         result = TaskResult(query_info=query_info)
         try:
             stime = time.time()
-            response = self.llama_index_query_engine.query(query_info['question'])
+            response = self.rate_limited_call(result,
+                                              lambda: self.llama_index_query_engine.query(query_info['question']))
             result.generated_query = response.metadata["sql_query"]
             result.is_query_generated = True
             result.generation_time = time.time() - stime
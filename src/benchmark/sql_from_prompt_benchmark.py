@@ -11,10 +11,13 @@ import sqlalchemy as sa
 
 from base_benchmark import BenchmarkBase, TaskResult
 from benchmark.database_connectors import DatabaseConnector
+from utils.rate_limiter import estimate_tokens
 
 # Assumption is that you will have OPENAI key in your environment variable
 openai.api_key = os.environ.get('OPENAI_API_KEY')
 DEFAULT_MODEL = 'gpt-4-1106-preview'
+# Expected size of the response, used for rate limiting on tokens per minute
+MAX_COMPLETION_TOKENS_ESTIMATE = 500
 
 
 class SQLFromPromptBenchmark(BenchmarkBase):
@@ -113,25 +116,26 @@ class SQLFromPromptBenchmark(BenchmarkBase):
         logging.info(f"Prompt: {prompt}")
         return prompt
 
-    def query_openai(self, prompt: str, model=DEFAULT_MODEL) -> str:
+    def query_openai(self, prompt: str, model=DEFAULT_MODEL, task_result: Optional[TaskResult] = None) -> str:
         """
         Prompt to the OpenAI API and returns the response.
 
         Parameters:
         prompt (str): The prompt to be sent to openAI.
         model (str): The model to use..
+        task_result (TaskResult): time spent throttled by the rate limiter is recorded in it.
 
         Returns:
         str: query response from the model.
         """
         response = ""
         try:
-            response = openai.ChatCompletion.create(
+            response = self.rate_limited_call(task_result, lambda: openai.ChatCompletion.create(
                 model=model,
                 messages=[{"role": "system", "content": "You are a helpful assistant."},
                           {"role": "user", "content": prompt}],
                 temperature=0.0
-            )
+            ), tokens=estimate_tokens(prompt) + MAX_COMPLETION_TOKENS_ESTIMATE)
             if response.choices:
                 content = response["choices"][0]["message"]["content"]
                 # Sometimes GPT-4 sends in this format.
@@ -163,7 +167,7 @@ class SQLFromPromptBenchmark(BenchmarkBase):
             stime = time.time()
             prompt = self.generate_prompt(query_info)
 
-            generated_query = self.query_openai(prompt=prompt)
+            generated_query = self.query_openai(prompt=prompt, task_result=result)
             logging.info(f"Response for query_info: {query_name}: {generated_query}")
 
             if generated_query == "":
@@ -172,8 +176,7 @@ class SQLFromPromptBenchmark(BenchmarkBase):
             result.generated_query = generated_query
             result.is_query_generated = True
             result.generation_time = time.time() - stime
-            # No need to populate generated table names
-            result.generated_query_tables = []
+            # Generated table names are extracted from the query, see BenchmarkBase._generate_stage
             if generated_query is not None and generated_query.strip() != "" and query_info['schemas'] is not None:
                 golden_query = query_info['golden_query'].replace('\n', ' ')
                 gen_query = generated_query.replace('\n', ' ')
@@ -0,0 +1,51 @@
+import pickle
+import unittest
+from decimal import Decimal
+
+from ..utils.arrow_result import ArrowResultBuilder
+from ..utils.result_set_match import compare_exact_match, compare_results, count_deduplicated_rows
+
+
+def arrow_result(columns, *batches):
+    builder = ArrowResultBuilder(columns)
+    for batch in batches:
+        assert builder.add_rows(batch)
+    return builder.build()
+
+
+class TestArrowResultSet(unittest.TestCase):
+
+    def test_rows_round_trip(self):
+        result = arrow_result(('A', 'b'), [(None, 'x')], [(Decimal('1.5'), None), (Decimal('2.0'), '"y"')])
+        expected = [{'A': None, 'b': 'x'}, {'A': Decimal('1.5'), 'b': None}, {'A': Decimal('2.0'), 'b': '"y"'}]
+        self.assertEqual(3, len(result))
+        self.assertEqual(expected, list(result))
+        self.assertEqual(expected[-1], result[-1])
+        self.assertEqual(expected[1:], result[1:])
+        self.assertEqual(expected, pickle.loads(pickle.dumps(result)))
+        self.assertEqual([{'a': None, 'b': 'x'}, {'a': Decimal('1.5'), 'b': None}, {'a': Decimal('2.0'), 'b': 'y'}],
+                         result.to_rows(key=str.lower,
+                                        value=lambda value: value.strip('"') if isinstance(value, str) else value))
+
+    def test_values_altered_by_arrow_are_refused(self):
+        builder = ArrowResultBuilder(('a',))
+        self.assertFalse(builder.add_rows([(1,), (2.5,)]))
+        self.assertFalse(builder.add_rows([(Decimal('1.5'),), (Decimal('2.25'),)]))
+        self.assertFalse(builder.add_rows([({'k': 1},)]))
+        self.assertTrue(builder.add_rows([(1,)]))
+        self.assertFalse(builder.add_rows([('1',)]))
+        self.assertEqual([(1,)], builder.tuples())
+
+    def test_comparison(self):
+        rules = [{'columns': ['name', 'total'], 'match': 'exact'}]
+        expected = [{'NAME': 'x', 'TOTAL': 1.04}, {'NAME': 'y', 'TOTAL': 2.0}]
+        actual = arrow_result(('name', 'sum'), [('y', 2.0), ('x', 1.0)])
+        self.assertEqual((True, ''), compare_results(expected, actual, rules))
+        self.assertEqual((True, ''), compare_results(actual, arrow_result(('Name', 'Sum'), [('x', 1.0), ('y', 2.0)]),
+                                                     [{'columns': ['name', 'sum'], 'match': 'exact'}]))
+        self.assertFalse(compare_results(expected, arrow_result(('name', 'sum'), [('y', 2.0), ('x', 1.2)]),
+                                         rules)[0])
+        self.assertEqual((True, ''), compare_exact_match(actual, arrow_result(('name', 'sum'), [('y', 2.0)],
+                                                                              [('x', 1.0)])))
+        self.assertFalse(compare_exact_match(actual, [{'name': 'x', 'sum': 1.0}, {'name': 'y', 'sum': 2.0}])[0])
+        self.assertEqual(1, count_deduplicated_rows(arrow_result(('Name',), [('x',), ('x',)]), rules))
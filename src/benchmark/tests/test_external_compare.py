@@ -0,0 +1,94 @@
+import os
+import unittest
+
+from ..utils.external_compare import ResultSpiller, SpilledResultSet, compare_spilled
+from ..utils.result_set_match import compare_results, compile_comparison_rules
+
+
+def spill(columns, rows, memory_budget=1):
+    spiller = ResultSpiller(columns, memory_budget)
+    spiller.add_rows(rows)
+    return spiller.build()
+
+
+class TestExternalCompare(unittest.TestCase):
+
+    def setUp(self):
+        self.rules = [{'columns': ['*'], 'match': 'exact'}]
+        self.rows = [('"x"', 1.04, 2), ('y', None, 3), ('z', 2.25, 3), ('z', 2.25, 3)]
+
+    def test_spilled_result(self):
+        result = spill(['A', 'b', 'c'], self.rows)
+        self.assertIsInstance(result, SpilledResultSet)
+        self.assertEqual(4, len(result))
+        self.assertEqual({'A': 'y', 'b': None, 'c': 3}, result[1])
+        self.assertEqual(self.rows, [tuple(row.values()) for row in result])
+        path = result.spill_file.path
+        self.assertTrue(os.path.exists(path))
+        del result
+        self.assertFalse(os.path.exists(path))
+
+    def test_same_outcome_as_in_memory(self):
+        expected = spill(['A', 'b', 'c'], self.rows[:3])
+        actual_rows = [('z', 2.2, 3), ('x', 1.0, 2), ('y', 0.0, 3)]
+        actual = spill(['a', 'b', 'c'], actual_rows)
+        plan = compile_comparison_rules(self.rules)
+        self.assertEqual((True, ''), compare_spilled(expected, actual, plan))
+        self.assertEqual((True, ''), compare_results(expected, actual, self.rules))
+
+        in_memory = [dict(zip(['a', 'b', 'c'], row)) for row in actual_rows[:2]]
+        self.assertEqual(compare_results(list(expected), in_memory, self.rules),
+                         compare_spilled(expected, in_memory, plan))
+
+    def test_mismatching_rows(self):
+        expected = spill(['a', 'b'], [('x', 1), ('y', 2)])
+        actual = spill(['a', 'b'], [('x', 1), ('y', 3)])
+        self.assertEqual((False, "Comparison failed for row: exp={'a': 'y', 'b': 2}, act={'a': 'y', 'b': 3}"),
+                         compare_results(expected, actual, self.rules))
+
+    def test_ambiguous_zeros_compared_externally(self):
+        plan = compile_comparison_rules(self.rules)
+        cases = [
+            # 0.04 matches 0.0 but not None
+            ([(0.04,), (None,)], [(0.0,), (None,)], True),
+            ([(0.04,), (None,)], [(0.0,), (0.0,)], False),
+            ([(0.04,), (None,)], [(None,), (0,)], False),
+            ([(-0.04,), (0.0,)], [(0.0,), (None,)], False),
+            ([(-0.04,), (0.0,)], [(-0.0,), (None,)], True),
+            # 'None' matches None but not 0
+            ([('x', 'None'), ('y', 0)], [('x', None), ('y', None)], True),
+            ([('x', 'None'), ('y', 0)], [('x', 0), ('y', None)], False),
+        ]
+        for expected_rows, actual_rows, outcome in cases:
+            columns = ['a', 'b'][:len(expected_rows[0])]
+            expected = spill(columns, expected_rows)
+            actual = spill(columns, actual_rows)
+            verdict = compare_spilled(expected, actual, plan)
+            self.assertIsNotNone(verdict, expected_rows)
+            self.assertEqual(outcome, verdict[0], (expected_rows, actual_rows))
+            self.assertEqual(compare_results(list(expected), list(actual), self.rules)[0], verdict[0])
+
+    def test_dedup_columns_other_than_compared(self):
+        # Rows are de-duplicated on a and b, only b is compared: first row of every (a, b) is kept
+        plan = compile_comparison_rules([{'columns': ['b'], 'match': 'exact'}])
+        plan = plan._replace(dedup_columns=('a', 'b'))
+        expected = spill(['a', 'b', 'c'], [('x', 1.04, 1), ('x', 1.04, 2), ('y', 0.04, 3), ('y', 0.04, 4)])
+        actual = spill(['a', 'b', 'c'], [('x', 1.0, 1), ('y', 0.0, 2), ('z', 0.0, 3)])
+        self.assertEqual((False, "Number of rows are different, example: exp={'a': 'x', 'b': 1.04, 'c': 1}, "
+                                 "act={'a': 'x', 'b': 1.0, 'c': 1}, #exp=2, #act=3"),
+                         compare_spilled(expected, actual, plan))
+        actual = spill(['a', 'b', 'c'], [('y', 0.0, 2), ('x', 1.0, 1), ('y', 0.0, 5)])
+        self.assertEqual((True, ''), compare_spilled(expected, actual, plan))
+        self.assertEqual((True, ''), compare_results(list(expected), list(actual), plan))
+
+    def test_in_memory_fallback(self):
+        # Numbers and strings in a column: compared in memory
+        expected = spill(['a'], [(1,), ('1',)])
+        actual = spill(['a'], [('1',), (1,)])
+        plan = compile_comparison_rules(self.rules)
+        self.assertIsNone(compare_spilled(expected, actual, plan))
+        self.assertEqual(compare_results(list(expected), list(actual), self.rules),
+                         compare_results(expected, actual, self.rules))
+        # Rules other than exact
+        plan = compile_comparison_rules([{'columns': ['a'], 'match': 'oneof'}])
+        self.assertIsNone(compare_spilled(expected, actual, plan))
@@ -0,0 +1,87 @@
+import os
+import tempfile
+import unittest
+
+from ..utils.journal import RunJournal, load_completed_tasks, load_journal
+
+
+class TestRunJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "journals", "run_1.jsonl")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_append_and_load(self):
+        journal = RunJournal(self.path, fsync_every=2)
+        journal.append({'query_info': {'query_name': 'q1'}, 'is_results_comparison_fine': True})
+        journal.append({'query_info': {'query_name': 'q2'}, 'is_results_comparison_fine': False})
+        # records are readable before the journal is closed
+        self.assertEqual(['q1', 'q2'], [r['query_info']['query_name'] for r in load_journal(self.path)])
+        journal.close()
+
+        # journal is appended to, when the run is resumed
+        journal = RunJournal(self.path, resume=True)
+        journal.append({'query_info': {'query_name': 'q3'}})
+        journal.close()
+        self.assertEqual(3, len(load_journal(self.path)))
+
+    def test_resume_after_torn_write(self):
+        journal = RunJournal(self.path)
+        journal.append({'query_info': {'query_name': 'q1'}})
+        journal.close()
+        with open(self.path, 'a') as f:
+            f.write('{"query_info": {"query_na')
+
+        journal = RunJournal(self.path, resume=True)
+        journal.append({'query_info': {'query_name': 'q2'}})
+        journal.close()
+        self.assertEqual(['q1', 'q2'], list(load_completed_tasks(self.path).keys()))
+
+        # torn first record
+        with open(self.path, 'w') as f:
+            f.write('{"query_info"')
+        journal = RunJournal(self.path, resume=True)
+        journal.append({'query_info': {'query_name': 'q3'}})
+        journal.close()
+        self.assertEqual(['q3'], list(load_completed_tasks(self.path).keys()))
+
+    def test_fresh_run_then_resume_skips_latest_run_tasks_only(self):
+        # earlier run with the same run id
+        journal = RunJournal(self.path)
+        journal.append({'query_info': {'query_name': 'q1'}, 'is_results_comparison_fine': True})
+        journal.append({'query_info': {'query_name': 'q2'}, 'is_results_comparison_fine': True})
+        journal.close()
+
+        # fresh run, interrupted after one task
+        journal = RunJournal(self.path)
+        journal.append({'query_info': {'query_name': 'q2'}, 'is_results_comparison_fine': False})
+        journal.close()
+        self.assertEqual(2, len(load_journal(self.path + ".1")))
+
+        # resume: only the task of the latest run is completed
+        completed = load_completed_tasks(self.path)
+        self.assertEqual(['q2'], list(completed.keys()))
+        self.assertFalse(completed['q2']['is_results_comparison_fine'])
+
+        journal = RunJournal(self.path, resume=True)
+        journal.append({'query_info': {'query_name': 'q1'}, 'is_results_comparison_fine': True})
+        journal.close()
+        self.assertEqual(['q2', 'q1'], list(load_completed_tasks(self.path).keys()))
+
+    def test_load_skips_partial_record(self):
+        journal = RunJournal(self.path)
+        journal.append({'query_info': {'query_name': 'q1'}})
+        journal.close()
+        with open(self.path, 'a') as f:
+            f.write('{"query_info": {"query_na')
+
+        records = load_journal(self.path)
+        self.assertEqual(1, len(records))
+        self.assertEqual('q1', records[0]['query_info']['query_name'])
+
+
+if __name__ == '__main__':
+    unittest.main()
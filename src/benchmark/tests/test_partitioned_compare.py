@@ -0,0 +1,52 @@
+import random
+import unittest
+
+from ..utils.arrow_result import ArrowResultBuilder
+from ..utils.process_pool import ProcessPool
+from ..utils.result_set import ResultSet
+from ..utils.result_set_match import compare_results
+
+
+class TestPartitionedCompare(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.pool = ProcessPool(2, partition_min_rows=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.shutdown()
+
+    def setUp(self):
+        self.rules = [{'columns': ['*'], 'match': 'exact'}]
+        self.rows = [(i % 7, f'"name{i % 5}"', i * 0.25) for i in range(200)]
+        self.shuffled = random.Random(1).sample(self.rows, len(self.rows))
+
+    def test_same_outcome_as_in_memory(self):
+        expected = ResultSet(['id', 'name', 'v'], self.rows)
+        self.assertEqual((True, ''), compare_results(expected, ResultSet(['ID', 'name', 'v'], self.shuffled),
+                                                     self.rules, pool=self.pool))
+
+        mismatching = list(self.shuffled)
+        mismatching[10] = (mismatching[10][0], 'other', mismatching[10][2])
+        actual = ResultSet(['ID', 'name', 'v'], mismatching)
+        verdict = compare_results(expected, actual, self.rules, pool=self.pool)
+        self.assertFalse(verdict[0])
+        self.assertEqual(compare_results(expected, actual, self.rules), verdict)
+
+    def test_arrow_results(self):
+        builder = ArrowResultBuilder(['id', 'name', 'v'])
+        self.assertTrue(builder.add_rows(self.rows))
+        expected = builder.build()
+        actual = ResultSet(['ID', 'name', 'v'], self.shuffled)
+        self.assertEqual((True, None, None), self.pool.compare_partitioned(expected, actual, [0, 1, 2], [0, 1, 2]))
+        actual = ResultSet(['id', 'v'], [(row[0], row[2]) for row in self.shuffled])
+        self.assertEqual((True, None, None), self.pool.compare_partitioned(expected, actual, [0, 2], [0, 1]))
+
+    def test_columns_without_keys(self):
+        # 1 doesn't match 1.0: compared row by row
+        expected = ResultSet(['a', 'b'], [(1, 'x')] * 10)
+        actual = ResultSet(['a', 'b'], [(1.0, 'x')] * 10)
+        self.assertIsNone(self.pool.compare_partitioned(expected, actual, [0, 1], [0, 1]))
+        self.assertEqual(compare_results(expected, actual, self.rules),
+                         compare_results(expected, actual, self.rules, pool=self.pool))
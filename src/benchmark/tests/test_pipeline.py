@@ -0,0 +1,37 @@
+import threading
+import unittest
+from concurrent.futures import Future
+
+from ..utils.pipeline import Pipeline, Stage
+
+
+class TestPipeline(unittest.TestCase):
+
+    def test_runs_stages_in_order(self):
+        pipeline = Pipeline([Stage('add', lambda x: x + 1, workers=2, queue_size=2),
+                             Stage('double', lambda x: x * 2, workers=2, queue_size=2)])
+        futures = [pipeline.submit(i) for i in range(5)]
+        self.assertEqual([2, 4, 6, 8, 10], [f.result(timeout=5) for f in futures])
+        pipeline.shutdown()
+
+    def test_cancelled_and_shut_down(self):
+        release = threading.Event()
+
+        def block(x):
+            release.wait(timeout=5)
+            return x
+
+        pipeline = Pipeline([Stage('block', block, workers=1, queue_size=0),
+                             Stage('fail', lambda x: 1 / 0, workers=1, queue_size=0)])
+        running = pipeline.submit(1)
+        # Halting: result futures are cancelled and the pipeline is shut down, while a task is still running
+        self.assertTrue(running.cancel())
+        pipeline.shutdown(wait=False)
+        release.set()
+        pipeline.shutdown(wait=True)
+        self.assertTrue(pipeline.closed)
+        self.assertTrue(running.cancelled())
+
+        # Submitting to a shut down pipeline fails the future instead of raising
+        future = pipeline.submit(2, result_future=Future())
+        self.assertRaises(RuntimeError, future.result, 5)
@@ -0,0 +1,43 @@
+import unittest
+
+from ..utils.arrow_result import ArrowResultBuilder
+from ..utils.process_pool import ProcessPool
+from ..utils.result_set import ResultSet
+from ..utils.result_set_match import compare_exact_match, compare_results, compile_comparison_rules
+from ..utils.sql_format import format_sql_query
+
+
+class TestProcessPool(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.pool = ProcessPool(1)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.shutdown()
+
+    def test_compare_results(self):
+        plan = compile_comparison_rules([{'columns': ['*'], 'match': 'exact'}])
+        rows = [(1, 'a', 1.04), (2, 'b', None)]
+        builder = ArrowResultBuilder(['id', 'name', 'v'])
+        builder.add_rows(rows)
+        dicts = [{'id': 2, 'name': 'b', 'v': 0.0}, {'id': 1, 'name': 'a', 'v': 1.0}]
+        for expected in (ResultSet(['id', 'name', 'v'], rows), builder.build()):
+            self.assertEqual((compare_results(expected, dicts, plan), compare_exact_match(dicts, expected)),
+                             self.pool.compare_results(expected, dicts, plan))
+            self.assertEqual(((True, ''), None), self.pool.compare_results(expected, expected, plan,
+                                                                         exact_match=False))
+
+    def test_comparison_errors(self):
+        # Rule column missing in the results, raised as by compare_results
+        plan = compile_comparison_rules([{'columns': ['x'], 'match': 'exact'}])
+        expected = ResultSet(['a'], [(1,)])
+        with self.assertRaises(KeyError):
+            compare_results(expected, expected, plan)
+        with self.assertRaises(KeyError):
+            self.pool.compare_results(expected, expected, plan)
+
+    def test_format_sql_query(self):
+        query = "select a,b from t"
+        self.assertEqual(format_sql_query(query), self.pool.format_sql_query(query))
@@ -0,0 +1,41 @@
+import unittest
+
+from ..utils.query_plan import QueryPlan, is_cost_exceeded, is_read_only, parse_postgres_plan, parse_sqlite_plan
+
+
+class TestQueryPlan(unittest.TestCase):
+
+    def test_postgres_plan(self):
+        plan = [{'Plan': {'Node Type': 'Hash Join', 'Total Cost': 120.5, 'Plan Rows': 40, 'Actual Rows': 38,
+                          'Plans': [{'Node Type': 'Seq Scan', 'Relation Name': 'city', 'Total Cost': 80.0},
+                                    {'Node Type': 'Hash', 'Plans': [{'Node Type': 'Index Only Scan',
+                                                                     'Relation Name': 'country'}]}]},
+                 'Execution Time': 2.5}]
+        self.assertEqual(QueryPlan(120.5, 40, ('full scan on city', 'index only scan on country'), 0.0025, 38),
+                         parse_postgres_plan(plan))
+
+    def test_sqlite_plan(self):
+        table_rows = {'city': 4000, 'country': 200}
+        join = [(3, 0, 0, 'SCAN c'), (5, 0, 0, 'SEARCH city USING INDEX idx_city_code (CountryCode=?)')]
+        plan = parse_sqlite_plan(join, table_rows, {'c': 'country'})
+        self.assertEqual(('full scan on country', 'index scan on city'), plan.scans)
+        self.assertEqual(2000, plan.rows)
+        # Nested full scans cost much more than the index search
+        cross = parse_sqlite_plan([(3, 0, 0, 'SCAN country'), (5, 0, 0, 'SCAN city')], table_rows)
+        self.assertEqual(200 + 200 * 4000, cross.cost)
+        self.assertTrue(is_cost_exceeded(cross, plan, 2.0))
+        self.assertFalse(is_cost_exceeded(plan, cross, 2.0))
+
+    def test_sqlite_subqueries(self):
+        plan_rows = [(3, 0, 0, 'MATERIALIZE x'), (10, 3, 0, 'SCAN city'), (45, 0, 0, 'SCAN x'),
+                     (54, 0, 0, 'CORRELATED SCALAR SUBQUERY 2'),
+                     (58, 54, 0, 'SEARCH country USING INTEGER PRIMARY KEY (rowid=?)')]
+        plan = parse_sqlite_plan(plan_rows, {'city': 100, 'country': 7})
+        self.assertEqual(100 + 100 + 100 * 3, plan.cost)
+        self.assertEqual(100, plan.rows)
+
+    def test_read_only(self):
+        self.assertTrue(is_read_only("WITH a AS (SELECT 1) SELECT * FROM a"))
+        self.assertFalse(is_read_only("SELECT * INTO t2 FROM t"))
+        self.assertFalse(is_read_only("WITH d AS (DELETE FROM t RETURNING *) SELECT * FROM d"))
+        self.assertFalse(is_read_only("UPDATE t SET a = 1"))
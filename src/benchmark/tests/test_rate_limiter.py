@@ -0,0 +1,69 @@
+import unittest
+
+from ..utils.rate_limiter import RateLimiter, TokenBucket, get_retry_after, is_retryable
+
+
+class RateLimitError(Exception):
+    def __init__(self, retry_after=None):
+        super().__init__("rate limited")
+        self.status_code = 429
+        self.headers = {'retry-after': retry_after} if retry_after is not None else {}
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_is_retryable(self):
+        self.assertTrue(is_retryable(RateLimitError()))
+        self.assertTrue(is_retryable(TimeoutError()))
+        self.assertFalse(is_retryable(ValueError("bad request")))
+
+    def test_retry_after(self):
+        self.assertEqual(0.5, get_retry_after(RateLimitError(retry_after="0.5")))
+        self.assertIsNone(get_retry_after(RateLimitError()))
+
+    def test_token_bucket_reserve(self):
+        bucket = TokenBucket(per_minute=60)
+        self.assertEqual(0.0, bucket.reserve(1))
+        # bucket is empty, next token is a second away
+        self.assertAlmostEqual(1.0, bucket.reserve(1), places=1)
+
+    def test_retries_and_reports_throttle_time(self):
+        limiter = RateLimiter(max_retries=2, base_delay=0.01)
+        calls = []
+
+        def fn():
+            calls.append(1)
+            if len(calls) < 3:
+                raise RateLimitError(retry_after="0.01")
+            return "select 1"
+
+        stats = {}
+        self.assertEqual("select 1", limiter.call(fn, stats=stats))
+        self.assertEqual(3, len(calls))
+        self.assertEqual(2, stats['retries'])
+        self.assertGreater(stats['throttle_time'], 0.0)
+
+    def test_gives_up_after_max_retries(self):
+        limiter = RateLimiter(max_retries=1, base_delay=0.01)
+
+        def fn():
+            raise RateLimitError(retry_after="0")
+
+        with self.assertRaises(RateLimitError):
+            limiter.call(fn)
+
+    def test_non_retryable_error_is_raised(self):
+        limiter = RateLimiter(max_retries=3)
+        calls = []
+
+        def fn():
+            calls.append(1)
+            raise ValueError("bad request")
+
+        with self.assertRaises(ValueError):
+            limiter.call(fn)
+        self.assertEqual(1, len(calls))
+
+
+if __name__ == '__main__':
+    unittest.main()
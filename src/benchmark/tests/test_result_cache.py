@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+
+from ..utils.result_cache import ResultCache, normalize_sql
+
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "cache.sqlite")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_normalize_sql(self):
+        self.assertEqual("SELECT a FROM t", normalize_sql("  SELECT a\n   FROM t ;"))
+
+    def test_normalize_sql_keeps_string_literals(self):
+        self.assertEqual("SELECT a FROM t WHERE name = 'a  b'",
+                         normalize_sql("SELECT a FROM t\nWHERE name = 'a  b';"))
+        self.assertNotEqual(normalize_sql("SELECT a FROM t WHERE name = 'a  b'"),
+                            normalize_sql("SELECT a FROM t WHERE name = 'a b'"))
+        self.assertNotEqual(ResultCache.make_key("SELECT a FROM t WHERE name = 'a  b'", "sqlite:///a.db", "v1"),
+                            ResultCache.make_key("SELECT a FROM t WHERE name = 'a b'", "sqlite:///a.db", "v1"))
+
+    def test_key_includes_connection_schema_and_version(self):
+        key = ResultCache.make_key("select 1", "sqlite:///a.db", "v1")
+        self.assertEqual(key, ResultCache.make_key("select   1;", "sqlite:///a.db", "v1"))
+        self.assertNotEqual(key, ResultCache.make_key("select 1", "sqlite:///b.db", "v1"))
+        self.assertNotEqual(key, ResultCache.make_key("select 1", "sqlite:///a.db", "v2"))
+        self.assertNotEqual(key, ResultCache.make_key("select 1", "sqlite:///a.db", "v1", schema="s1"))
+
+    def test_get_put_persists(self):
+        cache = ResultCache(path=self.path)
+        self.assertIsNone(cache.get("k1"))
+        cache.put("k1", [{'a': 1}])
+        cache.close()
+
+        cache = ResultCache(path=self.path)
+        self.assertEqual([{'a': 1}], cache.get("k1"))
+        cache.close()
+
+    def test_lru_eviction(self):
+        cache = ResultCache(path=self.path, max_size_bytes=200)
+        cache.put("k1", "x" * 80)
+        cache.put("k2", "y" * 80)
+        # touch k1 so that k2 becomes the least recently used
+        self.assertIsNotNone(cache.get("k1"))
+        cache.put("k3", "z" * 80)
+        self.assertIsNotNone(cache.get("k1"))
+        self.assertIsNone(cache.get("k2"))
+        self.assertIsNotNone(cache.get("k3"))
+        self.assertLessEqual(cache.size(), 200)
+        cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
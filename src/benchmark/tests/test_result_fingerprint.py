@@ -0,0 +1,47 @@
+import pickle
+import unittest
+
+from ..utils.result_fingerprint import FingerprintedRows, ResultFingerprint, get_fingerprint, is_same_result
+
+
+def fingerprinted(columns, rows):
+    fingerprint = ResultFingerprint(columns)
+    fingerprint.add_rows(rows[:1])
+    fingerprint.add_rows(rows[1:])
+    return FingerprintedRows([dict(zip(columns, row)) for row in rows], fingerprint=fingerprint)
+
+
+class TestResultFingerprint(unittest.TestCase):
+
+    def test_same_rows_in_any_order(self):
+        expected = fingerprinted(('a', 'b'), [(1, 'x'), (2, 'y'), (2, 'y')])
+        actual = fingerprinted(('a', 'b'), [(2, 'y'), (1, 'x'), (2, 'y')])
+        self.assertTrue(is_same_result(expected, actual))
+        self.assertFalse(is_same_result(expected, actual, exact=True))
+        self.assertTrue(is_same_result(expected, fingerprinted(('a', 'b'), [(1, 'x'), (2, 'y'), (2, 'y')]),
+                                       exact=True))
+
+    def test_different_rows(self):
+        self.assertFalse(is_same_result(fingerprinted(('a',), [(-1,), (3,)]), fingerprinted(('a',), [(-2,), (3,)])))
+        self.assertFalse(is_same_result(fingerprinted(('a',), [(1,)]), fingerprinted(('a',), [(1.0,)])))
+        self.assertFalse(is_same_result(fingerprinted(('a',), [(1,), (1,)]), fingerprinted(('a',), [(1,)])))
+        self.assertFalse(is_same_result(fingerprinted(('a',), [(float('nan'),)]),
+                                        fingerprinted(('a',), [(float('nan'),)])))
+
+    def test_columns(self):
+        expected = fingerprinted(('name', 'total'), [('x', 1)])
+        self.assertTrue(is_same_result(expected, fingerprinted(('name', 'count(*)'), [('x', 1)])))
+        self.assertFalse(is_same_result(expected, fingerprinted(('name', 'count(*)'), [('x', 1)]), exact=True))
+        self.assertFalse(is_same_result(expected, fingerprinted(('total', 'name'), [('x', 1)])))
+        self.assertEqual(['total'], expected.fingerprint.differing_columns(
+            fingerprinted(('name', 'total'), [('x', 2)]).fingerprint))
+
+    def test_rows_without_fingerprint(self):
+        rows = [{'a': 1, 'b': 'x'}, {'a': 2, 'b': 'y'}]
+        self.assertTrue(is_same_result(rows, fingerprinted(('a', 'b'), [(1, 'x'), (2, 'y')]), exact=True))
+        self.assertIsNone(get_fingerprint(None))
+
+    def test_pickled_as_list(self):
+        rows = pickle.loads(pickle.dumps(fingerprinted(('a',), [(1,)])))
+        self.assertEqual(list, type(rows))
+        self.assertEqual([{'a': 1}], rows)
@@ -0,0 +1,31 @@
+import unittest
+from concurrent.futures import Future
+
+from ..utils.result_limits import make_golden_row_check
+from ..utils.result_set_match import compare_results
+
+
+class TestGoldenRowCheck(unittest.TestCase):
+
+    def test_duplicated_golden_rows(self):
+        # 6000 golden rows with 3 distinct values: the generated query returning the same rows is not aborted
+        golden_rows = [{'a': i % 3} for i in range(6000)]
+        golden_future = Future()
+        golden_future.set_result((golden_rows, 0.1, {}))
+        check = make_golden_row_check(golden_future, 10, 1000)
+        self.assertIsNone(next(filter(None, map(check, range(0, 6001, 1000))), None))
+        rules = [{'columns': ['a'], 'match': 'exact'}]
+        self.assertEqual((True, ""), compare_results(golden_rows, list(golden_rows), rules))
+        self.assertIsNone(check(60000))
+        self.assertEqual("10 times more rows than golden query (6000 rows)", check(60001))
+
+    def test_golden_results_not_available(self):
+        golden_future = Future()
+        check = make_golden_row_check(golden_future, 10, 1000)
+        self.assertIsNone(check(1000000))
+        golden_future.set_exception(RuntimeError("failed"))
+        self.assertIsNone(check(1000000))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import pickle
+import unittest
+
+from ..utils.result_set import ResultSet
+from ..utils.result_set_match import compare_exact_match, compare_results, count_deduplicated_rows
+
+
+class TestResultSet(unittest.TestCase):
+
+    def test_dict_views(self):
+        result = ResultSet(('a', 'B', 'a'), [(1, 'x', 2), (3, None, 4)])
+        self.assertEqual([{'a': 2, 'B': 'x'}, {'a': 4, 'B': None}], list(result))
+        row = result[-1]
+        self.assertEqual(['a', 'B'], list(row.keys()))
+        self.assertEqual([4, None], row.values())
+        self.assertEqual(4, row['a'])
+        self.assertIsNone(row.get('c'))
+        self.assertNotIn('b', row)
+        self.assertEqual({'a': 4, 'B': None}, dict(row))
+        self.assertEqual("{'a': 4, 'B': None}", repr(row))
+        self.assertEqual([{'a': 2, 'B': 'x'}], result[:1])
+
+    def test_pickled_rows_are_tuples(self):
+        result = pickle.loads(pickle.dumps(ResultSet(('a',), [(1,), (2,)], fingerprint=object())))
+        self.assertEqual([(1,), (2,)], result.rows)
+        self.assertIsNone(result.fingerprint)
+
+    def test_comparison(self):
+        expected = ResultSet(('Name', 'Total'), [('"x"', 1.04), ('y', 2.0)])
+        actual = ResultSet(('NAME', 'SUM(v)'), [('y', 2.0), ('x', 1.0)])
+        self.assertEqual((True, ''), compare_results(expected, actual,
+                                                     [{'columns': ['name', 'total'], 'match': 'exact'}]))
+        self.assertEqual((False, "Comparison failed for row: exp={'name': 'y', 'total': 2.0}, "
+                                 "act={'name': 'y', 'sum(v)': 2.5}"),
+                         compare_results(expected, ResultSet(('NAME', 'SUM(v)'), [('y', 2.5), ('x', 1.0)]),
+                                         [{'columns': ['name', 'total'], 'match': 'exact'}]))
+        self.assertEqual((True, ''), compare_exact_match(actual, ResultSet(('NAME', 'SUM(v)'),
+                                                                           [('y', 2.0), ('x', 1.0)])))
+        self.assertEqual((True, ''), compare_exact_match(actual, [{'NAME': 'y', 'SUM(v)': 2.0},
+                                                                  {'NAME': 'x', 'SUM(v)': 1.0}]))
+        self.assertFalse(compare_exact_match(actual, [{'NAME': 'x', 'SUM(v)': 1.0},
+                                                      {'NAME': 'y', 'SUM(v)': 2.0}])[0])
+        self.assertEqual(1, count_deduplicated_rows(ResultSet(('Name',), [('x',), ('x',)]),
+                                                    [{'columns': ['name'], 'match': 'exact'}]))
@@ -3,6 +3,10 @@ from decimal import Decimal
 
 from ..utils.result_set_match import compare_results
 from ..utils.result_set_match import remove_duplicates
+from ..utils.result_set_match import count_deduplicated_rows
+from ..utils.result_set_match import compile_comparison_rules
+from ..utils.result_set_match import infer_column_mapping
+from ..utils.result_set_match import max_bipartite_matching
 
 
 class TestCompareResults(unittest.TestCase):
@@ -432,6 +436,103 @@ class TestCompareResults(unittest.TestCase):
         rules = [{'match': 'exact', 'columns': ['a', 'b', 'c']}]
         self.assertEqual(compare_results(expected, actual, rules), (True, ''))
 
+    def test_compare_shuffled_rows(self):
+        expected = [{'id': i, 'name': f'n{i}', 'v': i * 1.5} for i in range(50)]
+        actual = [{'x': i, 'y': f'n{i}', 'z': i * 1.5} for i in reversed(range(50))]
+        rules = [{'match': 'exact', 'columns': ['id', 'name']}]
+        self.assertEqual(compare_results(expected, actual, rules), (True, ""))
+
+        actual[10] = {'x': 100, 'y': 'n100', 'z': 1.5}
+        self.assertEqual(compare_results(expected, actual, rules),
+                         (False, "Comparison failed for row: exp={'id': 39, 'name': 'n39', 'v': 58.5}, "
+                                 "act={'x': 100, 'y': 'n100', 'z': 1.5}"))
+
+    def test_compare_equal_rows_of_different_types(self):
+        # Rows are equal (==), but only one of them matches as per the rules
+        expected = [{'a': '1.0', 'b': 'x'}, {'a': 1, 'b': 'x'}]
+        actual = [{'a': 1, 'b': 'x'}, {'a': 1.0, 'b': 'x'}]
+        rules = [{'match': 'exact', 'columns': ['*']}]
+        self.assertEqual(compare_results(expected, actual, rules),
+                         (False, "Comparison failed for row: exp={'a': 1, 'b': 'x'}, act={'a': 1.0, 'b': 'x'}"))
+
+    def test_compiled_comparison_rules(self):
+        rules = [{'match': 'exact', 'columns': ['ID']}, {'match': 'oneof', 'columns': ['Name', 'Code']}]
+        plan = compile_comparison_rules(rules)
+        # Rules are not modified
+        self.assertEqual(rules[0]['columns'], ['ID'])
+        self.assertEqual(plan.dedup_columns, ('id', 'name', 'code'))
+        self.assertIs(compile_comparison_rules(plan), plan)
+
+        expected = [{'ID': 1, 'Name': 'USA', 'Code': 'US'}, {'ID': 2, 'Name': 'CANADA', 'Code': 'CA'}]
+        actual = [{'id': 2, 'c': 'CA'}, {'id': 1, 'c': 'US'}]
+        self.assertEqual(compare_results(expected, actual, plan), (True, ""))
+        self.assertEqual(compare_results(expected, actual, rules), (True, ""))
+
+    def test_compare_driver_specific_types(self):
+        expected = [{'a': b'abc', 'b': 1}]
+        actual = [{'a': memoryview(b'abc'), 'b': 1}]
+        rules = [{'match': 'exact', 'columns': ['*']}]
+        self.assertEqual(compare_results(expected, actual, rules, target_db_type='postgresql'), (True, ""))
+        self.assertFalse(compare_results(expected, actual, rules)[0])
+
+    def test_infer_column_mapping(self):
+        expected = [{'id': 1, 'name': 'a', 'v': 2.5}, {'id': 2, 'name': 'b', 'v': 3.5}]
+        actual = [{'x': 'b', 'y': 2, 'z': 3.5}, {'x': 'a', 'y': 1, 'z': 2.5}]
+        self.assertEqual(infer_column_mapping(expected, actual), {'id': 'y', 'name': 'x', 'v': 'z'})
+
+        # Columns with the same values can't be told apart
+        actual = [{'x': 'b', 'y': 2, 'z': 2}, {'x': 'a', 'y': 1, 'z': 1}]
+        self.assertEqual(infer_column_mapping(expected, actual), {'name': 'x'})
+
+        # Columns present by name are not mapped
+        actual = [{'id': 2, 'x': 'b', 'v': 3.5}, {'id': 1, 'x': 'a', 'v': 2.5}]
+        self.assertEqual(infer_column_mapping(expected, actual), {'name': 'x'})
+
+    def test_compare_oneof_ambiguous_rows(self):
+        # First expected row can take either actual row, it must leave the first one to the second expected row
+        expected = [{'a': 1, 'b': 2}, {'a': 1, 'b': 5}]
+        actual = [{'x': 1}, {'x': 2}]
+        rules = [{'match': 'oneof', 'columns': ['a', 'b']}]
+        self.assertEqual(compare_results(expected, actual, rules), (True, ""))
+
+        actual = [{'x': 2}, {'x': 2}]
+        self.assertEqual(compare_results(expected, actual, rules),
+                         (False, "Comparison failed for row: exp={'a': 1, 'b': 5}, act={'x': 2}"))
+
+    def test_compare_oneof_ambiguous_columns(self):
+        # Both rules can take column x, only the first one can take column y
+        expected = [{'a': 1, 'b': 2}]
+        actual = [{'x': 1, 'y': 2}]
+        rules = [{'match': 'oneof', 'columns': ['a', 'b']}, {'match': 'oneof', 'columns': ['a']}]
+        self.assertEqual(compare_results(expected, actual, rules), (True, ""))
+
+    def test_compare_oneof_leaves_columns_to_exact_rules(self):
+        # oneof rule can take name or code, it must leave name to the exact rule
+        rows = [{'name': 'France', 'code': 'FR', 'pop': 68}, {'name': 'Peru', 'code': 'PE', 'pop': 34}]
+        rules = [{'match': 'oneof', 'columns': ['code', 'name']}, {'match': 'exact', 'columns': ['name', 'pop']}]
+        self.assertEqual(compare_results(rows, [dict(row) for row in rows], rules), (True, ""))
+
+        # code mismatches: oneof rule needs name, which is then not available to the exact rule
+        actual = [{'name': 'France', 'code': 'XX', 'pop': 68}, {'name': 'Peru', 'code': 'XX', 'pop': 34}]
+        self.assertFalse(compare_results(rows, actual, rules)[0])
+
+    def test_max_bipartite_matching(self):
+        adjacency = [[0, 1], [0], [1, 2]]
+        match_left, match_right = max_bipartite_matching(adjacency, 3)
+        self.assertEqual(match_left, [1, 0, 2])
+        self.assertEqual(match_right, [1, 0, 2])
+
+        match_left, _ = max_bipartite_matching([[0], [0]], 1)
+        self.assertEqual(sorted(match_left), [-1, 0])
+
+    def test_count_deduplicated_rows(self):
+        rows = [{'A': 1, 'b': 'x'}, {'A': 1, 'b': 'y'}, {'A': 2, 'b': 'x'}]
+        self.assertEqual(count_deduplicated_rows(rows, [{'match': 'exact', 'columns': ['a']}]), 2)
+        # All the columns, duplicates are kept unless there is a single column
+        self.assertEqual(count_deduplicated_rows(rows, [{'match': 'exact', 'columns': ['*']}]), 3)
+        self.assertEqual(count_deduplicated_rows([{'a': 1}, {'a': 1}], [{'match': 'exact', 'columns': ['*']}]), 1)
+        self.assertEqual(count_deduplicated_rows([], [{'match': 'exact', 'columns': ['*']}]), 0)
+
 
 if __name__ == '__main__':
     unittest.main()
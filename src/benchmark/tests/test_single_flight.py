@@ -0,0 +1,52 @@
+import threading
+import time
+import unittest
+
+from ..utils.single_flight import SingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def test_concurrent_calls_share_execution(self):
+        single_flight = SingleFlight()
+        calls = []
+
+        def fn():
+            calls.append(1)
+            time.sleep(0.1)
+            return [{'a': 1}]
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(single_flight.do("k", fn))) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(1, len(calls))
+        self.assertEqual(4, len(results))
+        self.assertTrue(all(r[0] == [{'a': 1}] for r in results))
+        self.assertEqual(3, sum(1 for r in results if r[1]))
+        self.assertEqual((1, 3), (single_flight.executions, single_flight.shared))
+
+    def test_retain_results(self):
+        single_flight = SingleFlight(retain_results=1)
+        self.assertEqual((1, False), single_flight.do("k1", lambda: 1))
+        self.assertEqual((1, True), single_flight.do("k1", lambda: 2))
+        self.assertEqual((3, False), single_flight.do("k2", lambda: 3))
+        # k1 is evicted, as only one result is retained
+        self.assertEqual((4, False), single_flight.do("k1", lambda: 4))
+
+    def test_errors_are_not_retained(self):
+        single_flight = SingleFlight(retain_results=10)
+
+        def fail():
+            raise ValueError("bad query")
+
+        with self.assertRaises(ValueError):
+            single_flight.do("k", fail)
+        self.assertEqual((1, False), single_flight.do("k", lambda: 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+
+from ..utils.sql_analysis import analyze_sql, unknown_tables
+
+
+class TestSqlAnalysis(unittest.TestCase):
+
+    def test_tables_and_aliases(self):
+        analysis = analyze_sql("SELECT s.name FROM main.Singer s JOIN concert AS c ON s.id = c.singer_id, stadium "
+                               "WHERE s.age > (SELECT avg(age) FROM singer) AND c.year IN (SELECT y FROM other.years)",
+                               'main')
+        self.assertEqual(('singer', 'concert', 'stadium', 'other.years'), analysis.tables)
+        self.assertEqual({'s': 'singer', 'c': 'concert'}, analysis.aliases)
+
+    def test_ctes(self):
+        analysis = analyze_sql("WITH RECURSIVE a (x) AS (SELECT 1 FROM t1), b AS (SELECT * FROM a JOIN t2 USING (k)) "
+                               "SELECT * FROM b JOIN a ON true")
+        self.assertEqual(('t1', 't2'), analysis.tables)
+        self.assertEqual(('a', 'b'), analysis.ctes)
+
+    def test_not_tables(self):
+        analysis = analyze_sql("SELECT extract(year FROM d), x IS DISTINCT FROM y, CAST(ts AS timestamp WITH TIME ZONE) "
+                               "FROM t, generate_series(1, 3) g, LATERAL (SELECT * FROM u) v")
+        self.assertEqual(('t', 'u'), analysis.tables)
+        self.assertEqual([], list(analysis.ctes))
+
+    def test_unknown_tables(self):
+        analysis = analyze_sql('SELECT * FROM "Singer" JOIN concerts ON true JOIN other.t ON true')
+        self.assertEqual(['concerts'], unknown_tables(analysis, {'singer', 'concert'}))
+
+    def test_system_tables(self):
+        self.assertEqual([], unknown_tables(analyze_sql("SELECT name FROM sqlite_master"), set(), 'sqlite'))
+        self.assertEqual([], unknown_tables(analyze_sql("SELECT 1 FROM DUAL"), set(), 'mysql'))
+        self.assertEqual([], unknown_tables(analyze_sql("SELECT * FROM pg_tables JOIN pg_class ON true"), set(),
+                                            'postgresql'))
+        # System tables of other dialects are checked
+        self.assertEqual(['pg_tables'], unknown_tables(analyze_sql("SELECT * FROM pg_tables"), set(), 'sqlite'))
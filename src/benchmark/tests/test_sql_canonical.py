@@ -0,0 +1,61 @@
+import unittest
+
+from ..utils.sql_canonical import canonicalize_sql, tokenize_sql
+
+
+class TestSqlCanonical(unittest.TestCase):
+
+    def test_same_query(self):
+        golden = "SELECT count(*) FROM singer WHERE age > 20"
+        for query in ("select COUNT( * )\n  from Singer where age>20;",
+                      'SELECT count(*) FROM [singer] -- singers\n WHERE `AGE` > 20 ;;',
+                      "SELECT count(*) FROM main.singer WHERE age > 20",
+                      'SELECT count(*) FROM `MAIN`.singer /* main */ WHERE age > 20'):
+            self.assertEqual(canonicalize_sql(golden, 'main', 'sqlite'), canonicalize_sql(query, 'main', 'sqlite'))
+
+    def test_different_query(self):
+        golden = "SELECT name FROM singer WHERE country = 'France'"
+        for query in ("SELECT name FROM singer WHERE country = 'france'",
+                      "SELECT name FROM other.singer WHERE country = 'France'",
+                      'SELECT "first name" FROM singer WHERE country = \'France\'',
+                      "SELECT name FROM singer WHERE country = 'France' LIMIT 1"):
+            self.assertNotEqual(canonicalize_sql(golden, 'main'), canonicalize_sql(query, 'main'))
+        # Schema qualifies the table, it is not qualified itself
+        self.assertNotEqual(canonicalize_sql("SELECT * FROM t", 'main'),
+                            canonicalize_sql("SELECT * FROM db.main.t", 'main'))
+
+    def test_quoted_identifiers_by_dialect(self):
+        golden = "SELECT name FROM singer"
+        quoted = 'SELECT name FROM "Singer"'
+        self.assertEqual(canonicalize_sql(golden, dialect='sqlite'),
+                         canonicalize_sql('SELECT name FROM [Singer]', dialect='sqlite'))
+        self.assertEqual(canonicalize_sql(golden, dialect='mysql'),
+                         canonicalize_sql('SELECT name FROM `Singer`', dialect='mysql'))
+        # Quoted identifiers are case sensitive, only unquoted ones are folded
+        self.assertNotEqual(canonicalize_sql(golden, dialect='postgresql'),
+                            canonicalize_sql(quoted, dialect='postgresql'))
+        self.assertEqual(canonicalize_sql(golden, dialect='postgresql'),
+                         canonicalize_sql('SELECT "name" FROM "singer"', dialect='postgresql'))
+        self.assertNotEqual(canonicalize_sql(golden, dialect='snowflake'),
+                            canonicalize_sql('SELECT name FROM "singer"', dialect='snowflake'))
+        self.assertEqual(canonicalize_sql(golden, dialect='snowflake'),
+                         canonicalize_sql('SELECT NAME FROM "SINGER"', dialect='snowflake'))
+        # Unknown dialect
+        self.assertNotEqual(canonicalize_sql(golden), canonicalize_sql('SELECT name FROM "singer"'))
+
+    def test_double_quoted_strings(self):
+        # "..." is a string literal on sqlite and mysql, its case matters
+        golden = 'SELECT count(*) FROM singer WHERE country = "France"'
+        for dialect in ('sqlite', 'mysql', 'mariadb'):
+            self.assertNotEqual(canonicalize_sql(golden, dialect=dialect),
+                                canonicalize_sql('SELECT count(*) FROM singer WHERE country = "france"',
+                                                 dialect=dialect))
+            self.assertEqual(canonicalize_sql(golden, dialect=dialect),
+                             canonicalize_sql('select COUNT(*) from singer where country="France";', dialect=dialect))
+
+    def test_tokens(self):
+        tokens = tokenize_sql("SELECT 'it''s -- not a comment', $$a;b$$ FROM t -- comment\nWHERE a != 1.5e3")
+        self.assertEqual(['word', 'string', 'punctuation', 'string', 'word', 'word', 'word', 'word', 'operator',
+                          'number'], [token.kind for token in tokens])
+        self.assertEqual("'it''s -- not a comment'", tokens[1].text)
+        self.assertEqual(canonicalize_sql("select 1 where a <> b"), canonicalize_sql("SELECT 1 WHERE a != b"))
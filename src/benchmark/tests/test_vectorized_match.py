@@ -0,0 +1,37 @@
+import unittest
+from decimal import Decimal
+
+from ..utils.result_set_match import compare_results, is_match
+from ..utils.vectorized_match import column_keys
+
+
+class TestVectorizedMatch(unittest.TestCase):
+
+    def test_keys_match_as_is_match(self):
+        values = [None, 0, 0.0, -0.0, 1.05, 1.15, 2.25, 0.25, 1.0, 1.04, 2.0, -1.25, Decimal('1.05'), Decimal('1.15'),
+                  Decimal('2.25'), Decimal('1.0'), Decimal('1'), Decimal('0.25'), Decimal('2'), 123456.55]
+        values = [value for value in values if not isinstance(value, int) or value is None]
+        expected_keys, actual_keys = column_keys(values, values)
+        for i, expected_value in enumerate(values):
+            for j, actual_value in enumerate(values):
+                self.assertEqual(is_match(expected_value, actual_value), expected_keys[i] == actual_keys[j],
+                                 (expected_value, actual_value))
+
+    def test_not_an_equivalence(self):
+        # 0.04 matches 0.0, 0.0 matches None, but 0.04 doesn't match None
+        self.assertIsNone(column_keys([0.04, None], [0.0]))
+        # None matches 'None' and 0
+        self.assertIsNone(column_keys(['a', None], ['None']))
+        # 1 doesn't match 1.0, but 0 matches 0.0
+        self.assertIsNone(column_keys([1, 0], [1.0, 0.0]))
+        self.assertIsNone(column_keys([float('nan')], [1.0]))
+
+    def test_compare_results(self):
+        rules = [{'columns': ['*'], 'match': 'exact'}]
+        expected = [{'a': 'x', 'b': 1.04, 'c': 2}, {'a': 'y', 'b': None, 'c': 3}, {'a': 'z', 'b': 2.25, 'c': 3}]
+        self.assertEqual((True, ''), compare_results(
+            expected, [{'a': 'z', 'b': 2.2, 'c': 3}, {'a': 'x', 'b': 1.0, 'c': 2}, {'a': 'y', 'b': 0.0, 'c': 3}], rules))
+        self.assertEqual((False, "Comparison failed for row: exp={'a': 'y', 'b': None, 'c': 3}, "
+                                 "act={'a': 'y', 'b': 0.1, 'c': 3}"),
+                         compare_results(expected, [{'a': 'z', 'b': 2.2, 'c': 3}, {'a': 'x', 'b': 1.0, 'c': 2},
+                                                    {'a': 'y', 'b': 0.1, 'c': 3}], rules))
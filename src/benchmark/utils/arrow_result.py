@@ -0,0 +1,210 @@
+import datetime
+import decimal
+from multiprocessing import shared_memory
+from typing import Callable, Iterable, List, Optional
+
+import pyarrow as pa
+
+from .result_set import RowView, column_index
+
+# Python types of the values stored in arrow, which round trip unchanged. Other values (e.g. JSON documents,
+# whose dicts arrow would fill with missing keys) keep the results as dicts.
+ARROW_VALUE_TYPES = {bool, int, float, str, bytes, decimal.Decimal, datetime.datetime, datetime.date,
+                     datetime.time, datetime.timedelta}
+
+
+class ArrowResultSet:
+    """
+    Query result backed by a pyarrow.Table: values are stored per column, and column names once.
+
+    Behaves as a read-only sequence of dict rows for code expecting List[Dict] (len, indexing, iteration),
+    returned as RowViews built on access. Comparison code uses the columns directly (to_rows, column_values).
+    """
+
+    def __init__(self, table: pa.Table, fingerprint: Optional['ResultFingerprint'] = None):
+        self.table = table
+        self.fingerprint = fingerprint
+
+    @property
+    def columns(self) -> List[str]:
+        return self.table.column_names
+
+    def column_values(self) -> List[list]:
+        """
+        Values of every column, as python lists.
+        """
+        return [column.to_pylist() for column in self.table.columns]
+
+    def to_rows(self, key: Optional[Callable] = None, value: Optional[Callable] = None) -> List[RowView]:
+        """
+        Rows as dict views, with key applied to the column names and value to the values.
+        """
+        index = column_index(key(name) for name in self.columns) if key else column_index(self.columns)
+        rows = zip(*self.column_values())
+        if value:
+            rows = (tuple(map(value, row)) for row in rows)
+        return [RowView(index, row) for row in rows]
+
+    def __len__(self) -> int:
+        return self.table.num_rows
+
+    def __iter__(self):
+        index = column_index(self.columns)
+        for batch in self.table.to_batches():
+            yield from (RowView(index, row) for row in zip(*(column.to_pylist() for column in batch.columns)))
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            start, stop, step = position.indices(len(self))
+            if step != 1:
+                return list(self)[position]
+            return ArrowResultSet(self.table.slice(start, max(0, stop - start))).to_rows()
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError("result index out of range")
+        return ArrowResultSet(self.table.slice(position, 1)).to_rows()[0]
+
+    def equals(self, other) -> bool:
+        """
+        Same columns, types and rows, in the same order.
+        """
+        return isinstance(other, ArrowResultSet) and self.table.equals(other.table)
+
+    def __eq__(self, other):
+        if isinstance(other, ArrowResultSet):
+            return self.equals(other) or list(self) == list(other)
+        if isinstance(other, list):
+            return list(self) == other
+        return NotImplemented
+
+    def __reduce__(self):
+        # Fingerprints are only valid within a process
+        return ArrowResultSet, (self.table,)
+
+    def __repr__(self):
+        return f"ArrowResultSet(columns={self.columns}, rows={len(self)})"
+
+
+class ArrowResultBuilder:
+    """
+    Builds an ArrowResultSet from the batches of rows fetched from a cursor.
+
+    Values must round trip unchanged, so add_rows refuses batches which arrow would alter: columns with
+    values of several types (e.g. int and float, as in sqlite), decimals of different scales or datetimes of
+    different time zones.
+    """
+
+    def __init__(self, columns: Iterable[str]):
+        self.columns = list(columns)
+        self.batches = []
+        self.types = [pa.null()] * len(self.columns)
+
+    def add_rows(self, rows: list) -> bool:
+        """
+        Appends a batch of rows (tuples). Returns False, adding nothing, when the rows can't be represented.
+        """
+        if not rows:
+            return True
+        try:
+            arrays = []
+            for i, values in enumerate(zip(*rows)):
+                if not _is_single_type(values):
+                    return False
+                array = pa.array(values)
+                column_type = _merge_types(self.types[i], array.type)
+                if column_type is None:
+                    return False
+                arrays.append(array)
+            batch = pa.RecordBatch.from_arrays(arrays, names=self.columns)
+        except (pa.ArrowException, ValueError, TypeError, OverflowError):
+            return False
+        for i, array in enumerate(arrays):
+            self.types[i] = _merge_types(self.types[i], array.type)
+        self.batches.append(batch)
+        return True
+
+    def tuples(self) -> list:
+        """
+        Rows added so far, as tuples.
+        """
+        return [row for batch in self.batches for row in zip(*(column.to_pylist() for column in batch.columns))]
+
+    def build(self, fingerprint: Optional['ResultFingerprint'] = None) -> ArrowResultSet:
+        return ArrowResultSet(self._table(), fingerprint=fingerprint)
+
+    def _table(self) -> pa.Table:
+        schema = pa.schema([pa.field(name, column_type) for name, column_type in zip(self.columns, self.types)])
+        if not self.batches:
+            return schema.empty_table()
+        batches = [pa.RecordBatch.from_arrays([array if array.type == column_type else array.cast(column_type)
+                                               for array, column_type in zip(batch.columns, self.types)],
+                                              schema=schema)
+                   for batch in self.batches]
+        return pa.Table.from_batches(batches, schema=schema)
+
+
+def _is_single_type(values) -> bool:
+    types = {type(value) for value in values if value is not None}
+    if len(types) > 1 or not types <= ARROW_VALUE_TYPES:
+        return False
+    if types == {decimal.Decimal}:
+        # Arrow pads the decimals to a common scale
+        return len({value.as_tuple().exponent for value in values if value is not None}) == 1
+    if types == {datetime.datetime}:
+        # and converts the datetimes to a common time zone
+        return len({value.tzinfo for value in values if value is not None}) == 1
+    return True
+
+
+def _merge_types(current: pa.DataType, new: pa.DataType) -> Optional[pa.DataType]:
+    """
+    Type of a column holding values of both types without altering them, None when there is none.
+    """
+    if current == new or pa.types.is_null(new):
+        return current
+    if pa.types.is_null(current):
+        return new
+    if pa.types.is_decimal(current) and pa.types.is_decimal(new) and current.scale == new.scale:
+        return pa.decimal128(max(current.precision, new.precision), current.scale)
+    return None
+
+
+class SharedTable:
+    """
+    Arrow table written to shared memory as an IPC stream, for other processes to read it without copying
+    (see read_shared_table). Released by the creating process once they are done.
+    """
+
+    def __init__(self, table: pa.Table):
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        buffer = sink.getvalue()
+        self.block = shared_memory.SharedMemory(create=True, size=max(buffer.size, 1))
+        self.block.buf[:buffer.size] = memoryview(buffer).cast('B')
+        self.handle = (self.block.name, buffer.size)
+
+    def close(self):
+        self.block.close()
+
+    def unlink(self):
+        self.block.unlink()
+
+
+def read_shared_table(handle: tuple, fn: Callable):
+    """
+    Calls fn with the table of a SharedTable, by its handle, and returns its outcome. The table refers to the
+    shared memory: fn must not keep references to it (values converted to python objects are copies).
+    """
+    name, size = handle
+    block = shared_memory.SharedMemory(name=name)
+    view = block.buf[:size]
+    try:
+        return fn(pa.ipc.open_stream(pa.py_buffer(view)).read_all())
+    except Exception as e:
+        # The traceback refers to the table, through the frames of fn
+        raise e.with_traceback(None)
+    finally:
+        view.release()
+        block.close()
@@ -0,0 +1,503 @@
+"""
+Results larger than a memory budget, spilled to disk while they are fetched, and their comparison in external
+memory: rows are canonicalized, sorted in runs fitting the budget, and the runs of both results merge-compared.
+
+Canonical keys are equal for values matching as per is_match, as long as is_match is an equivalence on the
+compared columns (see vectorized_match). Values breaking the equivalence around zero (non zero numbers rounding to
+zero, 'None' strings) are grouped with the zero values and told apart by a tie-break pass within their group.
+Otherwise, e.g. columns mixing numbers and strings, compare_spilled returns None and results are compared in memory.
+"""
+import decimal
+import heapq
+import logging
+import os
+import pickle
+import sys
+import tempfile
+import weakref
+from collections import deque
+from functools import lru_cache
+from itertools import groupby
+from operator import itemgetter
+from typing import Iterator, List, Optional
+
+from .result_set import ResultSet, RowView, column_index
+
+# Rows per pickled batch in spill files
+SPILL_BATCH_SIZE = 10000
+# Estimated overhead of a row held in memory, in addition to its values
+ROW_OVERHEAD_BYTES = 120
+# Floats and decimals don't match beyond this magnitude (str(1e16) is '1e+16'), they are not canonicalized
+MAX_ROUNDED_MAGNITUDE = 1e15
+
+# Tags of canonical keys: values with different tags never match
+ZERO_TAG, INT_TAG, ROUNDED_TAG, STRING_TAG, OTHER_TAG = range(5)
+# Tags of values matching some of the zero values only: non zero numbers rounding to zero and 'None' strings.
+# Their rows are grouped with the zero values, by the kind of values they are.
+TINY_TAG, NONE_STRING_TAG = range(5, 7)
+_KIND_OF_TAG = {TINY_TAG: ROUNDED_TAG, NONE_STRING_TAG: STRING_TAG}
+
+# Values standing for the zero values of a group in the tie-break, by label (see _zero_label)
+_ZERO_REPRESENTATIVES = {'null': None, 'int': 0, 'zero': 0.0, '-zero': -0.0, 'tiny': 0.04, '-tiny': -0.04,
+                         'none_string': 'None'}
+_AMBIGUOUS_LABELS = frozenset(['tiny', '-tiny', 'none_string'])
+
+
+class _SpillFile:
+    """
+    Temporary file of pickled batches of rows, removed once no longer referenced.
+    """
+
+    def __init__(self, directory: Optional[str], prefix: str):
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(prefix=prefix, suffix='.pkl', dir=directory)
+        self.file = os.fdopen(fd, 'wb')
+        self._finalizer = weakref.finalize(self, _remove_file, self.path)
+
+    def write(self, rows: list):
+        for start in range(0, len(rows), SPILL_BATCH_SIZE):
+            pickle.dump(rows[start:start + SPILL_BATCH_SIZE], self.file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def close(self):
+        self.file.close()
+
+    def batches(self) -> Iterator[list]:
+        with open(self.path, 'rb') as f:
+            while True:
+                try:
+                    yield pickle.load(f)
+                except EOFError:
+                    return
+
+
+def _remove_file(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class SpilledResultSet:
+    """
+    Query result stored on disk. Behaves as a read-only sequence of dict rows, read from disk on access.
+    compare_results compares it in external memory where possible.
+    """
+
+    def __init__(self, columns, spill_file: _SpillFile, row_count: int, memory_budget: int,
+                 directory: Optional[str] = None, fingerprint=None):
+        self.columns = tuple(columns)
+        self.spill_file = spill_file
+        self.row_count = row_count
+        self.memory_budget = memory_budget
+        self.directory = directory
+        self.fingerprint = fingerprint
+
+    def batches(self) -> Iterator[list]:
+        """
+        Rows as tuples, batch by batch.
+        """
+        return self.spill_file.batches()
+
+    def to_rows(self, key=None, value=None) -> List[RowView]:
+        """
+        All the rows, loaded in memory as dict views. See ResultSet.to_rows.
+        """
+        index = column_index(key(column) for column in self.columns) if key else column_index(self.columns)
+        rows = (row for batch in self.batches() for row in batch)
+        if value:
+            rows = (tuple(map(value, row)) for row in rows)
+        return [RowView(index, row) for row in rows]
+
+    def __len__(self) -> int:
+        return self.row_count
+
+    def __iter__(self):
+        index = column_index(self.columns)
+        return (RowView(index, row) for batch in self.batches() for row in batch)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return list(self)[position]
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError("result index out of range")
+        for row_number, row in enumerate(self):
+            if row_number == position:
+                return row
+
+    def __reduce__(self):
+        # Loaded in memory, e.g. for the result cache
+        return ResultSet, (self.columns, [row for batch in self.batches() for row in batch])
+
+    def __repr__(self):
+        return f"SpilledResultSet(columns={list(self.columns)}, rows={len(self)}, path={self.spill_file.path})"
+
+
+class ResultSpiller:
+    """
+    Writes the rows of a result to a spill file as they are fetched.
+    """
+
+    def __init__(self, columns, memory_budget: int, directory: Optional[str] = None):
+        self.columns = list(columns)
+        self.memory_budget = memory_budget
+        self.directory = directory
+        self.spill_file = _SpillFile(directory, prefix='result_')
+        self.row_count = 0
+
+    def add_rows(self, rows: list):
+        self.spill_file.write([tuple(_picklable(value) for value in row) for row in rows])
+        self.row_count += len(rows)
+
+    def build(self, fingerprint=None) -> SpilledResultSet:
+        self.spill_file.close()
+        return SpilledResultSet(self.columns, self.spill_file, self.row_count, self.memory_budget,
+                                directory=self.directory, fingerprint=fingerprint)
+
+
+def _picklable(value):
+    # Driver specific buffers (e.g. psycopg2's memoryview) are stored as bytes
+    if isinstance(value, (memoryview, bytearray)):
+        return bytes(value)
+    return value
+
+
+def _canonical_value(value):
+    """
+    Canonical key of a normalized value. Values matching as per is_match have the same key, on columns
+    where is_match is an equivalence.
+    """
+    if value is None:
+        return ZERO_TAG, 0
+    value_type = type(value)
+    if value_type is str:
+        return (NONE_STRING_TAG, 0) if value == 'None' else (STRING_TAG, value)
+    if value_type is int or value_type is bool:
+        return (INT_TAG, int(value)) if value else (ZERO_TAG, 0)
+    if value_type is float or value_type is decimal.Decimal:
+        try:
+            if value == 0:
+                return ZERO_TAG, 0
+            if abs(value) < MAX_ROUNDED_MAGNITUDE:
+                rounded = round(value, 1)
+                key = int(rounded.scaleb(1) if value_type is decimal.Decimal else round(rounded * 10))
+                return (ROUNDED_TAG, key) if key else (TINY_TAG, 0)
+        except (ValueError, ArithmeticError):
+            # NaN
+            pass
+    return OTHER_TAG, repr(value)
+
+
+def _group_key(keys: tuple) -> tuple:
+    # Values rounding to zero and 'None' strings are grouped with the zero values, they may match some of them
+    return tuple((ZERO_TAG, 0) if tag in _KIND_OF_TAG else (tag, key) for tag, key in keys)
+
+
+def _zero_label(value) -> str:
+    """
+    Label of a value with a zero group key: the values with the same label match the same values.
+    """
+    if value is None:
+        return 'null'
+    if isinstance(value, str):
+        return 'none_string'
+    if isinstance(value, (float, decimal.Decimal)):
+        label = 'zero' if value == 0 else 'tiny'
+        return '-' + label if str(round(value, 1)).startswith('-') else label
+    return 'int'
+
+
+@lru_cache(maxsize=None)
+def _zero_labels_match(expected_label: str, actual_label: str) -> bool:
+    from .result_set_match import is_match
+    return is_match(_ZERO_REPRESENTATIVES[expected_label], _ZERO_REPRESENTATIVES[actual_label])
+
+
+class _ColumnKinds:
+    """
+    Kinds of the values seen per column, to tell whether group keys and the tie-break match as is_match does.
+    """
+
+    def __init__(self, count: int):
+        self.tags = [set() for _ in range(count)]
+
+    def add(self, keys: tuple):
+        for tags, (tag, _) in zip(self.tags, keys):
+            tags.add(_KIND_OF_TAG.get(tag, tag))
+
+    def is_equivalence(self, other: '_ColumnKinds') -> bool:
+        for tags, other_tags in zip(self.tags, other.tags):
+            value_tags = (tags | other_tags) - {ZERO_TAG}
+            if OTHER_TAG in value_tags or len(value_tags) > 1:
+                return False
+        return True
+
+
+def _result_batches(result) -> Optional[tuple]:
+    """
+    Column names and batches of row tuples of a result of any type. None when rows don't share a header.
+    """
+    if isinstance(result, SpilledResultSet):
+        return list(result.columns), result.batches()
+    columns = getattr(result, 'columns', None)
+    if columns is not None and hasattr(result, 'to_rows'):
+        rows = getattr(result, 'rows', None)
+        if rows is None:
+            rows = list(zip(*result.column_values()))
+        return list(columns), iter([rows])
+    if not result:
+        return [], iter([])
+    columns = list(result[0].keys())
+    if any(list(row.keys()) != columns for row in result):
+        return None
+    return columns, iter([[tuple(row.values()) for row in result]])
+
+
+class _SortedRuns:
+    """
+    Canonicalized rows of a result, as runs sorted by their keys, spilled once they reach the memory budget.
+    """
+
+    def __init__(self, memory_budget: int, directory: Optional[str]):
+        self.memory_budget = memory_budget
+        self.directory = directory
+        self.runs = []
+        self.buffer = []
+        self.buffer_size = 0
+
+    def add(self, key: tuple, row: tuple):
+        self.buffer.append((key, row))
+        self.buffer_size += ROW_OVERHEAD_BYTES * 2 + sum(sys.getsizeof(value) for value in row)
+        if self.buffer_size >= self.memory_budget:
+            self._spill()
+
+    def _spill(self):
+        self.buffer.sort(key=itemgetter(0))
+        run = _SpillFile(self.directory, prefix='run_')
+        run.write(self.buffer)
+        run.close()
+        self.runs.append(run)
+        self.buffer = []
+        self.buffer_size = 0
+
+    def spill(self):
+        """
+        Writes the rows held in memory to a run, e.g. before merging the runs while filling other runs.
+        """
+        if self.buffer:
+            self._spill()
+
+    def merged(self) -> Iterator[tuple]:
+        """
+        All the (key, row) in the order of keys.
+        """
+        self.buffer.sort(key=itemgetter(0))
+        streams = [(entry for batch in run.batches() for entry in batch) for run in self.runs]
+        return heapq.merge(*streams, iter(self.buffer), key=itemgetter(0))
+
+
+def _numbered_rows(batches: Iterator[list]) -> Iterator[tuple]:
+    """
+    (position, row) for the rows of a result in order, quotes stripped from the values.
+    """
+    position = 0
+    for batch in batches:
+        for row in batch:
+            yield position, tuple(_strip_quotes(value) for value in row)
+            position += 1
+
+
+def _deduplicated(rows: Iterator[tuple], dedup_positions: list, memory_budget: int,
+                  directory: Optional[str]) -> Iterator[tuple]:
+    """
+    (position, row) keeping the first row of every distinct value of the de-dup columns, as remove_duplicates does.
+    Rows are sorted in runs by the hash of those values, so duplicates are next to each other.
+    """
+    from .result_set_match import convert_value_to_tuple
+
+    runs = _SortedRuns(memory_budget, directory)
+    for position, row in rows:
+        runs.add((hash(tuple(convert_value_to_tuple(row[p]) for p in dedup_positions)), position), row)
+    runs.spill()
+    for _, entries in groupby(runs.merged(), key=lambda entry: entry[0][0]):
+        seen = set()
+        for (_, position), row in entries:
+            values = tuple(convert_value_to_tuple(row[p]) for p in dedup_positions)
+            if values not in seen:
+                seen.add(values)
+                yield position, row
+
+
+def _canonicalize(rows: Iterator[tuple], positions: List[int], memory_budget: int,
+                  directory: Optional[str]) -> tuple:
+    """
+    Sorted runs of the group keys (of the compared columns) and positions of the rows of a result, with the kinds
+    of the values of the compared columns.
+    """
+    kinds = _ColumnKinds(len(positions))
+    runs = _SortedRuns(memory_budget, directory)
+    for position, row in rows:
+        keys = tuple(_canonical_value(row[p]) for p in positions)
+        kinds.add(keys)
+        runs.add((_group_key(keys), position), row)
+    return runs, kinds
+
+
+def _distinct_rows(rows: list, dedup_positions: list) -> list:
+    from .result_set_match import convert_value_to_tuple
+
+    seen = set()
+    distinct = []
+    for row in rows:
+        values = tuple(convert_value_to_tuple(row[p]) for p in dedup_positions)
+        if values not in seen:
+            seen.add(values)
+            distinct.append(row)
+    return distinct
+
+
+def _groups(runs: _SortedRuns, dedup_positions: Optional[list]) -> Iterator[tuple]:
+    """
+    (group key, rows) for every group key, rows in result order and distinct on the de-dup columns when given.
+    """
+    for key, entries in groupby(runs.merged(), key=lambda entry: entry[0][0]):
+        rows = [row for _, row in entries]
+        yield key, (rows if dedup_positions is None else _distinct_rows(rows, dedup_positions))
+
+
+def _tie_break(expected_rows: list, actual_rows: list, expected_positions: list,
+               actual_positions: list) -> Optional[tuple]:
+    """
+    Matches the rows of a group as compare_results does: every expected row takes the first actual row left
+    which matches it, on the columns with zero group keys (given by their positions). The other columns have the
+    same keys, they match. Returns a mismatching expected row and an actual row left, None when all rows match.
+    """
+    expected_labels = [tuple(_zero_label(row[p]) for p in expected_positions) for row in expected_rows]
+    actual_labels = [tuple(_zero_label(row[p]) for p in actual_positions) for row in actual_rows]
+    if not any(label in _AMBIGUOUS_LABELS for labels in expected_labels + actual_labels for label in labels):
+        # Zero values match each other
+        return None
+
+    # Actual rows by labels, in result order
+    buckets = {}
+    for i, labels in enumerate(actual_labels):
+        buckets.setdefault(labels, deque()).append(i)
+    for expected_row, labels in zip(expected_rows, expected_labels):
+        candidates = [bucket for bucket_labels, bucket in buckets.items()
+                      if bucket and all(map(_zero_labels_match, labels, bucket_labels))]
+        if not candidates:
+            left = min(bucket[0] for bucket in buckets.values() if bucket)
+            return expected_row, actual_rows[left]
+        min(candidates, key=lambda bucket: bucket[0]).popleft()
+    return None
+
+
+def compare_spilled(expected, actual, plan) -> Optional[tuple]:
+    """
+    Compares results (at least one of them spilled) in external memory, as compare_results does in memory.
+    Returns None when it can't: rules other than exact, columns not present by name or mixing kinds of values
+    (e.g. numbers and strings).
+    When rows differ, the error reports a mismatching expected row and an unmatched actual row, not necessarily
+    the rows reported by the in-memory comparison.
+    """
+    if plan.consumes_columns or any(rule.match != "exact" for rule in plan.rules):
+        return None
+    expected_result = _result_batches(expected)
+    actual_result = _result_batches(actual)
+    if expected_result is None or actual_result is None:
+        return None
+
+    expected_columns = [column.lower() if column is not None else None for column in expected_result[0]]
+    actual_columns = [column.lower() if column is not None else None for column in actual_result[0]]
+    compared = []
+    if any(rule.all_columns for rule in plan.rules):
+        compared.extend(expected_columns)
+    compared.extend(column for rule in plan.rules if not rule.all_columns for column in rule.columns)
+    compared = list(dict.fromkeys(compared))
+    if any(column not in expected_columns or column not in actual_columns for column in compared):
+        return None
+    expected_index = column_index(expected_columns)
+    actual_index = column_index(actual_columns)
+    expected_positions = [expected_index[column] for column in compared]
+    actual_positions = [actual_index[column] for column in compared]
+
+    memory_budget = max(getattr(expected, 'memory_budget', 0), getattr(actual, 'memory_budget', 0)) // 2 or 1
+    directory = getattr(expected, 'directory', None) or getattr(actual, 'directory', None)
+    expected_rows = _numbered_rows(expected_result[1])
+    actual_rows = _numbered_rows(actual_result[1])
+
+    # De-duplication as in compare_results. Rows are de-duplicated within their groups when the de-dup columns are
+    # the compared columns, in a pass of their own otherwise.
+    expected_dedup = actual_dedup = None
+    cols = list(plan.dedup_columns)
+    if (len(expected) > 0 and len(actual) > 0 and expected_index.keys() == actual_index.keys()
+            and (cols != ['*'] or len(expected_index) == 1)):
+        dedup_columns = [column for column in (cols if cols != ['*'] else expected_index) if column in expected_index]
+        expected_dedup = [expected_index[column] for column in dedup_columns]
+        actual_dedup = [actual_index[column] for column in dedup_columns]
+        if set(dedup_columns) != set(compared):
+            expected_rows = _deduplicated(expected_rows, expected_dedup, memory_budget, directory)
+            actual_rows = _deduplicated(actual_rows, actual_dedup, memory_budget, directory)
+            expected_dedup = actual_dedup = None
+
+    expected_runs, expected_kinds = _canonicalize(expected_rows, expected_positions, memory_budget, directory)
+    actual_runs, actual_kinds = _canonicalize(actual_rows, actual_positions, memory_budget, directory)
+    if not expected_kinds.is_equivalence(actual_kinds):
+        logging.info("Spilled results can't be compared in external memory")
+        return None
+
+    # Merge both sides by key
+    expected_count = actual_count = 0
+    missing = unmatched = None
+    expected_groups = _groups(expected_runs, expected_dedup)
+    actual_groups = _groups(actual_runs, actual_dedup)
+    expected_group = next(expected_groups, None)
+    actual_group = next(actual_groups, None)
+    while expected_group is not None or actual_group is not None:
+        if actual_group is None or (expected_group is not None and expected_group[0] < actual_group[0]):
+            expected_count += len(expected_group[1])
+            missing = missing or expected_group[1][0]
+            expected_group = next(expected_groups, None)
+        elif expected_group is None or actual_group[0] < expected_group[0]:
+            actual_count += len(actual_group[1])
+            unmatched = unmatched or actual_group[1][0]
+            actual_group = next(actual_groups, None)
+        else:
+            key, expected_group_rows = expected_group
+            actual_group_rows = actual_group[1]
+            expected_count += len(expected_group_rows)
+            actual_count += len(actual_group_rows)
+            if len(expected_group_rows) > len(actual_group_rows):
+                missing = missing or expected_group_rows[0]
+            elif len(actual_group_rows) > len(expected_group_rows):
+                unmatched = unmatched or actual_group_rows[0]
+            elif any(tag == ZERO_TAG for tag, _ in key):
+                zero_columns = [j for j, (tag, _) in enumerate(key) if tag == ZERO_TAG]
+                mismatch = _tie_break(expected_group_rows, actual_group_rows,
+                                      [expected_positions[j] for j in zero_columns],
+                                      [actual_positions[j] for j in zero_columns])
+                if mismatch is not None:
+                    missing = missing or mismatch[0]
+                    unmatched = unmatched or mismatch[1]
+            expected_group = next(expected_groups, None)
+            actual_group = next(actual_groups, None)
+
+    def as_dict(columns, row):
+        return 'null' if row is None else dict(zip(columns, row))
+
+    if expected_count != actual_count:
+        # First rows of the results, kept by de-duplication
+        expected_first = next(_numbered_rows(_result_batches(expected)[1]), (None, None))[1]
+        actual_first = next(_numbered_rows(_result_batches(actual)[1]), (None, None))[1]
+        return False, (f"Number of rows are different, example: exp={as_dict(expected_columns, expected_first)}, "
+                       f"act={as_dict(actual_columns, actual_first)}, #exp={expected_count}, #act={actual_count}")
+    if missing is not None:
+        return False, (f"Comparison failed for row: exp={as_dict(expected_columns, missing)}, "
+                       f"act={as_dict(actual_columns, unmatched)}")
+    return True, ""
+
+
+def _strip_quotes(value):
+    return value.strip('"') if isinstance(value, str) else value
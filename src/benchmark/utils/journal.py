@@ -0,0 +1,113 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+DEFAULT_JOURNAL_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "..", "journals")
+
+
+def get_journal_path(run_id: str, journal_dir: Optional[str] = None) -> str:
+    return os.path.abspath(os.path.join(journal_dir or DEFAULT_JOURNAL_DIR, f"{run_id}.jsonl"))
+
+
+class RunJournal:
+    """
+    Append-only JSONL journal of completed tasks of a run.
+
+    A fresh run starts a new journal: a journal left at the path by an earlier run with the same run id is rotated to
+    `<path>.1`, so its tasks are not taken as completed by a later resume. A resumed run appends to the journal, after
+dropping a partially written last record (e.g. after a crash).
+
+    Every record is written and flushed to the OS as soon as it is appended, so it survives a crash of the process.
+    fsync is batched: it happens every `fsync_every` records or `fsync_interval` seconds, whichever comes first.
+    """
+
+    def __init__(self, path: str, resume: bool = False, fsync_every: int = 10, fsync_interval: float = 5.0):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        if not resume and os.path.exists(self.path):
+            os.replace(self.path, self.path + ".1")
+            logging.info(f"Rotated journal of an earlier run to {self.path}.1")
+        elif resume and os.path.exists(self.path):
+            _truncate_partial_record(self.path)
+
+        self._lock = threading.Lock()
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._pending = 0
+        self._last_fsync = time.time()
+        logging.info(f"Writing run journal to {self.path}")
+
+    def append(self, record: dict):
+        line = json.dumps(record, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            self._pending += 1
+            if self._pending >= self.fsync_every or time.time() - self._last_fsync >= self.fsync_interval:
+                self._fsync()
+
+    def _fsync(self):
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_fsync = time.time()
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._fsync()
+            self._file.close()
+
+
+def _truncate_partial_record(path: str, chunk_size: int = 4096):
+    """
+    Truncates the file after its last newline, so that appended records don't continue a torn line.
+    """
+    with open(path, 'rb+') as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - chunk_size)
+            f.seek(start)
+            newline = f.read(position - start).rfind(b"\n")
+            if newline != -1:
+                position = start + newline + 1
+                break
+            position = start
+        if position != end:
+            logging.warning(f"Dropping incomplete last record of {path}")
+            f.truncate(position)
+
+
+def load_journal(path: str) -> List[dict]:
+    """
+    Reads the records of a journal. A partially written last line (e.g after a crash) is skipped.
+    """
+    records = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                logging.warning(f"Skipping incomplete record at line {line_number} of {path}")
+    return records
+
+
+def load_completed_tasks(path: str) -> Dict[str, dict]:
+    """
+    Records of the journal by query name. Last record of a query wins.
+    """
+    completed = {}
+    for record in load_journal(path):
+        query_name = (record.get('query_info') or {}).get('query_name')
+        if query_name is not None:
+            completed[query_name] = record
+    return completed
@@ -0,0 +1,301 @@
+"""
+Comparison of large results in a process pool, for compare_results.
+
+Workers canonicalize the rows chunk by chunk into integer keys, as vectorized_match does (strings are hashed,
+so that keys agree across processes), and write them to shared memory. Key rows are then hash-partitioned: rows
+with the same keys land in the same partition, so partitions are compared independently by the workers, and
+their verdicts and first mismatches merged into those of the whole comparison.
+
+Arrow results are handed to the workers in shared memory (Arrow IPC stream), other results are pickled chunk
+by chunk.
+"""
+import hashlib
+import logging
+import math
+from concurrent.futures import Executor, wait
+from multiprocessing import shared_memory
+from typing import List, Optional
+
+import numpy as np
+
+from .arrow_result import ArrowResultSet, SharedTable, read_shared_table
+from .vectorized_match import FLOAT_TYPES, INT_TYPES, STRING_TYPES, int_keys, rounded_keys
+
+# Rows canonicalized per task, at least
+MIN_CHUNK_ROWS = 10000
+# Chunks per partition, for balancing the load
+CHUNKS_PER_PARTITION = 4
+# Multiplier of the row hash used for partitioning (64-bit golden ratio)
+HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+def compare_partitioned(executor: Executor, partitions: int, expected, actual, expected_positions: List[int],
+                        actual_positions: List[int]) -> Optional[tuple]:
+    """
+    Compares the rows of both results (with the same number of rows) on the columns at the given positions,
+    as the vectorized kernels do, in the given number of partitions run by the executor's processes.
+    Returns (True, None, None) when they match, (False, expected index, actual index) of the rows reported by
+    the row by row comparison when they don't. None when the columns can't be compared with keys.
+    """
+    blocks = []
+    tasks = []
+    try:
+        return _compare(executor, partitions, expected, actual, expected_positions, actual_positions, blocks, tasks)
+    except Exception as e:
+        logging.warning(f"Comparison in the process pool failed, comparing in memory: {e}")
+        return None
+    finally:
+        # Workers must be done with the shared memory before it is released
+        wait(tasks)
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+def _compare(executor: Executor, partitions: int, expected, actual, expected_positions, actual_positions,
+             blocks: list, tasks: list) -> Optional[tuple]:
+    keys = []
+    for result, positions in ((expected, expected_positions), (actual, actual_positions)):
+        result_keys = _SharedArray((len(result), len(positions)))
+        blocks.append(result_keys)
+        keys.append(result_keys)
+        tasks.extend(executor.submit(_canonicalize_chunk, source, chunk_positions, result_keys.handle, start)
+                     for source, chunk_positions, start in _chunks(result, positions, partitions, blocks))
+
+    # Columns must hold values of one kind across all the chunks, as in vectorized_match.column_keys
+    chunk_types = [task.result() for task in tasks]
+    if any(types is None for types in chunk_types):
+        return None
+    column_types = [set().union(*types) for types in zip(*chunk_types)]
+    if not all(_is_single_kind(types) for types in column_types):
+        return None
+
+    # Partitions of both results, as row numbers sorted by partition
+    orders = []
+    bounds = []
+    for result_keys in keys:
+        row_partitions = _partition(result_keys.array, partitions)
+        order = _SharedArray((len(row_partitions),))
+        blocks.append(order)
+        order.array[:] = np.argsort(row_partitions, kind='stable')
+        orders.append(order)
+        bounds.append(np.concatenate(([0], np.cumsum(np.bincount(row_partitions, minlength=partitions)))))
+    handles = [result_keys.handle for result_keys in keys] + [order.handle for order in orders]
+    partition_bounds = [[(int(side[partition]), int(side[partition + 1])) for side in bounds]
+                        for partition in range(partitions)]
+
+    verdicts = _map(executor, tasks, _compare_partition, handles, partition_bounds)
+    if all(matched for matched, _ in verdicts):
+        return True, None, None
+    # Rows are matched greedily in the order of expected rows: the first expected row left without a match is
+    # the first one over all partitions, and the actual rows left unmatched at that point are those of all
+    # partitions
+    expected_position = min(position for _, position in verdicts if position is not None)
+    actual_position = max(_map(executor, tasks, _last_unmatched, handles, partition_bounds, expected_position))
+    return False, expected_position, actual_position
+
+
+def _map(executor: Executor, tasks: list, fn, handles: list, partition_bounds: list, *args) -> list:
+    """
+    Results of fn for every partition, run by the workers.
+    """
+    partition_tasks = [executor.submit(fn, handles, bounds, *args) for bounds in partition_bounds]
+    tasks.extend(partition_tasks)
+    return [task.result() for task in partition_tasks]
+
+
+def _chunks(result, positions: List[int], partitions: int, blocks: list) -> list:
+    """
+    (source, column positions, first row) of every chunk of rows of the result.
+    """
+    row_count = len(result)
+    chunk_rows = max(MIN_CHUNK_ROWS, math.ceil(row_count / (partitions * CHUNKS_PER_PARTITION)))
+    starts = range(0, row_count, chunk_rows)
+    if isinstance(result, ArrowResultSet):
+        table = SharedTable(result.table.select(positions))
+        blocks.append(table)
+        return [(('arrow', table.handle, start, min(chunk_rows, row_count - start)), list(range(len(positions))),
+                 start) for start in starts]
+
+    rows = getattr(result, 'rows', None)
+    if rows is None:
+        rows = [tuple(row.values()) for row in result]
+    return [(('rows', [tuple(row) for row in rows[start:start + chunk_rows]]), positions, start)
+            for start in starts]
+
+
+def result_columns(result) -> Optional[list]:
+    """
+    Column names of a result whose rows share one header, None for rows (dicts) with different columns.
+    """
+    columns = getattr(result, 'columns', None)
+    if columns is not None:
+        return list(columns)
+    if not result:
+        return []
+    columns = list(result[0].keys())
+    if any(list(row.keys()) != columns for row in result):
+        return None
+    return columns
+
+
+class _SharedArray:
+    """
+    int64 array in shared memory, created by the calling process. Workers attach to it by its handle.
+    """
+
+    def __init__(self, shape: tuple):
+        self.block = shared_memory.SharedMemory(create=True, size=max(8 * math.prod(shape), 1))
+        self.array = np.ndarray(shape, dtype=np.int64, buffer=self.block.buf)
+        self.handle = (self.block.name, shape)
+
+    def close(self):
+        self.array = None
+        self.block.close()
+
+    def unlink(self):
+        self.block.unlink()
+
+
+def _is_single_kind(types: set) -> bool:
+    return (bool(types) and types <= STRING_TYPES) or types <= INT_TYPES or types <= FLOAT_TYPES
+
+
+def _partition(keys: np.ndarray, partitions: int) -> np.ndarray:
+    """
+    Partition of every key row, by its hash.
+    """
+    row_hash = np.zeros(len(keys), dtype=np.uint64)
+    for column in keys.T:
+        row_hash = (row_hash ^ column.astype(np.uint64)) * HASH_MULTIPLIER
+    return ((row_hash >> np.uint64(32)) % np.uint64(partitions)).astype(np.int64)
+
+
+def _canonicalize_chunk(source: tuple, positions: List[int], keys_handle: tuple, start: int) -> Optional[list]:
+    """
+    Writes the keys of a chunk of rows to the shared key array, from the row at start.
+    Returns the types of the values of every column, None when some column can't be compared with keys.
+    """
+    columns = _chunk_columns(source, positions)
+    column_types = []
+    column_keys = []
+    for values in columns:
+        values = [value.strip('"') if isinstance(value, str) else value for value in values]
+        types = set(map(type, values))
+        types.discard(type(None))
+        if not types:
+            keys = np.zeros(len(values), dtype=np.int64)
+        elif types <= STRING_TYPES:
+            keys = _string_keys(values)
+        elif types <= INT_TYPES:
+            keys = int_keys(values)
+        elif types <= FLOAT_TYPES:
+            keys = rounded_keys(values)
+        else:
+            return None
+        if keys is None:
+            return None
+        column_types.append(types)
+        column_keys.append(keys)
+
+    name, shape = keys_handle
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        array = np.ndarray(shape, dtype=np.int64, buffer=block.buf)
+        for i, keys in enumerate(column_keys):
+            array[start:start + len(keys), i] = keys
+        del array
+    finally:
+        block.close()
+    return column_types
+
+
+def _chunk_columns(source: tuple, positions: List[int]) -> List[list]:
+    """
+    Values of the columns at the given positions, for the chunk of rows.
+    """
+    if source[0] == 'rows':
+        rows = source[1]
+        return [[row[position] for row in rows] for position in positions]
+
+    _, handle, start, length = source
+    return read_shared_table(handle, lambda table: [table.column(position).slice(start, length).to_pylist()
+                                                    for position in positions])
+
+
+def _string_keys(values: list) -> Optional[np.ndarray]:
+    # Stable across processes, unlike hash(). None is 0 (see vectorized_match), which matches 'None'.
+    keys = np.zeros(len(values), dtype=np.int64)
+    for i, value in enumerate(values):
+        if value is None:
+            continue
+        if value == 'None':
+            return None
+        digest = hashlib.blake2b(value.encode('utf-8', 'surrogatepass'), digest_size=8).digest()
+        keys[i] = int.from_bytes(digest, 'little', signed=True) or 1
+    return keys
+
+
+def _partition_rows(handles: list, bounds: list) -> tuple:
+    """
+    Row numbers of the expected and actual rows of a partition (in order), and the number of their key row among
+    the distinct key rows of the partition.
+    """
+    rows = []
+    keys = []
+    for (keys_name, keys_shape), (order_name, order_shape), (start, stop) in zip(handles[:2], handles[2:], bounds):
+        keys_block = shared_memory.SharedMemory(name=keys_name)
+        order_block = shared_memory.SharedMemory(name=order_name)
+        try:
+            order = np.ndarray(order_shape, dtype=np.int64, buffer=order_block.buf)
+            result_keys = np.ndarray(keys_shape, dtype=np.int64, buffer=keys_block.buf)
+            partition_rows = order[start:stop].copy()
+            keys.append(result_keys[partition_rows])
+            rows.append(partition_rows)
+            del order, result_keys
+        finally:
+            keys_block.close()
+            order_block.close()
+    expected_rows, actual_rows = rows
+    if not len(expected_rows) and not len(actual_rows):
+        return expected_rows, expected_rows, actual_rows, actual_rows, 0
+    distinct, groups = np.unique(np.concatenate(keys), axis=0, return_inverse=True)
+    groups = groups.reshape(-1)
+    return (expected_rows, groups[:len(expected_rows)], actual_rows, groups[len(expected_rows):], len(distinct))
+
+
+def _ranks(rows: np.ndarray, groups: np.ndarray) -> np.ndarray:
+    """
+    Rank of every row among the rows of its group, by row number.
+    """
+    order = np.lexsort((rows, groups))
+    sorted_groups = groups[order]
+    ranks = np.empty(len(rows), dtype=np.int64)
+    ranks[order] = np.arange(len(rows)) - np.searchsorted(sorted_groups, sorted_groups)
+    return ranks
+
+
+def _compare_partition(handles: list, bounds: list) -> tuple:
+    """
+    Whether the rows of the partition match, and the first expected row without a match (None when they all
+    have one).
+    """
+    expected_rows, expected_groups, actual_rows, actual_groups, group_count = _partition_rows(handles, bounds)
+    expected_counts = np.bincount(expected_groups, minlength=group_count)
+    actual_counts = np.bincount(actual_groups, minlength=group_count)
+    if np.array_equal(expected_counts, actual_counts):
+        return True, None
+    # The expected rows of a group beyond the number of actual rows of the group are left without a match
+    unmatched = expected_rows[_ranks(expected_rows, expected_groups) >= actual_counts[expected_groups]]
+    return False, int(unmatched.min()) if len(unmatched) else None
+
+
+def _last_unmatched(handles: list, bounds: list, expected_position: int) -> int:
+    """
+    Last actual row of the partition left without a match once the expected rows before expected_position
+    are matched, -1 when there is none.
+    """
+    expected_rows, expected_groups, actual_rows, actual_groups, group_count = _partition_rows(handles, bounds)
+    matched_counts = np.bincount(expected_groups[expected_rows < expected_position], minlength=group_count)
+    unmatched = actual_rows[_ranks(actual_rows, actual_groups) >= matched_counts[actual_groups]]
+    return int(unmatched.max()) if len(unmatched) else -1
@@ -0,0 +1,136 @@
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+
+class Stage:
+    """
+    A pipeline stage with its own thread pool and a bounded queue in front of it.
+    Submitting to a full stage blocks the caller, which applies back pressure to the upstream stage.
+    """
+
+    def __init__(self, name: str, fn: Callable, workers: int, queue_size: int):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.queue_size = queue_size
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}_stage")
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._lock = threading.Lock()
+        self._closed = False
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self.busy_time = 0.0
+        self.start_time = time.time()
+
+    def submit(self, fn: Callable, *args) -> Future:
+        while not self._slots.acquire(timeout=0.1):
+            if self._closed:
+                raise RuntimeError(f"Stage {self.name} is shut down")
+        with self._lock:
+            self.queued += 1
+        try:
+            return self._executor.submit(self._run, fn, *args)
+        except Exception:
+            with self._lock:
+                self.queued -= 1
+            self._slots.release()
+            raise
+
+    def _run(self, fn: Callable, *args):
+        with self._lock:
+            self.queued -= 1
+            self.active += 1
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.completed += 1
+            self._slots.release()
+
+    def add_busy_time(self, busy_time: float):
+        with self._lock:
+            self.busy_time += busy_time
+
+    def utilization(self) -> float:
+        """
+        Fraction of the stage's worker time spent on work since the stage was created.
+        """
+        elapsed = (time.time() - self.start_time) * self.workers
+        return min(1.0, self.busy_time / elapsed) if elapsed > 0 else 0.0
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self._closed = True
+        self._executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+
+class Pipeline:
+    """
+    Runs each submitted item through the stages in order. Output of a stage is the input of the next one.
+    The returned future completes with the output of the last stage, or with the first exception raised.
+    Futures cancelled by the caller (e.g. when halting) are left as they are.
+    """
+
+    def __init__(self, stages: List[Stage]):
+        self.stages = stages
+        self.closed = False
+
+    def submit(self, item, result_future: Optional[Future] = None) -> Future:
+        if result_future is None:
+            result_future = Future()
+        self._advance(0, item, result_future)
+        return result_future
+
+    def _advance(self, index: int, value, result_future: Future):
+        if index == len(self.stages):
+            _complete(result_future, result=value)
+            return
+        if result_future.done():
+            return
+        try:
+            self.stages[index].submit(self._run_stage, index, value, result_future)
+        except Exception as e:
+            _complete(result_future, error=e)
+
+    def _run_stage(self, index: int, value, result_future: Future):
+        stage = self.stages[index]
+        stime = time.time()
+        try:
+            output = stage.fn(value)
+        except BaseException as e:
+            _complete(result_future, error=e)
+            return
+        finally:
+            stage.add_busy_time(time.time() - stime)
+        # Blocks when the next stage is full
+        self._advance(index + 1, output, result_future)
+
+    def get_progress_info(self) -> dict:
+        """
+        Current queue depth and utilization (busy workers) of each stage.
+        """
+        return {stage.name: f"q:{stage.queued} u:{stage.active * 100 // stage.workers}%" for stage in self.stages}
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.closed = True
+        for stage in self.stages:
+            stage.shutdown(wait=False, cancel_futures=cancel_futures)
+        if wait:
+            for stage in self.stages:
+                stage.shutdown(wait=True)
+
+
+def _complete(future: Future, result=None, error: Optional[BaseException] = None):
+    # The future may have been cancelled meanwhile, its outcome is no longer wanted
+    if future.done():
+        return
+    try:
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        pass
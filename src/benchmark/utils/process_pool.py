@@ -0,0 +1,116 @@
+"""
+Pool of processes for the CPU-bound work of the benchmark: comparison of results and SQL formatting (sqlfluff).
+Threads run Python code one at a time (GIL), so this work would be serialized across the threads of the benchmark,
+which are left with the I/O (queries, LLM calls).
+
+Results are handed to the workers without building dicts: arrow results in shared memory (Arrow IPC stream),
+other results as tuples sharing one header (see ResultSet).
+"""
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Optional
+
+from .arrow_result import ArrowResultSet, SharedTable, read_shared_table
+from .external_compare import SpilledResultSet
+from .partitioned_compare import compare_partitioned, result_columns
+from .result_set import ResultSet
+from .result_set_match import ComparisonPlan, compare_exact_match, compare_results
+from .sql_format import format_sql_query
+
+# Results with more rows (expected and actual together) are compared in partitions, in parallel
+PARTITION_MIN_ROWS = 200000
+
+
+class ProcessPool:
+    """
+    Pool of worker processes shared by all the tasks. Processes are spawned rather than forked, as the benchmark
+    runs threads.
+    """
+
+    def __init__(self, workers: int, partition_min_rows: Optional[int] = None):
+        self.workers = workers
+        self.partition_min_rows = partition_min_rows if partition_min_rows is not None else PARTITION_MIN_ROWS
+        self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+    def compare_partitioned(self, expected, actual, expected_positions: List[int],
+                            actual_positions: List[int]) -> Optional[tuple]:
+        """
+        Compares large results in one partition per worker. See partitioned_compare.compare_partitioned.
+        """
+        return compare_partitioned(self.executor, self.workers, expected, actual, expected_positions,
+                                   actual_positions)
+
+    def compare_results(self, expected, actual, plan: Optional[ComparisonPlan], intent_based_match: bool = True,
+                        exact_match: bool = True) -> Optional[tuple]:
+        """
+        Outcomes of compare_results (with the plan, when provided) and compare_exact_match (when exact_match) of
+        the results, run by a worker. None for the results compared by the calling thread: spilled results, large
+        results (compared in partitions) or results which can't be handed to the workers.
+        """
+        if (isinstance(expected, SpilledResultSet) or isinstance(actual, SpilledResultSet)
+                or len(expected) + len(actual) >= self.partition_min_rows):
+            return None
+        blocks = []
+        try:
+            task = self.executor.submit(_compare, _share(expected, blocks), _share(actual, blocks), plan,
+                                        intent_based_match, exact_match)
+            verdicts, error = task.result()
+        except Exception as e:
+            logging.warning(f"Comparison in the process pool failed, comparing in this thread: {e}")
+            return None
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+        # Errors of the comparison itself are raised as if it ran in this thread
+        if error is not None:
+            raise error
+        return verdicts
+
+    def format_sql_query(self, query: str) -> str:
+        return self.executor.submit(format_sql_query, query).result()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _share(result, blocks: list) -> tuple:
+    """
+    Source of a result for the workers. Arrow results are written to shared memory, dicts sharing one header are
+    sent as tuples.
+    """
+    if isinstance(result, ArrowResultSet):
+        table = SharedTable(result.table)
+        blocks.append(table)
+        return 'arrow', table.handle
+    if isinstance(result, list):
+        columns = result_columns(result)
+        if columns is not None:
+            return 'result', ResultSet(columns, [tuple(row.values()) for row in result])
+    return 'result', result
+
+
+def _with_result(source: tuple, fn: Callable):
+    kind, value = source
+    if kind == 'arrow':
+        return read_shared_table(value, lambda table: fn(ArrowResultSet(table)))
+    return fn(value)
+
+
+def _compare(expected_source: tuple, actual_source: tuple, plan: Optional[ComparisonPlan],
+             intent_based_match: bool, exact_match: bool) -> tuple:
+    """
+    Outcomes of the comparisons, and the error raised by them (None when there is none).
+    """
+    def compare(expected, actual):
+        # Generated query results first for exact match, as in BenchmarkBase.compare_query_results
+        return (compare_results(expected, actual, plan, intent_based_match=intent_based_match)
+                if plan is not None else None,
+                compare_exact_match(actual, expected) if exact_match else None)
+
+    try:
+        return _with_result(expected_source, lambda expected: _with_result(
+            actual_source, lambda actual: compare(expected, actual))), None
+    except Exception as e:
+        return None, e
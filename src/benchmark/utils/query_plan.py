@@ -0,0 +1,168 @@
+"""
+Query plans (EXPLAIN) of the databases, normalized for comparing the plans of generated and golden queries:
+estimated cost, estimated rows and scan operators (e.g. 'full scan on city').
+
+Costs are in the units of the database: they can only be compared between plans of the same database.
+SQLite doesn't estimate costs, they are estimated from its query plan (EXPLAIN QUERY PLAN): its loops are nested,
+every loop visiting all the rows of its table (scan) or searching an index for the rows of each outer row (search).
+"""
+import json
+import math
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from .sql_canonical import tokenize_sql
+
+# Rows found by an index search which is not on a unique key (as estimated by SQLite without statistics)
+SEARCH_ROWS = 10
+
+# Scan operators, by Postgres node type
+POSTGRES_SCANS = {
+    'Seq Scan': 'full scan',
+    'Index Scan': 'index scan',
+    'Index Only Scan': 'index only scan',
+    'Bitmap Heap Scan': 'index scan',
+}
+# Words of statements which modify the database: queries with them are not run by EXPLAIN ANALYZE
+_WRITES = frozenset(['insert', 'update', 'delete', 'merge', 'create', 'drop', 'alter', 'truncate', 'grant',
+                     'revoke', 'copy', 'call', 'do', 'lock', 'vacuum', 'analyze', 'refresh', 'into'])
+
+
+class QueryPlan(NamedTuple):
+    # Estimated cost and number of rows of the query
+    cost: Optional[float]
+    rows: Optional[float]
+    # Scan operators on the tables, in plan order
+    scans: Tuple[str, ...]
+    # Execution time (seconds) and rows of the query, when it was run (EXPLAIN ANALYZE)
+    actual_time: Optional[float] = None
+    actual_rows: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        plan = self._asdict()
+        plan['scans'] = list(self.scans)
+        return plan
+
+
+def is_read_only(query: str) -> bool:
+    """
+    Whether the query only reads (SELECT, WITH or VALUES without writes), so that it can be run for its plan.
+    """
+    words = [token.text.lower() for token in tokenize_sql(str(query)) if token.kind == 'word']
+    return bool(words) and words[0] in ('select', 'with', 'values', 'table') and not _WRITES.intersection(words)
+
+
+def is_cost_exceeded(generated_plan: Optional[QueryPlan], golden_plan: Optional[QueryPlan],
+                     threshold: float) -> Optional[bool]:
+    """
+    Whether the estimated cost of the generated query is beyond threshold times the one of the golden query.
+    None when they can't be compared.
+    """
+    if generated_plan is None or golden_plan is None or generated_plan.cost is None or not golden_plan.cost:
+        return None
+    return generated_plan.cost > golden_plan.cost * threshold
+
+
+def parse_postgres_plan(plan) -> QueryPlan:
+    """
+    Plan of EXPLAIN (FORMAT JSON), with ANALYZE or not.
+    """
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    if isinstance(plan, list):
+        plan = plan[0]
+    root = plan['Plan']
+    scans = []
+    nodes = [root]
+    while nodes:
+        node = nodes.pop()
+        if 'Relation Name' in node:
+            operator = POSTGRES_SCANS.get(node['Node Type'], node['Node Type'].lower())
+            scans.append(f"{operator} on {node['Relation Name']}")
+        # Depth first, in plan order
+        nodes.extend(reversed(node.get('Plans', [])))
+    execution_time = plan.get('Execution Time')
+    return QueryPlan(cost=root.get('Total Cost'), rows=root.get('Plan Rows'), scans=tuple(scans),
+                     actual_time=execution_time / 1000 if execution_time is not None else None,
+                     actual_rows=root.get('Actual Rows'))
+
+
+def parse_sqlite_plan(plan_rows: List[tuple], table_rows: Dict[str, Optional[int]],
+                      aliases: Optional[Dict[str, str]] = None) -> QueryPlan:
+    """
+    Plan of EXPLAIN QUERY PLAN (rows of id, parent, notused, detail), with its cost estimated from the number of
+    rows of the tables (by case-folded name). Tables are named by their alias in the plan.
+    """
+    children = {}
+    for row in plan_rows:
+        children.setdefault(row[1], []).append(row)
+    plan = _SqlitePlan(children, {name.lower(): rows for name, rows in table_rows.items()},
+                       {alias.lower(): table.lower() for alias, table in (aliases or {}).items()})
+    cost, rows = plan.loops(0)
+    return QueryPlan(cost=cost, rows=rows, scans=tuple(plan.scans))
+
+
+class _SqlitePlan:
+
+    def __init__(self, children: dict, table_rows: dict, aliases: dict):
+        self.children = children
+        self.table_rows = table_rows
+        self.aliases = aliases
+        # Rows of materialized subqueries (and CTEs) by name
+        self.subquery_rows = {}
+        self.scans = []
+
+    def loops(self, parent: int) -> Tuple[float, float]:
+        """
+        Cost and rows of the steps under the parent, which are nested loops.
+        """
+        cost = 0.0
+        rows = 1.0
+        for step_id, _, _, detail in self.children.get(parent, []):
+            words = detail.split()
+            if detail == 'SCAN CONSTANT ROW':
+                continue
+            if words[0] in ('SCAN', 'SEARCH'):
+                table_rows = self._rows(words[1])
+                if words[0] == 'SCAN':
+                    loop_cost = loop_rows = table_rows
+                else:
+                    loop_cost = math.log2(table_rows + 1)
+                    unique = 'PRIMARY KEY' in detail or 'sqlite_autoindex' in detail
+                    loop_rows = 1 if unique else min(table_rows, SEARCH_ROWS)
+                    if 'AUTOMATIC' in detail:
+                        # Index built once, for the query
+                        cost += table_rows * math.log2(table_rows + 1)
+                self.scans.append(f"{_sqlite_operator(detail)} on {self.aliases.get(words[1].lower(), words[1])}")
+                cost += rows * loop_cost
+                rows *= max(loop_rows, 1)
+            elif detail.startswith('USE TEMP B-TREE'):
+                cost += rows * math.log2(rows + 1)
+            elif detail == 'COMPOUND QUERY':
+                compound_rows = 0.0
+                for part in self.children.get(step_id, []):
+                    part_cost, part_rows = self.loops(part[0])
+                    cost += part_cost
+                    compound_rows += part_rows
+                rows *= max(compound_rows, 1)
+            elif step_id in self.children:
+                sub_cost, sub_rows = self.loops(step_id)
+                if words[0] in ('MATERIALIZE', 'CO-ROUTINE') and len(words) > 1:
+                    self.subquery_rows[words[1].lower()] = sub_rows
+                # Correlated subqueries run for every row
+                cost += rows * sub_cost if words[0] == 'CORRELATED' else sub_cost
+        return cost, rows
+
+    def _rows(self, name: str) -> float:
+        name = name.lower()
+        if name in self.subquery_rows:
+            return self.subquery_rows[name]
+        rows = self.table_rows.get(self.aliases.get(name, name))
+        return float(rows) if rows is not None else 1.0
+
+
+def _sqlite_operator(detail: str) -> str:
+    if 'COVERING INDEX' in detail:
+        return 'index only scan'
+    if detail.startswith('SEARCH') or 'USING INDEX' in detail or 'PRIMARY KEY' in detail:
+        return 'index scan'
+    return 'full scan'
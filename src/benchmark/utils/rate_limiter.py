@@ -0,0 +1,180 @@
+import email.utils
+import logging
+import random
+import threading
+import time
+from typing import Callable, Optional
+
+# HTTP status codes worth retrying: rate limited, timeouts and transient server errors
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+# Exception class names (or parts of them) used by the LLM SDKs for rate limits and transient errors
+RETRYABLE_ERROR_NAMES = ('RateLimit', 'Timeout', 'APIConnectionError', 'ServiceUnavailable', 'Overloaded',
+                         'TryAgain')
+THROTTLE_TIME = 'throttle_time'
+RETRIES = 'retries'
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough estimate of the number of tokens in the text (~4 characters per token).
+    """
+    return len(text or "") // 4 + 1
+
+
+def _get_status_code(error: Exception) -> Optional[int]:
+    for attr in ('status_code', 'http_status', 'status'):
+        value = getattr(error, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(error, 'response', None)
+    value = getattr(response, 'status_code', None)
+    return value if isinstance(value, int) else None
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    if _get_status_code(error) in RETRYABLE_STATUS_CODES:
+        return True
+    return any(name in type(error).__name__ for name in RETRYABLE_ERROR_NAMES)
+
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """
+    Seconds to wait as asked by the provider via Retry-After header, if any.
+    """
+    headers = getattr(error, 'headers', None)
+    if headers is None:
+        headers = getattr(getattr(error, 'response', None), 'headers', None)
+    if not headers:
+        return None
+    try:
+        value = headers.get('retry-after') or headers.get('Retry-After')
+    except AttributeError:
+        return None
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        # HTTP date format
+        retry_at = email.utils.parsedate_to_datetime(value)
+        return max(0.0, retry_at.timestamp() - time.time()) if retry_at else None
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at `per_minute` tokens per minute, holding up to `burst_seconds` worth of tokens.
+    Acquiring reserves the tokens right away and returns how long the caller has to wait for them,
+    so callers are served in order and a request bigger than the bucket still goes through eventually.
+    """
+
+    def __init__(self, per_minute: float, burst_seconds: float = 1.0):
+        self.max_rate = per_minute / 60.0
+        self.rate = self.max_rate
+        self.burst_seconds = burst_seconds
+        self.tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def capacity(self) -> float:
+        return max(1.0, self.max_rate * self.burst_seconds)
+
+    def reserve(self, amount: float) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+            self.tokens -= amount
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def scale_rate(self, factor: float, min_fraction: float = 0.1):
+        with self._lock:
+            self.rate = min(self.max_rate, max(self.max_rate * min_fraction, self.rate * factor))
+
+
+class RateLimiter:
+    """
+    Limits calls to an LLM provider by requests and tokens per minute, and retries throttled or transient failures
+    with jittered exponential backoff, honoring Retry-After when the provider sends it.
+
+    Rate is adaptive: it is halved whenever the provider throttles us and recovers gradually with successful calls.
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None,
+                 tokens_per_request: int = 1000, max_retries: int = 3, base_delay: float = 1.0,
+                 max_delay: float = 60.0):
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute, burst_seconds=60.0) if tokens_per_minute else None
+        self.tokens_per_request = tokens_per_request
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def _buckets(self):
+        return [bucket for bucket in (self.request_bucket, self.token_bucket) if bucket is not None]
+
+    def _acquire(self, tokens: int) -> float:
+        wait_time = 0.0
+        if self.request_bucket is not None:
+            wait_time = max(wait_time, self.request_bucket.reserve(1))
+        if self.token_bucket is not None:
+            wait_time = max(wait_time, self.token_bucket.reserve(tokens))
+        if wait_time > 0:
+            time.sleep(wait_time)
+        return wait_time
+
+    def call(self, fn: Callable, tokens: Optional[int] = None, stats: Optional[dict] = None):
+        """
+        Calls fn within the rate limits, retrying it on retryable errors.
+        Args:
+            fn: function making the provider call
+            tokens: estimated tokens used by the call. Defaults to tokens_per_request
+            stats: populated with time spent throttled and the number of retries
+        """
+        if stats is None:
+            stats = {}
+        stats.setdefault(THROTTLE_TIME, 0.0)
+        stats.setdefault(RETRIES, 0)
+        tokens = self.tokens_per_request if tokens is None else tokens
+
+        attempt = 0
+        while True:
+            stats[THROTTLE_TIME] += self._acquire(tokens)
+            try:
+                result = fn()
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                for bucket in self._buckets():
+                    bucket.scale_rate(0.5)
+                delay = get_retry_after(e)
+                if delay is None:
+                    # Full jitter
+                    delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+                delay = min(delay, self.max_delay)
+                logging.info(f"Retrying provider call in {delay:.2f}s after {type(e).__name__}: {str(e)}")
+                time.sleep(delay)
+                stats[THROTTLE_TIME] += delay
+                stats[RETRIES] += 1
+                attempt += 1
+                continue
+
+            for bucket in self._buckets():
+                bucket.scale_rate(1.1)
+            return result
+
+
+def create_rate_limiter(rate_limit_config: Optional[dict]) -> RateLimiter:
+    """
+    Creates the rate limiter from the 'rate_limit' block of the benchmark config.
+    Without limits configured, it only retries throttled and transient failures.
+    """
+    rate_limit_config = rate_limit_config or {}
+    return RateLimiter(requests_per_minute=rate_limit_config.get('requests_per_minute'),
+                       tokens_per_minute=rate_limit_config.get('tokens_per_minute'),
+                       tokens_per_request=rate_limit_config.get('tokens_per_request', 1000),
+                       max_retries=rate_limit_config.get('max_retries', 3),
+                       base_delay=rate_limit_config.get('base_delay', 1.0),
+                       max_delay=rate_limit_config.get('max_delay', 60.0))
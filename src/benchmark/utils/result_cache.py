@@ -0,0 +1,120 @@
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from .sql_canonical import tokenize_sql
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "..", "cache")
+DEFAULT_CACHE_FILE = "result_cache.sqlite"
+DEFAULT_MAX_SIZE_MB = 512
+
+
+def normalize_sql(query: str) -> str:
+    """
+    Normalize the query text for cache lookups: collapse whitespace, drop comments and trailing semicolons.
+    Works on tokens, so string literals and quoted identifiers are kept as written.
+    """
+    tokens = [token.text for token in tokenize_sql(str(query))]
+    while tokens and tokens[-1] == ";":
+        tokens.pop()
+    return " ".join(tokens)
+
+
+class ResultCache:
+    """
+    On-disk cache of query results, persisted across runs in a sqlite file.
+
+    Entries are keyed by normalized SQL, connection identity, schema and data version token.
+    When the total payload size goes beyond max_size_bytes, least recently used entries are evicted.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_size_bytes: int = DEFAULT_MAX_SIZE_MB * 1024 * 1024):
+        if path is None:
+            path = os.path.join(DEFAULT_CACHE_DIR, DEFAULT_CACHE_FILE)
+        self.path = os.path.abspath(path)
+        self.max_size_bytes = max_size_bytes
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS results ("
+                           "cache_key TEXT PRIMARY KEY, "
+                           "payload BLOB NOT NULL, "
+                           "size INTEGER NOT NULL, "
+                           "last_access REAL NOT NULL)")
+        self._conn.commit()
+        logging.info(f"Result cache at {self.path}, max size: {max_size_bytes} bytes")
+
+    @staticmethod
+    def make_key(query: str, connection_id: str, data_version: str, schema: Optional[str] = None) -> str:
+        key_str = "\x1f".join([normalize_sql(query), connection_id or "", data_version or "", schema or ""])
+        return hashlib.sha256(key_str.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        """
+        Returns the cached result for the key, or None when it is not present.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT payload FROM results WHERE cache_key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE results SET last_access = ? WHERE cache_key = ?", (time.time(), key))
+            self._conn.commit()
+        try:
+            return pickle.loads(row[0])
+        except Exception as e:
+            logging.error(f"Discarding unreadable cache entry {key}: {str(e)}")
+            self.delete(key)
+            return None
+
+    def put(self, key: str, result):
+        payload = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(payload) > self.max_size_bytes:
+            logging.info(f"Result of {len(payload)} bytes is larger than the cache, not caching it")
+            return
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO results (cache_key, payload, size, last_access) "
+                               "VALUES (?, ?, ?, ?)", (key, sqlite3.Binary(payload), len(payload), time.time()))
+            self._evict()
+            self._conn.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM results WHERE cache_key = ?", (key,))
+            self._conn.commit()
+
+    def _evict(self):
+        # Caller holds the lock. Drop least recently used entries until we are within the budget.
+        total_size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total_size <= self.max_size_bytes:
+            return
+        for key, size in self._conn.execute("SELECT cache_key, size FROM results ORDER BY last_access").fetchall():
+            self._conn.execute("DELETE FROM results WHERE cache_key = ?", (key,))
+            total_size -= size
+            if total_size <= self.max_size_bytes:
+                break
+
+    def size(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def create_result_cache(cache_config: Optional[dict]) -> Optional[ResultCache]:
+    """
+    Creates the result cache from the 'result_cache' block of the benchmark config.
+    Returns None when caching is not enabled.
+    """
+    if not cache_config or not cache_config.get('enabled', False):
+        return None
+    max_size_mb = cache_config.get('max_size_mb', DEFAULT_MAX_SIZE_MB)
+    return ResultCache(path=cache_config.get('path'), max_size_bytes=int(max_size_mb * 1024 * 1024))
@@ -0,0 +1,128 @@
+from typing import Iterable, List, Optional
+
+MASK = (1 << 64) - 1
+
+
+class ResultFingerprint:
+    """
+    Fingerprint of a query result, built batch by batch while the rows are fetched.
+
+    rows_hash is order-independent: a commutative sum of the hashes of the rows, so that results with the same
+    rows in any order have the same one. ordered_hash depends on the order as well. Rows are hashed by their repr,
+    which tells apart values of different types (1, 1.0, True) and values sharing a hash (-1, -2).
+    column_hashes are order-independent sketches of the values of every column.
+
+    Hashes use Python's hash(), they are only comparable within a process.
+    """
+
+    def __init__(self, columns: Iterable[str]):
+        self.columns = tuple(columns)
+        self.row_count = 0
+        self.rows_hash = 0
+        self.rows_square_hash = 0
+        self.ordered_hash = 0
+        self.column_hashes = [0] * len(self.columns)
+        # False when a value can't be represented
+        self.valid = True
+        # NaN values have the same repr, but are not equal
+        self.has_nan = False
+
+    def add_rows(self, rows: Iterable[tuple]):
+        if not self.valid:
+            return
+        rows = list(rows)
+        try:
+            for row in rows:
+                row_repr = repr(tuple(row))
+                if 'nan' in row_repr:
+                    self.has_nan = self.has_nan or any(value != value for value in row)
+                row_hash = hash(row_repr)
+                self.rows_hash = (self.rows_hash + row_hash) & MASK
+                self.rows_square_hash = (self.rows_square_hash + row_hash * row_hash) & MASK
+                self.ordered_hash = hash((self.ordered_hash, row_hash))
+            for i, values in enumerate(zip(*rows)):
+                self.column_hashes[i] = (self.column_hashes[i] + sum(map(_hash_value, values))) & MASK
+        except Exception:
+            self.valid = False
+            return
+        self.row_count += len(rows)
+
+    def has_same_rows(self, other: 'ResultFingerprint') -> bool:
+        """
+        Same multiset of rows, irrespective of the order of rows.
+        """
+        return (self.valid and other.valid and self.row_count == other.row_count
+                and self.rows_hash == other.rows_hash and self.rows_square_hash == other.rows_square_hash)
+
+    def differing_columns(self, other: 'ResultFingerprint') -> List[str]:
+        """
+        Columns (by position) whose values differ from the other result's.
+        """
+        return [column for column, column_hash, other_hash in zip(self.columns, self.column_hashes,
+                                                                   other.column_hashes)
+                if column_hash != other_hash]
+
+
+def _hash_value(value) -> int:
+    try:
+        return hash(value)
+    except TypeError:
+        return hash(repr(value))
+
+
+class FingerprintedRows(list):
+    """
+    Rows of a query result (list of dicts) along with their fingerprint.
+    Pickled as a plain list, as fingerprints are only valid within a process.
+    """
+
+    def __init__(self, rows=(), fingerprint: Optional[ResultFingerprint] = None):
+        super().__init__(rows)
+        self.fingerprint = fingerprint
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+
+def get_fingerprint(rows) -> Optional[ResultFingerprint]:
+    """
+    Fingerprint of the rows, computed from the dicts when the rows don't carry one (e.g. cached results).
+    """
+    if isinstance(rows, ResultFingerprint):
+        return rows
+    fingerprint = getattr(rows, 'fingerprint', None)
+    if fingerprint is not None:
+        return fingerprint
+    if rows is None:
+        return None
+    fingerprint = ResultFingerprint(rows[0].keys() if rows else ())
+    fingerprint.add_rows(tuple(row.values()) for row in rows)
+    return fingerprint
+
+
+def is_same_result(expected, actual, exact: bool = False) -> bool:
+    """
+    Whether the fingerprints (of the rows, or the fingerprints themselves) prove the results have the same rows,
+    so that detailed comparison can be skipped.
+    Column names may differ (e.g. aliases), as long as the columns present in both are at the same position.
+    With exact, the order of rows and column names must be the same too.
+    """
+    expected_fingerprint = get_fingerprint(expected)
+    actual_fingerprint = get_fingerprint(actual)
+    if expected_fingerprint is None or actual_fingerprint is None:
+        return False
+    if expected_fingerprint.has_nan or not expected_fingerprint.has_same_rows(actual_fingerprint):
+        return False
+    if expected_fingerprint.row_count == 0:
+        return True
+    if exact:
+        return (expected_fingerprint.columns == actual_fingerprint.columns
+                and expected_fingerprint.ordered_hash == actual_fingerprint.ordered_hash)
+
+    expected_columns = [str(column).lower() for column in expected_fingerprint.columns]
+    actual_columns = [str(column).lower() for column in actual_fingerprint.columns]
+    if (len(expected_columns) != len(actual_columns) or len(set(expected_columns)) != len(expected_columns)
+            or len(set(actual_columns)) != len(actual_columns)):
+        return False
+    return all(expected_columns.index(column) == position
+               for position, column in enumerate(actual_columns) if column in expected_columns)
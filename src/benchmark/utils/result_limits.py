@@ -0,0 +1,26 @@
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+
+def make_golden_row_check(golden_future: Future, factor: float, min_rows: int) -> Callable[[int], Optional[str]]:
+    """
+    Abort check for fetching the generated query results. Once the golden query results are available, fetching
+    stops as soon as the generated query has `factor` times more rows than the golden query.
+
+    Rows are counted as fetched, duplicates included, on both sides: the comparison de-duplicates both results, so
+    a de-duplicated golden row count would abort generated queries returning the golden rows.
+    """
+    golden_row_counts = []
+
+    def check(rows_fetched: int) -> Optional[str]:
+        if rows_fetched <= min_rows:
+            return None
+        if not golden_row_counts:
+            if not golden_future.done() or golden_future.cancelled() or golden_future.exception() is not None:
+                return None
+            golden_row_counts.append(len(golden_future.result()[0]))
+        if rows_fetched > max(min_rows, golden_row_counts[0] * factor):
+            return f"{factor} times more rows than golden query ({golden_row_counts[0]} rows)"
+        return None
+
+    return check
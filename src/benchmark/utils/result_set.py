@@ -0,0 +1,123 @@
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+
+class RowView:
+    """
+    Read-only dict view of a row (tuple) of a ResultSet. Views of a result share the column index,
+    so a view costs a pointer to the row instead of a dict per row.
+
+    Like dict(zip(columns, row)), the last column wins when column names repeat.
+    """
+    __slots__ = ('_index', '_values')
+
+    def __init__(self, index: Dict[str, int], values: Sequence):
+        self._index = index
+        self._values = values
+
+    def __getitem__(self, key):
+        return self._values[self._index[key]]
+
+    def __contains__(self, key) -> bool:
+        return key in self._index
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def get(self, key, default=None):
+        position = self._index.get(key)
+        return default if position is None else self._values[position]
+
+    def keys(self):
+        return self._index.keys()
+
+    def values(self) -> list:
+        values = self._values
+        return [values[position] for position in self._index.values()]
+
+    def items(self) -> list:
+        values = self._values
+        return [(key, values[position]) for key, position in self._index.items()]
+
+    def __eq__(self, other):
+        if isinstance(other, RowView):
+            if self._index is other._index and len(self._index) == len(self._values):
+                return tuple(self._values) == tuple(other._values)
+            return dict(self.items()) == dict(other.items())
+        if isinstance(other, dict):
+            return dict(self.items()) == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+def column_index(columns: Iterable[str]) -> Dict[str, int]:
+    """
+    Position of every column name, the last one when names repeat.
+    """
+    return {column: position for position, column in enumerate(columns)}
+
+
+class ResultSet:
+    """
+    Query result as one shared column header and rows as tuples (or SQLAlchemy Row objects, kept as fetched).
+
+    Behaves as a read-only sequence of dict rows for code expecting List[Dict]: rows are returned as RowViews,
+    built on access.
+    """
+
+    def __init__(self, columns: Iterable[str], rows: Optional[list] = None, fingerprint=None):
+        self.columns = tuple(columns)
+        self.rows = rows if rows is not None else []
+        self.fingerprint = fingerprint
+        self._index = column_index(self.columns)
+
+    def to_rows(self, key: Optional[Callable] = None, value: Optional[Callable] = None) -> List[RowView]:
+        """
+        Rows as dict views, with key applied to the column names and value to the values.
+        """
+        index = column_index(key(column) for column in self.columns) if key else self._index
+        rows = self.rows
+        if value:
+            rows = [tuple(map(value, row)) for row in rows]
+        return [RowView(index, row) for row in rows]
+
+    def equals(self, other) -> bool:
+        """
+        Same columns and rows, in the same order.
+        """
+        return (isinstance(other, ResultSet) and self.columns == other.columns and len(self) == len(other)
+                and all(tuple(row) == tuple(other_row) for row, other_row in zip(self.rows, other.rows)))
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __iter__(self):
+        index = self._index
+        return (RowView(index, row) for row in self.rows)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [RowView(self._index, row) for row in self.rows[position]]
+        return RowView(self._index, self.rows[position])
+
+    def __eq__(self, other):
+        if isinstance(other, ResultSet):
+            return self.equals(other) or list(self) == list(other)
+        if isinstance(other, list):
+            return list(self) == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __reduce__(self):
+        # Rows as plain tuples. Fingerprints are only valid within a process.
+        return ResultSet, (self.columns, [tuple(row) for row in self.rows])
+
+    def __repr__(self):
+        return f"ResultSet(columns={list(self.columns)}, rows={len(self)})"
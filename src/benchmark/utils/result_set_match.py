@@ -98,42 +98,52 @@ actual = [
 ]
 """
 import decimal
+import heapq
 import logging
-from typing import Optional
+from collections import deque
+from typing import NamedTuple, Optional
+
+from .external_compare import SpilledResultSet, compare_spilled
+from .result_set import column_index
+
+# Match key shared by None and zeros, which match each other
+ZERO_KEY = ('z',)
+# Number of rows looked at, for picking the most selective column to index on
+INDEX_SAMPLE_SIZE = 1000
 
 
 def compare_results(expected, actual, comparison_rules, intent_based_match: bool = True,
                     source_db_type: Optional[str] = None,
-                    target_db_type: Optional[str] = None):
+                    target_db_type: Optional[str] = None,
+                    pool: Optional['ProcessPool'] = None):
+    """
+    comparison_rules can be the rules from the workload, or a ComparisonPlan compiled from them.
+    Large results are compared in partitions in the pool of processes (ProcessPool), when provided.
+    """
     if not intent_based_match:
         return compare_exact_match(expected, actual)
 
-    # Function to remove leading and trailing quotes
-    def remove_quotes(string):
-        if isinstance(string, str):
-            return string.strip('"')
-        return string
-
-    # Convert all keys in expected and actual to lowercase for case-insensitive comparison
-    expected = [{(k.lower() if k is not None else None): v for k, v in row.items()} for row in expected]
-    actual = [{(k.lower() if k is not None else None): v for k, v in row.items()} for row in actual]
-
-    # Remove quotes in string values in expected and actual
-    expected = [{k: remove_quotes(v) for k, v in row.items()} for row in expected]
-    actual = [{k: remove_quotes(v) for k, v in row.items()} for row in actual]
-
-    # for each rules of comparison_rules, convert the columns to lower case
-    if comparison_rules:
-        for rule in comparison_rules:
-            rule["columns"] = [column.lower() for column in rule["columns"]]
-
+    plan = compile_comparison_rules(comparison_rules, source_db_type, target_db_type)
+
+    # Results spilled to disk are compared in external memory, when possible
+    if isinstance(expected, SpilledResultSet) or isinstance(actual, SpilledResultSet):
+        verdict = compare_spilled(expected, actual, plan)
+        if verdict is not None:
+            return verdict
+        logging.warning("Spilled results are loaded in memory for comparison")
+    # Large results are compared in partitions, in parallel
+    elif pool is not None and len(expected) + len(actual) >= pool.partition_min_rows:
+        verdict = _compare_in_pool(expected, actual, plan, pool)
+        if verdict is not None:
+            return verdict
+
+    # Lower case the keys for case-insensitive comparison, remove quotes in string values and coerce
+    # driver specific types, in a single pass
+    expected = _normalize_rows(expected, plan.expected_coercions)
+    actual = _normalize_rows(actual, plan.actual_coercions)
 
     # Get unique elements. We don't bother about duplicates in final result
-    # First get all columns from comparison_rules
-    cols = []
-    for rule in comparison_rules:
-        cols.extend(rule['columns'])
-
+    cols = list(plan.dedup_columns)
     if len(expected) > 0 and len(actual) > 0:
         expected_cols = expected[0].keys()
         actual_cols = actual[0].keys()
@@ -148,78 +158,619 @@ def compare_results(expected, actual, comparison_rules, intent_based_match: bool
         else:
             logging.info("Expected and actual columns are different, skipping de-duplication in results")
 
-
     if len(expected) != len(actual):
         return False, (f"Number of rows are different, example: exp={expected[0] if len(expected) > 0 else 'null'}, "
                        f"act={actual[0] if len(actual) > 0 else 'null'}, #exp={len(expected)}, #act={len(actual)}")
 
-    def is_match(expected_val, actual_val):
-        '''
-        This function compares expected_val and actual_val with relevant datatype conversion
-        '''
-        if ((expected_val is None or expected_val == 0) and
-                (actual_val is None or actual_val == 0)):
-            return True
-        elif (isinstance(expected_val, (int, float, decimal.Decimal))
-              and isinstance(actual_val, (int, float, decimal.Decimal))):
-            return actual_val is not None and (str(round(expected_val, 1)) == str(round(actual_val, 1)))
-        elif isinstance(expected_val, str) and isinstance(actual_val, str):
-            return str(actual_val) == expected_val
-        elif isinstance(expected_val, str) and isinstance(actual_val, (int, float)):
-            return expected_val == str(actual_val)
-        elif isinstance(expected_val, (int, float)) and isinstance(actual_val, str):
-            return str(expected_val) == actual_val
-        elif isinstance(expected_val, (int, float)) and isinstance(actual_val, (int, float)):
-            return (actual_val is not None) and (
-                    round(expected_val, 0) == round(actual_val, 0))
+    # Numbers and strings are compared with numpy as integer keys, when is_match is an equivalence on them
+    verdict = _compare_by_keys(expected, actual, plan)
+    if verdict is not None:
+        return verdict
+
+    # Every expected row is matched with the first unmatched actual row satisfying all the rules.
+    # Candidates are looked up in a hash index of the actual rows when possible, instead of scanning all of them.
+    row_index = _RowIndex.build(expected, actual, plan.rules)
+    # Actual columns likely holding the values of expected columns missing by name, checked first
+    column_map = infer_column_mapping(expected, actual)
+    if plan.consumes_columns:
+        return _compare_by_assignment(expected, actual, plan, row_index, column_map)
+
+    equal_rows = _EqualRows(actual)
+    matched = [False] * len(actual)
+    for expected_row in expected:
+        candidates = row_index.candidates(expected_row, matched) if row_index else range(len(actual))
+        for i in candidates:
+            if matched[i]:
+                continue
+            if all(_match_rule(rule, expected_row, actual[i], _NO_COLUMNS, column_map) for rule in plan.rules):
+                matched[equal_rows.first_unmatched(i, matched)] = True
+                break
         else:
-            return str(expected_val) == str(actual_val)
-
-    def match_rule(rule, expected_row, actual_row):
-        if rule["match"] == "exact":
-            if '*' in rule["columns"]:
-                columns_to_compare = expected_row.keys()
-            else:
-                columns_to_compare = rule["columns"]
-            for column in columns_to_compare:
-                if column in actual_row:
-                    if not is_match(expected_row[column], actual_row[column]):
-                        return False
-                else:
-                    column_matched = any(
-                        is_match(expected_row[column], actual_val) for actual_val in actual_row.values())
-                    if not column_matched:
-                        return False
-            return True
+            # Report the last actual row left, like a full scan would
+            actual_row = next(actual[i] for i in reversed(range(len(actual))) if not matched[i])
+            return False, f"Comparison failed for row: exp={expected_row}, act={actual_row}"
+    return True, ""
 
-        elif rule["match"] == "oneof":
-            for column in rule["columns"]:
-                for key in actual_row.keys():
-                    expected_value = expected_row[column]
-                    actual_value = actual_row[key]
-                    if is_match(expected_value, actual_value):
-                        del actual_row[key]
-                        return True
-            return False
 
+def _compare_by_keys(expected, actual, plan):
+    """
+    Compares the rows with vectorized kernels, for exact rules on columns present by name in all the rows.
+    Gives the outcome (and error) of the row by row comparison, None when the kernels don't apply.
+    """
+    if not expected or plan.consumes_columns or any(rule.match != "exact" for rule in plan.rules):
+        return None
+    # Optional fast path, rows are compared one by one without numpy
+    try:
+        from .vectorized_match import first_unmatched, is_same_multiset, row_keys
+    except ImportError:
+        return None
+    columns = []
+    if any(rule.all_columns for rule in plan.rules):
+        expected_columns = expected[0].keys()
+        if any(row.keys() != expected_columns for row in expected):
+            return None
+        columns.extend(expected_columns)
+    columns.extend(column for rule in plan.rules if not rule.all_columns for column in rule.columns)
+    keys = row_keys(expected, actual, list(dict.fromkeys(columns)))
+    if keys is None:
+        return None
+
+    expected_keys, actual_keys = keys
+    if is_same_multiset(expected_keys, actual_keys):
+        return True, ""
+    # Row reported by the row by row comparison
+    expected_index, actual_index = first_unmatched(expected_keys, actual_keys)
+    return False, f"Comparison failed for row: exp={expected[expected_index]}, act={actual[actual_index]}"
+
+
+def _compare_in_pool(expected, actual, plan, pool: 'ProcessPool'):
+    """
+    Compares the rows in partitions in the pool of processes, with the outcome (and error) of _compare_by_keys.
+    None when it doesn't apply: rules other than exact, results of different lengths or de-duplicated, columns not
+    present by name or which can't be compared with keys.
+    """
+    if len(expected) != len(actual) or plan.consumes_columns or any(rule.match != "exact" for rule in plan.rules):
+        return None
+    try:
+        from .partitioned_compare import result_columns
+    except ImportError:
+        return None
+    expected_columns = result_columns(expected)
+    actual_columns = result_columns(actual)
+    if expected_columns is None or actual_columns is None:
+        return None
+    expected_index = column_index(map(_lower_key, expected_columns))
+    actual_index = column_index(map(_lower_key, actual_columns))
+    # Same condition for de-duplication as compare_results
+    cols = list(plan.dedup_columns)
+    if expected_index.keys() == actual_index.keys() and (cols != ['*'] or len(expected_index) == 1):
+        return None
+
+    columns = []
+    if any(rule.all_columns for rule in plan.rules):
+        columns.extend(expected_index)
+    columns.extend(column for rule in plan.rules if not rule.all_columns for column in rule.columns)
+    columns = list(dict.fromkeys(columns))
+    if not columns or any(column not in expected_index or column not in actual_index for column in columns):
+        return None
+    verdict = pool.compare_partitioned(expected, actual, [expected_index[column] for column in columns],
+                                       [actual_index[column] for column in columns])
+    if verdict is None:
+        return None
+    matched, expected_position, actual_position = verdict
+    if matched:
+        return True, ""
+    expected_row = _normalize_rows([expected[expected_position]], plan.expected_coercions)[0]
+    actual_row = _normalize_rows([actual[actual_position]], plan.actual_coercions)[0]
+    return False, f"Comparison failed for row: exp={expected_row}, act={actual_row}"
+
+
+def _compare_by_assignment(expected, actual, plan, row_index, column_map):
+    """
+    Compares rows with oneof rules as an assignment problem: expected and actual rows are matched one to one
+    with a maximum bipartite matching (Hopcroft-Karp) over the candidate rows, instead of greedily taking the
+    first matching row. Results match when every expected row gets an actual row.
+    """
+    no_matches = [False] * len(actual)
+    adjacency = []
     for expected_row in expected:
-        matched = False
-        for actual_row in actual:
-            actual_row_copy = actual_row.copy()
-            rule_matched = True
-            for rule in comparison_rules:
-                if not match_rule(rule, expected_row, actual_row_copy):
-                    rule_matched = False
-                    break
-            if rule_matched:
-                matched = True
-                actual.remove(actual_row)
-                break
-        if not matched:
+        candidates = row_index.candidates(expected_row, no_matches) if row_index else range(len(actual))
+        adjacency.append([i for i in candidates if _is_row_match(plan.rules, expected_row, actual[i], column_map)])
+
+    match_expected, match_actual = max_bipartite_matching(adjacency, len(actual))
+    for expected_index, actual_index in enumerate(match_expected):
+        if actual_index == -1:
+            expected_row = expected[expected_index]
+            actual_row = next(actual[i] for i in reversed(range(len(actual))) if match_actual[i] == -1)
             return False, f"Comparison failed for row: exp={expected_row}, act={actual_row}"
     return True, ""
 
 
+def _is_row_match(rules: tuple, expected_row: dict, actual_row: dict, column_map: dict) -> bool:
+    """
+    Whether the rows match as per all the rules. Every oneof rule takes a different column of the actual row.
+    Columns taken are not available to the following rules, so oneof columns are chosen together with the
+    exact rules: choices are backtracked over, trying first the columns no later rule references.
+    """
+    options = _oneof_options(rules, expected_row, actual_row, column_map)
+    if options is None:
+        return False
+    return _match_from(0, rules, expected_row, actual_row, options, set(), column_map)
+
+
+def _match_from(i: int, rules: tuple, expected_row: dict, actual_row: dict, options: dict, consumed: set,
+                column_map: dict) -> bool:
+    # Rules from i on match, with the columns consumed by the oneof rules before i
+    if i == len(rules):
+        return True
+    rule = rules[i]
+    if rule.match != "oneof":
+        return (_match_rule(rule, expected_row, actual_row, consumed, column_map)
+                and _match_from(i + 1, rules, expected_row, actual_row, options, consumed, column_map))
+    for key in options[i]:
+        if key in consumed:
+            continue
+        consumed.add(key)
+        if _match_from(i + 1, rules, expected_row, actual_row, options, consumed, column_map):
+            return True
+        consumed.discard(key)
+    return False
+
+
+def _oneof_options(rules: tuple, expected_row: dict, actual_row: dict, column_map: dict) -> Optional[dict]:
+    """
+    Actual columns every oneof rule can take, by rule index: columns no later rule references first, then in the
+    order the rule would take them. None when some rule can't take any column.
+    """
+    options = {}
+    for i, rule in enumerate(rules):
+        if rule.match != "oneof":
+            continue
+        keys = list(dict.fromkeys(key for column in rule.columns if column in expected_row
+                                  for key, actual_value in actual_row.items()
+                                  if is_match(expected_row[column], actual_value)))
+        if not keys:
+            return None
+        referenced = _referenced_columns(rules[i + 1:], expected_row, column_map)
+        options[i] = sorted(keys, key=lambda key: key in referenced)
+    return options
+
+
+def _referenced_columns(rules: tuple, expected_row: dict, column_map: dict) -> set:
+    # Actual columns the rules look up by name or through the column mapping
+    referenced = set()
+    for rule in rules:
+        columns = expected_row.keys() if rule.all_columns else rule.columns
+        referenced.update(columns)
+        referenced.update(column_map[column] for column in columns if column in column_map)
+    return referenced
+
+
+def max_bipartite_matching(adjacency: list, right_count: int) -> (list, list):
+    """
+    Hopcroft-Karp maximum matching. adjacency[u] lists the right vertices of left vertex u.
+    Returns the matched right vertex of every left vertex and the matched left vertex of every right vertex
+    (-1 when unmatched).
+    """
+    match_left = [-1] * len(adjacency)
+    match_right = [-1] * right_count
+    # Greedy start, usually a perfect matching already
+    for u, neighbours in enumerate(adjacency):
+        for v in neighbours:
+            if match_right[v] == -1:
+                match_left[u] = v
+                match_right[v] = u
+                break
+
+    while True:
+        # Layer the graph from the free left vertices
+        dist = [-1] * len(adjacency)
+        queue = deque(u for u in range(len(adjacency)) if match_left[u] == -1)
+        for u in queue:
+            dist[u] = 0
+        found = False
+        while queue:
+            u = queue.popleft()
+            for v in adjacency[u]:
+                w = match_right[v]
+                if w == -1:
+                    found = True
+                elif dist[w] == -1:
+                    dist[w] = dist[u] + 1
+                    queue.append(w)
+        if not found:
+            return match_left, match_right
+
+        for root in range(len(adjacency)):
+            if match_left[root] == -1:
+                _augment(root, adjacency, dist, match_left, match_right)
+
+
+def _augment(root, adjacency, dist, match_left, match_right) -> bool:
+    # Iterative DFS along the layers, for an augmenting path from root
+    stack = [(root, iter(adjacency[root]))]
+    chosen = {}
+    while stack:
+        u, neighbours = stack[-1]
+        advanced = False
+        for v in neighbours:
+            w = match_right[v]
+            if w == -1:
+                chosen[u] = v
+                for node, _ in stack:
+                    match_left[node] = chosen[node]
+                    match_right[chosen[node]] = node
+                return True
+            if dist[w] == dist[u] + 1:
+                chosen[u] = v
+                stack.append((w, iter(adjacency[w])))
+                advanced = True
+                break
+        if not advanced:
+            # Dead end, not visited again in this phase
+            dist[u] = -1
+            stack.pop()
+    return False
+
+
+class CompiledRule(NamedTuple):
+    match: Optional[str]
+    # Lower cased
+    columns: tuple
+    # Rule applies to all the columns of the expected row ('*')
+    all_columns: bool
+
+
+class ComparisonPlan(NamedTuple):
+    """
+    comparison_rules of a query compiled for compare_results: lower cased column sets and match strategy of
+    every rule, columns used for de-duplication and coercions of driver specific value types of the source
+    (expected) and target (actual) databases. Immutable, so it can be shared by threads and queries.
+    """
+    rules: tuple
+    dedup_columns: tuple
+    consumes_columns: bool
+    expected_coercions: dict
+    actual_coercions: dict
+
+
+# Driver specific value types converted before comparison, per database type (sqlalchemy dialect),
+# so that the same value compares equal across databases. E.g str() of a memoryview is not its content.
+VALUE_COERCIONS = {
+    'postgresql': {memoryview: bytes},
+    'redshift': {memoryview: bytes},
+    'snowflake': {bytearray: bytes},
+    'mysql': {bytearray: bytes},
+    'mariadb': {bytearray: bytes},
+}
+_NO_COLUMNS = frozenset()
+
+
+def is_identity_match(plan: ComparisonPlan) -> bool:
+    """
+    Whether results with the same rows always match as per the plan, e.g. to skip comparison of such results.
+    Not the case with unknown match types, or when a oneof rule can take the column an exact rule needs.
+    """
+    seen_oneof = False
+    for rule in plan.rules:
+        if rule.match == "oneof":
+            seen_oneof = True
+        elif rule.match != "exact" or seen_oneof:
+            return False
+    return True
+
+
+def compile_comparison_rules(comparison_rules, source_db_type: Optional[str] = None,
+                             target_db_type: Optional[str] = None) -> ComparisonPlan:
+    """
+    Compiles the comparison rules of a query into a ComparisonPlan. Rules are not modified.
+    """
+    if isinstance(comparison_rules, ComparisonPlan):
+        return comparison_rules
+    if comparison_rules is None:
+        raise ValueError("comparison_rules are missing")
+
+    rules = []
+    for rule in comparison_rules:
+        columns = tuple(column.lower() for column in rule['columns'])
+        rules.append(CompiledRule(match=rule.get('match'), columns=columns, all_columns='*' in columns))
+    return ComparisonPlan(rules=tuple(rules),
+                          dedup_columns=tuple(column for rule in rules for column in rule.columns),
+                          consumes_columns=any(rule.match == 'oneof' for rule in rules),
+                          expected_coercions=VALUE_COERCIONS.get(source_db_type, {}),
+                          actual_coercions=VALUE_COERCIONS.get(target_db_type, {}))
+
+
+def _coerce_value(value, coercions: dict):
+    # Remove leading and trailing quotes
+    if isinstance(value, str):
+        return value.strip('"')
+    if coercions:
+        convert = coercions.get(type(value))
+        if convert is not None:
+            return convert(value)
+    return value
+
+
+def _lower_key(key):
+    return key.lower() if key is not None else None
+
+
+def _normalize_rows(rows, coercions: dict) -> list:
+    # Results with a shared header (ResultSet, ArrowResultSet) are normalized to dict views of tuples
+    to_rows = getattr(rows, 'to_rows', None)
+    if to_rows is not None:
+        return to_rows(key=_lower_key, value=lambda value: _coerce_value(value, coercions))
+    return [{(k.lower() if k is not None else None): _coerce_value(v, coercions) for k, v in row.items()}
+            for row in rows]
+
+
+def _match_rule(rule: CompiledRule, expected_row: dict, actual_row: dict, consumed, column_map: dict) -> bool:
+    if rule.match == "exact":
+        columns_to_compare = expected_row.keys() if rule.all_columns else rule.columns
+        for column in columns_to_compare:
+            if column in actual_row and column not in consumed:
+                if not is_match(expected_row[column], actual_row[column]):
+                    return False
+            else:
+                mapped_column = column_map.get(column)
+                if (mapped_column is not None and mapped_column in actual_row and mapped_column not in consumed
+                        and column in expected_row and is_match(expected_row[column], actual_row[mapped_column])):
+                    continue
+                # Mapping is unknown, or does not hold for this row
+                column_matched = any(is_match(expected_row[column], actual_val)
+                                     for key, actual_val in actual_row.items() if key not in consumed)
+                if not column_matched:
+                    return False
+        return True
+
+    elif rule.match == "oneof":
+        for column in rule.columns:
+            for key, actual_value in actual_row.items():
+                if key in consumed:
+                    continue
+                if is_match(expected_row[column], actual_value):
+                    consumed.add(key)
+                    return True
+        return False
+    return False
+
+
+class ColumnSignature(NamedTuple):
+    # number, string, null or other
+    kind: str
+    distinct: int
+    minimum: object
+    maximum: object
+
+
+def _value_kind(value) -> str:
+    if value is None:
+        return 'null'
+    if isinstance(value, (int, float, decimal.Decimal)):
+        return 'number'
+    if isinstance(value, str):
+        return 'string'
+    return 'other'
+
+
+def column_signature(rows, column) -> Optional[ColumnSignature]:
+    """
+    Signature of the values of a column: kind of values, number of distinct values and min/max.
+    None when it can't be computed, e.g. values of different kinds.
+    """
+    kinds = set()
+    values = set()
+    for row in rows:
+        value = row.get(column)
+        kinds.add(_value_kind(value))
+        if value is not None:
+            values.add(value)
+    kinds.discard('null')
+    if len(kinds) > 1:
+        return None
+    kind = kinds.pop() if kinds else 'null'
+    if kind in ('number', 'string') and values:
+        try:
+            return ColumnSignature(kind, len(values), min(values), max(values))
+        except TypeError:
+            return None
+    return ColumnSignature(kind, len(values), None, None)
+
+
+def _is_signature_match(expected: ColumnSignature, actual: ColumnSignature) -> bool:
+    return (expected.kind == actual.kind and expected.distinct == actual.distinct
+            and is_match(expected.minimum, actual.minimum) and is_match(expected.maximum, actual.maximum))
+
+
+def infer_column_mapping(expected, actual) -> dict:
+    """
+    Maps expected columns missing by name in the actual rows to the actual column with the same signature.
+    Columns with no or several candidates (ambiguous) are left out.
+    """
+    if not expected or not actual:
+        return {}
+    expected_columns = [column for column in expected[0].keys() if column not in actual[0]]
+    actual_columns = [column for column in actual[0].keys() if column not in expected[0]]
+    if not expected_columns or not actual_columns:
+        return {}
+
+    actual_signatures = {column: column_signature(actual, column) for column in actual_columns}
+    candidates = {}
+    for column in expected_columns:
+        signature = column_signature(expected, column)
+        if signature is None:
+            continue
+        matches = [actual_column for actual_column, actual_signature in actual_signatures.items()
+                   if actual_signature is not None and _is_signature_match(signature, actual_signature)]
+        if len(matches) == 1:
+            candidates[column] = matches[0]
+
+    # An actual column can hold only one of the expected columns
+    taken = [actual_column for actual_column in candidates.values()]
+    return {column: actual_column for column, actual_column in candidates.items() if taken.count(actual_column) == 1}
+
+
+def is_match(expected_val, actual_val):
+    '''
+    This function compares expected_val and actual_val with relevant datatype conversion
+    '''
+    if ((expected_val is None or expected_val == 0) and
+            (actual_val is None or actual_val == 0)):
+        return True
+    elif (isinstance(expected_val, (int, float, decimal.Decimal))
+          and isinstance(actual_val, (int, float, decimal.Decimal))):
+        return actual_val is not None and (str(round(expected_val, 1)) == str(round(actual_val, 1)))
+    elif isinstance(expected_val, str) and isinstance(actual_val, str):
+        return str(actual_val) == expected_val
+    elif isinstance(expected_val, str) and isinstance(actual_val, (int, float)):
+        return expected_val == str(actual_val)
+    elif isinstance(expected_val, (int, float)) and isinstance(actual_val, str):
+        return str(expected_val) == actual_val
+    elif isinstance(expected_val, (int, float)) and isinstance(actual_val, (int, float)):
+        return (actual_val is not None) and (
+                round(expected_val, 0) == round(actual_val, 0))
+    else:
+        return str(expected_val) == str(actual_val)
+
+
+def match_keys(value) -> list:
+    """
+    Hash keys of the value, such that values matching as per is_match share at least one key:
+    the string form (string comparisons), the rounded number (numeric comparisons) and ZERO_KEY (None and 0).
+    """
+    keys = [('s', str(value))]
+    if value is None or value == 0:
+        keys.append(ZERO_KEY)
+    if isinstance(value, (int, float, decimal.Decimal)):
+        keys.append(('n', str(round(value, 1))))
+    return keys
+
+
+class _EqualRows:
+    """
+    Groups the rows comparing equal (==), e.g. {'a': 1} and {'a': Decimal('1.0')}.
+    A matched row is consumed as list.remove would do: the first unmatched row equal to it is taken out.
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.groups = {}
+        self.row_keys = []
+        for i, row in enumerate(rows):
+            try:
+                key = frozenset(row.items())
+                self.groups.setdefault(key, deque()).append(i)
+            except TypeError:
+                # Unhashable values, looked up by scanning
+                key = None
+            self.row_keys.append(key)
+
+    def first_unmatched(self, i, matched) -> int:
+        key = self.row_keys[i]
+        if key is None:
+            return next(j for j in range(i + 1) if not matched[j] and self.rows[j] == self.rows[i])
+        group = self.groups[key]
+        while matched[group[0]]:
+            group.popleft()
+        return group[0]
+
+
+class _RowIndex:
+    """
+    Hash index of the actual rows, on the values of one column of the first comparison rule.
+    It gives a superset of the rows which can match an expected row, in row order.
+
+    Rows without the column (i.e. column mapping is ambiguous) are indexed on all of their values,
+    as the rule can match any of them.
+    """
+
+    def __init__(self, columns: list, by_name: bool):
+        self.columns = columns
+        self.by_name = by_name
+        self.buckets = {}
+        # Matched rows at the head of a bucket are skipped from here on
+        self.starts = {}
+
+    @classmethod
+    def build(cls, expected, actual, comparison_rules: tuple) -> Optional['_RowIndex']:
+        """
+        Returns None when the rules can't be used for lookups, e.g. unsupported match type.
+        """
+        if not expected or not actual or not comparison_rules:
+            return None
+        rule = comparison_rules[0]
+        try:
+            if rule.match == 'exact':
+                columns = list(expected[0].keys()) if rule.all_columns else rule.columns
+                columns = [column for column in columns if column in expected[0]]
+                if not columns:
+                    return None
+                row_index = cls([cls._most_selective_column(actual, columns)], by_name=True)
+            elif rule.match == 'oneof':
+                row_index = cls(list(rule.columns), by_name=False)
+            else:
+                return None
+
+            for i, row in enumerate(actual):
+                for key in row_index._row_keys(row):
+                    row_index.buckets.setdefault(key, []).append(i)
+            return row_index
+        except Exception as e:
+            logging.debug(f"Not indexing the results, falling back to full scan: {e}")
+            return None
+
+    @staticmethod
+    def _most_selective_column(actual, columns) -> str:
+        sample = actual[:INDEX_SAMPLE_SIZE]
+        return max(columns, key=lambda column: len({str(row.get(column)) for row in sample}))
+
+    def _row_keys(self, row) -> set:
+        column = self.columns[0]
+        if self.by_name and column in row:
+            return set(match_keys(row[column]))
+        return {key for value in row.values() for key in match_keys(value)}
+
+    def candidates(self, expected_row, matched):
+        """
+        Indexes of the actual rows that can match the expected row, in ascending order. May include matched rows.
+        """
+        if any(column not in expected_row for column in self.columns):
+            # Rule fails on the expected row itself, let the full scan deal with it
+            return range(len(matched))
+        try:
+            keys = {key for column in self.columns for key in match_keys(expected_row[column])}
+        except Exception:
+            return range(len(matched))
+
+        bucket_iters = []
+        for key in keys:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                continue
+            start = self.starts.get(key, 0)
+            while start < len(bucket) and matched[bucket[start]]:
+                start += 1
+            self.starts[key] = start
+            bucket_iters.append(_tail(bucket, start))
+        if len(bucket_iters) == 1:
+            return bucket_iters[0]
+        return _unique(heapq.merge(*bucket_iters))
+
+
+def _tail(bucket, start):
+    for j in range(start, len(bucket)):
+        yield bucket[j]
+
+
+def _unique(sorted_indexes):
+    previous = None
+    for i in sorted_indexes:
+        if i != previous:
+            yield i
+            previous = i
+
+
 def convert_dict_to_tuple(d):
     """
     Recursively convert a dictionary to a tuple.
@@ -270,6 +821,28 @@ def remove_duplicates(input_list, columns: list = None):
     return result
 
 
+def count_deduplicated_rows(rows, comparison_rules) -> int:
+    """
+    Number of rows left after the de-duplication done by compare_results on the rows.
+    """
+    if not rows:
+        return 0
+    if isinstance(rows, SpilledResultSet):
+        # Not loaded in memory for an estimate, duplicates are counted
+        return len(rows)
+    cols = list(compile_comparison_rules(comparison_rules or []).dedup_columns)
+    row_cols = [k.lower() if k is not None else None for k in rows[0].keys()]
+    if cols == ['*'] and len(row_cols) != 1:
+        return len(rows)
+    cols_to_use = cols if cols != ['*'] else row_cols
+    to_rows = getattr(rows, 'to_rows', None)
+    if to_rows is not None:
+        rows = to_rows(key=_lower_key)
+    else:
+        rows = [{_lower_key(k): v for k, v in row.items()} for row in rows]
+    return len(remove_duplicates(rows, cols_to_use))
+
+
 def compare_exact_match(expected, actual):
     """
     Compare the expected and actual results exactly.
@@ -277,6 +850,11 @@ def compare_exact_match(expected, actual):
     if len(expected) != len(actual):
         return False, f"Number of rows are different, #exp={len(expected)}, #act={len(actual)}"
 
+    # Results of the same type (e.g. ResultSet) compared as a whole, without building the rows
+    equals = getattr(expected, 'equals', None)
+    if equals is not None and equals(actual):
+        return True, ""
+
     for expected_row, actual_row in zip(expected, actual):
         if expected_row != actual_row:
             return False, f"Comparison failed for row: exp={expected_row}, act={actual_row}"
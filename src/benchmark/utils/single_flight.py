@@ -0,0 +1,70 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Makes sure that only one execution is in flight for a given key.
+    Callers arriving while the execution is in progress wait for it and share its result (or exception).
+
+    Optionally, the last `retain_results` successful results are kept, so that callers arriving after
+    the execution has finished can reuse them as well. Failures are never retained.
+    Shared results are returned as is, so callers must not mutate them.
+    """
+
+    def __init__(self, retain_results: int = 0):
+        self.retain_results = retain_results
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._completed = OrderedDict()
+        self.executions = 0
+        self.shared = 0
+
+    def do(self, key: Hashable, fn: Callable):
+        """
+        Run fn once for the key.
+        Returns: Tuple of fn's result and whether the result was shared with another caller
+        """
+        with self._lock:
+            if key in self._completed:
+                self._completed.move_to_end(key)
+                self.shared += 1
+                return self._completed[key], True
+
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self.executions += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                if call.error is None and self.retain_results > 0:
+                    self._completed[key] = call.result
+                    while len(self._completed) > self.retain_results:
+                        self._completed.popitem(last=False)
+            call.done.set()
+        return call.result, False
@@ -0,0 +1,175 @@
+"""
+Tables referenced by SQL queries, found from the tokens of the query (see sql_canonical) without parsing it, for
+the table check and for rejecting queries on tables which don't exist before running them.
+"""
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from .sql_canonical import Token, identifier_name, tokenize_sql
+
+# Analyses memoized, by query and schema
+CACHE_SIZE = 4096
+
+# Keywords followed by a table reference (FROM is followed by a list of them)
+_TABLE_KEYWORDS = frozenset(['from', 'join', 'into', 'update'])
+# Words which can't be the alias of a table reference: they end it
+_RESERVED = frozenset([
+    'all', 'and', 'anti', 'as', 'asof', 'by', 'cross', 'except', 'fetch', 'for', 'from', 'full', 'group', 'having',
+    'inner', 'intersect', 'into', 'join', 'lateral', 'left', 'limit', 'minus', 'natural', 'offset', 'on', 'or',
+    'order', 'outer', 'pivot', 'qualify', 'right', 'sample', 'select', 'semi', 'set', 'start', 'tablesample',
+    'union', 'unpivot', 'using', 'values', 'where', 'window', 'with',
+])
+# Words ending a FROM clause
+_CLAUSES = frozenset(['where', 'group', 'having', 'order', 'limit', 'union', 'intersect', 'except', 'minus',
+                      'window', 'qualify', 'fetch', 'offset', 'select', 'set', 'returning'])
+# Tables of the dialect's system catalog, which are not listed with the tables of a schema
+SYSTEM_TABLES = {
+    'mysql': frozenset(['dual']),
+    'mariadb': frozenset(['dual']),
+    'oracle': frozenset(['dual']),
+}
+# Prefixes of the names of system catalog tables and views, e.g. sqlite_master or pg_tables (pg_catalog is on the
+# search path of every postgres session)
+SYSTEM_TABLE_PREFIXES = {
+    'sqlite': ('sqlite_',),
+    'postgresql': ('pg_',),
+    'redshift': ('pg_', 'stl_', 'stv_', 'svl_', 'svv_'),
+}
+# Words before a parenthesis which don't make it a function call
+_NOT_FUNCTIONS = _RESERVED | frozenset(['exists', 'in', 'not', 'any', 'some', 'recursive', 'materialized', 'then',
+                                        'else', 'when', 'case', 'distinct', 'is', 'between', 'like', 'over'])
+
+
+class QueryAnalysis(NamedTuple):
+    # Tables referenced by the query (not its CTEs), without the qualification by the schema. Case-folded, unless
+    # they are quoted identifiers which are not simple identifiers.
+    tables: Tuple[str, ...]
+    # Names of the common table expressions of the query
+    ctes: Tuple[str, ...]
+    # Tables by their alias
+    aliases: Dict[str, str]
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def analyze_sql(query: str, schema: Optional[str] = None) -> QueryAnalysis:
+    """
+    Tables, common table expressions and table aliases of the query. References qualified by the schema the query
+    runs in (e.g. schema.table) are taken as unqualified, as in canonicalize_sql.
+    """
+    return _Analyzer(tokenize_sql(str(query)), schema).analyze()
+
+
+def unknown_tables(analysis: QueryAnalysis, known_tables: set, dialect: Optional[str] = None) -> List[str]:
+    """
+    Unqualified tables of the query which are not among the known (case-folded) tables. Qualified tables (in other
+    schemas or databases) and system catalog tables of the dialect (sqlalchemy dialect name) are not checked.
+    """
+    system_tables = SYSTEM_TABLES.get(dialect, frozenset())
+    system_prefixes = SYSTEM_TABLE_PREFIXES.get(dialect, ())
+    return [table for table in analysis.tables if '.' not in table and table.lower() not in known_tables
+            and table.lower() not in system_tables and not table.lower().startswith(system_prefixes)]
+
+
+class _Analyzer:
+
+    def __init__(self, tokens: List[Token], schema: Optional[str]):
+        self.tokens = tokens
+        self.words = [token.text.lower() if token.kind == 'word' else None for token in tokens]
+        # Names of the schema, e.g. [database, schema]
+        self.schema = [name.strip('"') for name in map(identifier_name, tokenize_sql(schema))
+                       if name is not None] if schema else None
+        self.tables = []
+        self.ctes = []
+        self.aliases = {}
+
+    def analyze(self) -> QueryAnalysis:
+        # Kind of every open parenthesis: function call or not
+        parentheses = []
+        # Depths of the open WITH and FROM clauses
+        with_depths = []
+        from_depths = []
+        expect_cte = False
+        i = 0
+        while i < len(self.tokens):
+            token = self.tokens[i]
+            word = self.words[i]
+            if token.text == '(':
+                previous = self.tokens[i - 1] if i > 0 else None
+                parentheses.append(previous is not None and previous.kind in ('word', 'quoted')
+                                   and self.words[i - 1] not in _NOT_FUNCTIONS)
+            elif token.text == ')':
+                if parentheses:
+                    parentheses.pop()
+                while from_depths and from_depths[-1] > len(parentheses):
+                    from_depths.pop()
+                # End of a CTE: another one follows, or the query using them
+                if with_depths and with_depths[-1] == len(parentheses):
+                    following = self._text(i + 1)
+                    if following == ',':
+                        expect_cte = True
+                        i += 1
+                    elif following != 'as':
+                        with_depths.pop()
+            elif token.text == ',' and from_depths and from_depths[-1] == len(parentheses):
+                # Table following joins, e.g. FROM a JOIN b ON a.x = b.x, c
+                i = self._table_references(i + 1, 'from')
+                continue
+            elif word in _CLAUSES and from_depths and from_depths[-1] == len(parentheses):
+                from_depths.pop()
+                continue
+            elif word == 'with' and self._text(i + 1) not in ('time', 'local'):
+                with_depths.append(len(parentheses))
+                expect_cte = True
+            elif expect_cte and word != 'recursive' and identifier_name(token) is not None:
+                self.ctes.append(identifier_name(token))
+                expect_cte = False
+            elif (word in _TABLE_KEYWORDS and not (parentheses and parentheses[-1])
+                  and not (word == 'from' and self.words[i - 1] == 'distinct')):
+                if word == 'from' and (not from_depths or from_depths[-1] != len(parentheses)):
+                    from_depths.append(len(parentheses))
+                i = self._table_references(i + 1, word)
+                continue
+            i += 1
+
+        ctes = set(self.ctes)
+        tables = [table for table in dict.fromkeys(self.tables) if table not in ctes]
+        return QueryAnalysis(tuple(tables), tuple(dict.fromkeys(self.ctes)), self.aliases)
+
+    def _text(self, i: int) -> Optional[str]:
+        return self.tokens[i].text.lower() if i < len(self.tokens) else None
+
+    def _table_references(self, i: int, keyword: str) -> int:
+        """
+        Reads the table references following the keyword at i (comma separated after FROM). Returns the position
+        following them.
+        """
+        while True:
+            if self.words[i:i + 1] == ['lateral'] or self.words[i:i + 1] == ['only']:
+                i += 1
+            parts = []
+            while i < len(self.tokens):
+                name = identifier_name(self.tokens[i])
+                if name is None or (not parts and self.words[i] in _RESERVED):
+                    break
+                parts.append(name.strip('"'))
+                if self._text(i + 1) != '.':
+                    i += 1
+                    break
+                i += 2
+            # Subqueries and table functions are not tables. INTO table is followed by its columns.
+            if not parts or (self._text(i) == '(' and keyword != 'into'):
+                return i
+            if self.schema and len(parts) > len(self.schema) and parts[:len(self.schema)] == self.schema:
+                parts = parts[len(self.schema):]
+            table = '.'.join(parts)
+            self.tables.append(table)
+
+            if self.words[i:i + 1] == ['as']:
+                i += 1
+            alias = identifier_name(self.tokens[i]) if i < len(self.tokens) else None
+            if alias is not None and self.words[i] not in _RESERVED:
+                self.aliases[alias.strip('"')] = table
+                i += 1
+            if keyword != 'from' or self._text(i) != ',':
+                return i
+            i += 1
@@ -0,0 +1,168 @@
+"""
+Canonical form of SQL queries, for finding generated queries equivalent to their golden query without running them.
+
+Queries are tokenized with a regular expression, which is orders of magnitude faster than parsing them (sqlfluff).
+The canonical form ignores whitespace, comments, keyword and identifier case, quoting of simple identifiers where the
+dialect resolves them as unquoted ones, qualification by the schema the queries run in, and trailing semicolons.
+String literals are kept as they are.
+"""
+import re
+from functools import lru_cache
+from typing import List, NamedTuple, Optional
+
+# Canonical forms memoized, by query and schema
+CACHE_SIZE = 4096
+
+_TOKEN_PATTERNS = [
+    ('whitespace', r'\s+'),
+    ('comment', r'--[^\n]*|/\*.*?(?:\*/|$)'),
+    ('string', r"[eEnNbBxX]?'(?:[^']|'')*'?|\$(?P<tag>\w*)\$.*?(?:\$(?P=tag)\$|$)"),
+    ('quoted', r'"(?:[^"]|"")*"?|`(?:[^`]|``)*`?'),
+    ('number', r'(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?'),
+    ('word', r'[^\W\d]\w*'),
+    ('operator', r'<>|!=|>=|<=|::|\|\||->>|->'),
+    ('punctuation', r'.'),
+]
+_TOKEN_REGEX = re.compile('|'.join(f'(?P<{kind}>{pattern})' for kind, pattern in _TOKEN_PATTERNS), re.DOTALL)
+_SIMPLE_IDENTIFIER = re.compile(r'[^\W\d]\w*')
+
+# Case of quoted identifiers, by dialect: 'ignore' when it doesn't matter, as for unquoted ones. 'lower' or 'upper'
+# when unquoted identifiers are folded to that case and quoted ones are taken as written, e.g. "Singer" is not singer
+# on postgresql. Quoted identifiers are kept apart from unquoted ones on other dialects.
+QUOTED_IDENTIFIER_CASE = {
+    'sqlite': 'ignore',
+    'mysql': 'ignore',
+    'mariadb': 'ignore',
+    'duckdb': 'ignore',
+    'postgresql': 'lower',
+    'redshift': 'lower',
+    'snowflake': 'upper',
+    'oracle': 'upper',
+}
+# Quote characters of identifiers, by dialect (default: double quotes and backticks). Other quoted tokens are taken
+# as written: on sqlite, mysql and mariadb, "..." is usually a string literal. Bracketed names ([name]) are
+# identifiers on sqlite.
+IDENTIFIER_QUOTES = {
+    'sqlite': '`',
+    'mysql': '`',
+    'mariadb': '`',
+}
+_DEFAULT_IDENTIFIER_QUOTES = '"`'
+
+
+class Token(NamedTuple):
+    kind: str
+    text: str
+
+
+def tokenize_sql(query: str) -> List[Token]:
+    """
+    Tokens of the query, without whitespace and comments. Never fails: unknown characters are punctuation tokens,
+    unterminated strings and quoted identifiers run to the end of the query.
+    """
+    return [Token(match.lastgroup, match.group()) for match in _TOKEN_REGEX.finditer(query)
+            if match.lastgroup not in ('whitespace', 'comment')]
+
+
+def identifier_name(token: Token) -> Optional[str]:
+    """
+    Case-folded name of a word or quoted identifier token, unquoted when it is a simple identifier.
+    None for other tokens.
+    """
+    if token.kind == 'word':
+        return token.text.lower()
+    if token.kind == 'quoted':
+        quote = token.text[0]
+        name = token.text[1:-1].replace(quote * 2, quote)
+        if _SIMPLE_IDENTIFIER.fullmatch(name):
+            return name.lower()
+        return f'"{name}"'
+    return None
+
+
+def _canonical_identifier(token: Token, dialect: Optional[str]) -> Optional[str]:
+    """
+    Canonical name of a word or quoted identifier token: unquoted and case-folded, unless the dialect resolves the
+    quoted identifier to a different object than the unquoted name.
+    """
+    if token.kind != 'quoted':
+        return identifier_name(token)
+    quote = token.text[0]
+    if quote not in IDENTIFIER_QUOTES.get(dialect, _DEFAULT_IDENTIFIER_QUOTES):
+        # Not an identifier, e.g. a string literal
+        return token.text
+    name = token.text[1:-1].replace(quote * 2, quote)
+    if _SIMPLE_IDENTIFIER.fullmatch(name):
+        case = QUOTED_IDENTIFIER_CASE.get(dialect)
+        if (case == 'ignore' or (case == 'lower' and name == name.lower())
+                or (case == 'upper' and name == name.upper())):
+            return name.lower()
+    return token.text
+
+
+def _unbracket(tokens: List[Token]) -> List[Token]:
+    # Bracketed simple identifiers ([name] on sqlite) as backtick quoted ones
+    unbracketed = []
+    i = 0
+    while i < len(tokens):
+        if (tokens[i].text == '[' and i + 2 < len(tokens) and tokens[i + 1].kind == 'word'
+                and tokens[i + 2].text == ']'):
+            unbracketed.append(Token('quoted', f'`{tokens[i + 1].text}`'))
+            i += 3
+            continue
+        unbracketed.append(tokens[i])
+        i += 1
+    return unbracketed
+
+
+def _canonical_token(token: Token, dialect: Optional[str]) -> str:
+    name = _canonical_identifier(token, dialect)
+    if name is not None:
+        return name
+    if token.kind == 'number':
+        return token.text.lower()
+    if token.text == '!=':
+        return '<>'
+    return token.text
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def canonicalize_sql(query: str, schema: Optional[str] = None, dialect: Optional[str] = None) -> str:
+    """
+    Canonical form of the query. Queries with the same canonical form are the same query, for the schema they run
+    in: references qualified by the schema (e.g. schema.table or "SCHEMA".table) are taken as unqualified.
+    Quoted identifiers are the same as unquoted ones only when the dialect (sqlalchemy dialect name) resolves them
+    alike, see QUOTED_IDENTIFIER_CASE. Quoted tokens which may be string literals on the dialect are kept as written.
+    """
+    tokens = tokenize_sql(str(query))
+    if dialect == 'sqlite':
+        tokens = _unbracket(tokens)
+    tokens = [_canonical_token(token, dialect) for token in tokens]
+    while tokens and tokens[-1] == ';':
+        tokens.pop()
+    if schema:
+        qualifier = [_canonical_token(token, dialect) for token in tokenize_sql(schema)] + ['.']
+        tokens = _strip_qualifier(tokens, qualifier)
+    return ' '.join(tokens)
+
+
+def _strip_qualifier(tokens: List[str], qualifier: List[str]) -> List[str]:
+    """
+    Tokens without the qualifier (tokens of the schema name and the dot) where it qualifies a name, and is not itself
+    qualified.
+    """
+    stripped = []
+    i = 0
+    while i < len(tokens):
+        end = i + len(qualifier)
+        if (tokens[i:end] == qualifier and end < len(tokens) and _is_name(tokens[end])
+                and (not stripped or stripped[-1] != '.')):
+            i = end
+            continue
+        stripped.append(tokens[i])
+        i += 1
+    return stripped
+
+
+def _is_name(token: str) -> bool:
+    return token.startswith('"') or _SIMPLE_IDENTIFIER.fullmatch(token) is not None
@@ -0,0 +1,26 @@
+import io
+from contextlib import redirect_stdout
+from functools import lru_cache
+
+import sqlfluff
+
+# Formatted queries memoized, by query and dialect
+CACHE_SIZE = 1024
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def format_sql_query(query: str, dialect: str = 'ansi') -> str:
+    """
+    Query formatted (fixed) by sqlfluff, which takes hundreds of milliseconds: for display. Use
+    sql_canonical.canonicalize_sql to find out whether queries are the same.
+    The original query when it can't be formatted.
+    """
+    try:
+        f = io.StringIO()
+        with redirect_stdout(f):
+            formatted_query = sqlfluff.fix(query, dialect=dialect)
+        return formatted_query
+    except Exception as e:
+        # return original query
+        print(f"Error in formatting query: {query}. Returning original query.")
+        return query
@@ -0,0 +1,164 @@
+"""
+Vectorized comparison of results for compare_results, when the compared columns hold numbers (int, float,
+decimal) or strings.
+
+is_match is an equivalence on such columns, provided they hold values of one kind on both sides and no
+value rounds to zero without being zero (0.04 matches 0.0, which matches None, but 0.04 doesn't match None).
+Every value then gets an integer key, equal for values matching as per is_match: the value for ints, the value
+rounded to 1 decimal place and scaled by 10 for floats and decimals, and a code for strings. None and zeros
+share key 0. Rows match when the sorted key arrays of both results are equal.
+
+Columns not satisfying these conditions make the kernel return None, for the row by row comparison.
+"""
+import decimal
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+# Floats and decimals are rounded with numpy below this magnitude, where x * 10 is accurate enough for
+# telling on which side of the rounding boundary it is
+MAX_ROUNDED_MAGNITUDE = 1e11
+# Values this close to the rounding boundary (scaled by 10) are rounded by python's round(), as is_match does
+ROUNDING_TOLERANCE = 1e-3
+INT64_MIN, INT64_MAX = np.iinfo(np.int64).min, np.iinfo(np.int64).max
+
+INT_TYPES = frozenset((int, bool))
+FLOAT_TYPES = frozenset((float, decimal.Decimal))
+STRING_TYPES = frozenset((str,))
+
+
+def column_keys(expected_values: Sequence, actual_values: Sequence) -> Optional[tuple]:
+    """
+    Integer keys of the values of a column in both results, equal when the values match as per is_match.
+    None when is_match is not an equivalence on these values.
+    """
+    types = set(map(type, expected_values)) | set(map(type, actual_values))
+    types.discard(type(None))
+    # Floats and decimals don't match ints (str(1.0) != str(1)) other than zeros, so the kinds don't mix
+    if types <= STRING_TYPES and types:
+        return _string_keys(expected_values, actual_values)
+    if types <= INT_TYPES:
+        keys = int_keys
+    elif types <= FLOAT_TYPES:
+        keys = rounded_keys
+    else:
+        return None
+    expected_keys = keys(expected_values)
+    actual_keys = keys(actual_values)
+    if expected_keys is None or actual_keys is None:
+        return None
+    return expected_keys, actual_keys
+
+
+def int_keys(values: Sequence) -> Optional[np.ndarray]:
+    """
+    Keys of ints and bools (and None). None beyond the range of int64.
+    """
+    keys = [0 if value is None else int(value) for value in values]
+    if keys and (min(keys) < INT64_MIN or max(keys) > INT64_MAX):
+        return None
+    return np.array(keys, dtype=np.int64)
+
+
+def rounded_keys(values: Sequence) -> Optional[np.ndarray]:
+    """
+    Keys of floats and decimals (and None), rounded to 1 decimal place. None when is_match is not an equivalence
+    on the values.
+    """
+    null_mask = np.fromiter((value is None for value in values), dtype=bool, count=len(values))
+    numbers = np.fromiter((0.0 if value is None else float(value) for value in values), dtype=np.float64,
+                          count=len(values))
+    if not np.all(np.isfinite(numbers)) or np.any(np.abs(numbers) >= MAX_ROUNDED_MAGNITUDE):
+        return None
+    scaled = numbers * 10
+    keys = np.rint(scaled)
+    # Rounding boundaries are left to python: round half to even on the exact value of the float or decimal
+    ambiguous = np.abs(scaled - np.floor(scaled) - 0.5) < ROUNDING_TOLERANCE
+    for i in np.flatnonzero(ambiguous):
+        keys[i] = _rounded_key(values[i])
+    keys = keys.astype(np.int64)
+    # Values rounding to zero, except zeros themselves, match zero but not None
+    zero_mask = numbers == 0
+    if np.any((keys == 0) & ~zero_mask & ~null_mask):
+        return None
+    return keys
+
+
+def _rounded_key(value) -> int:
+    if isinstance(value, decimal.Decimal):
+        return int(round(value, 1).scaleb(1))
+    return int(round(round(value, 1) * 10))
+
+
+def _string_keys(expected_values: Sequence, actual_values: Sequence) -> Optional[tuple]:
+    # str(None) matches 'None', but None matches zeros too
+    codes = {None: 0, 'None': None}
+    keys = []
+    for values in (expected_values, actual_values):
+        column = []
+        for value in values:
+            code = codes.setdefault(value, len(codes))
+            if code is None:
+                return None
+            column.append(code)
+        keys.append(np.array(column, dtype=np.int64))
+    return tuple(keys)
+
+
+def row_keys(expected: list, actual: list, columns: List[str]) -> Optional[tuple]:
+    """
+    Key matrices (rows x columns) of the expected and actual rows, for the columns compared by name.
+    None when some column can't be compared with keys, or is missing in some row.
+    """
+    expected_columns = []
+    actual_columns = []
+    for column in columns:
+        try:
+            expected_values = [row[column] for row in expected]
+            actual_values = [row[column] for row in actual]
+        except KeyError:
+            return None
+        keys = column_keys(expected_values, actual_values)
+        if keys is None:
+            return None
+        expected_columns.append(keys[0])
+        actual_columns.append(keys[1])
+    shape = (len(expected), 0)
+    return (np.column_stack(expected_columns) if columns else np.empty(shape, dtype=np.int64),
+            np.column_stack(actual_columns) if columns else np.empty(shape, dtype=np.int64))
+
+
+def is_same_multiset(expected_keys: np.ndarray, actual_keys: np.ndarray) -> bool:
+    """
+    Whether the key rows of both matrices are the same, irrespective of their order.
+    """
+    if expected_keys.shape != actual_keys.shape:
+        return False
+    if expected_keys.shape[1] == 0:
+        return True
+    return np.array_equal(_sort_rows(expected_keys), _sort_rows(actual_keys))
+
+
+def _sort_rows(keys: np.ndarray) -> np.ndarray:
+    return keys[np.lexsort(keys.T[::-1])]
+
+
+def first_unmatched(expected_keys: np.ndarray, actual_keys: np.ndarray) -> Optional[tuple]:
+    """
+    Matches every expected row with the first unmatched actual row with the same keys, in order.
+    Returns the index of the first expected row left without one and the index of the last unmatched actual row
+    at that point, None when all the rows match.
+    """
+    positions = {}
+    for i, key in enumerate(map(tuple, actual_keys.tolist())):
+        positions.setdefault(key, []).append(i)
+    taken = {}
+    matched = [False] * len(actual_keys)
+    for i, key in enumerate(map(tuple, expected_keys.tolist())):
+        candidates = positions.get(key, ())
+        count = taken.get(key, 0)
+        if count == len(candidates):
+            return i, next(j for j in reversed(range(len(actual_keys))) if not matched[j])
+        matched[candidates[count]] = True
+        taken[key] = count + 1
+    return None
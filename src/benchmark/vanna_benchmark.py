@@ -159,7 +159,8 @@ class VannaBenchmark(BenchmarkBase):
         result = TaskResult(query_info=query_info)
         stime = time.time()
         try:
-            sql = self.vn_milvus.generate_sql(query_info['question'],allow_llm_to_see_data=True)
+            sql = self.rate_limited_call(
+                result, lambda: self.vn_milvus.generate_sql(query_info['question'], allow_llm_to_see_data=True))
             print(f"Generated SQL: {sql}")
             result.generated_query = sql
             result.is_query_generated = True
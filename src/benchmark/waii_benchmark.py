@@ -104,7 +104,8 @@ class WaiiBenchmark(BenchmarkBase):
                                                            tweak_history=tweaks,
                                                            model=self.model
                                                            )
-                    (gen_query_time, gen_query, tables) = generate_query(question=tweak, request=tweak_request)
+                    (gen_query_time, gen_query, tables) = self.rate_limited_call(
+                        result, lambda: generate_query(question=tweak, request=tweak_request))
                     logging.info(f"Query {query_name} after tweak: {gen_query}")
                     result.generation_time = gen_query_time
                     result.generated_query = gen_query
@@ -128,12 +129,13 @@ class WaiiBenchmark(BenchmarkBase):
     def generate_initial_query(self, question, result, search_context):
         # Generate the query
         query_id = str(uuid.uuid4())
-        (gen_query_time, gen_query, tables) = generate_query(question=question,
-                                                     request=QueryGenerationRequest(uuid=query_id,
-                                                                                    search_context=search_context,
-                                                                                    ask=question,
-                                                                                    dialect=self.dialect,
-                                                                                    model=self.model))
+        request = QueryGenerationRequest(uuid=query_id,
+                                         search_context=search_context,
+                                         ask=question,
+                                         dialect=self.dialect,
+                                         model=self.model)
+        (gen_query_time, gen_query, tables) = self.rate_limited_call(
+            result, lambda: generate_query(question=question, request=request))
         result.generation_time = gen_query_time
         result.generated_query = gen_query
         result.is_query_generated = True